@@ -0,0 +1,122 @@
+"""
+MAE-IDP Static Assets
+UI template and static files loaded once, pre-compressed and served with
+ETag validators and cache headers
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Optional
+
+try:
+    import brotli
+    BROTLI_OK = True
+except ImportError:
+    BROTLI_OK = False
+
+# Versioned assets (?v=...) never change under the same URL
+CACHE_VERSIONED = "public, max-age=31536000, immutable"
+# Unversioned assets and the UI page: cache, but revalidate with ETag
+CACHE_REVALIDATE = "no-cache"
+
+# Skip compression for tiny bodies and already compressed formats
+MIN_COMPRESS_SIZE = 512
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript",
+                      "application/manifest+json", "image/svg+xml")
+
+
+@dataclass
+class StaticAsset:
+    """In-memory file with pre-compressed variants"""
+    media_type: str
+    etag: str
+    body: bytes
+    encoded: Dict[str, bytes] = field(default_factory=dict)  # encoding -> body
+
+    def select(self, accept_encoding: str) -> tuple:
+        """Pick best encoding supported by client, returns (encoding, body)"""
+        accepted = {
+            part.split(";")[0].strip().lower()
+            for part in (accept_encoding or "").split(",")
+            if part.strip() and not part.strip().endswith("q=0")
+        }
+        for encoding in ("br", "gzip"):
+            if encoding in accepted and encoding in self.encoded:
+                return encoding, self.encoded[encoding]
+        return None, self.body
+
+    def etag_for(self, encoding: Optional[str]) -> str:
+        """Each encoded representation gets its own strong ETag"""
+        return self.etag if not encoding else self.etag[:-1] + "-" + encoding + '"'
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """Check If-None-Match header against all representations"""
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        known = {self.etag_for(None)} | {self.etag_for(e) for e in self.encoded}
+        return any(t.strip().removeprefix("W/") in known for t in if_none_match.split(","))
+
+
+def _build_asset(path: Path) -> StaticAsset:
+    body = path.read_bytes()
+    media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+    asset = StaticAsset(
+        media_type=media_type,
+        etag='"' + hashlib.sha256(body).hexdigest()[:32] + '"',
+        body=body,
+    )
+
+    if len(body) >= MIN_COMPRESS_SIZE and media_type.startswith(COMPRESSIBLE_TYPES):
+        gz = gzip.compress(body, compresslevel=9, mtime=0)
+        if len(gz) < len(body):
+            asset.encoded["gzip"] = gz
+        if BROTLI_OK:
+            br = brotli.compress(body, quality=11)
+            if len(br) < len(body):
+                asset.encoded["br"] = br
+    return asset
+
+
+class AssetStore:
+    """
+    Loads files from a directory on first request and keeps them in memory.
+    Compression runs once per file, not per request.
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root).resolve()
+        self._assets: Dict[str, StaticAsset] = {}
+        self._lock = threading.Lock()
+
+    def get(self, filename: str) -> Optional[StaticAsset]:
+        """Get asset by name relative to root, None if missing or outside root"""
+        with self._lock:
+            asset = self._assets.get(filename)
+            if asset is not None:
+                return asset
+
+            path = (self.root / filename).resolve()
+            if self.root not in path.parents or not path.is_file():
+                return None
+
+            asset = _build_asset(path)
+            self._assets[filename] = asset
+            return asset
+
+    def headers(self, asset: StaticAsset, encoding: Optional[str], versioned: bool) -> Dict[str, str]:
+        """Response headers for asset (shared by 200 and 304 responses)"""
+        headers = {
+            "ETag": asset.etag_for(encoding),
+            "Cache-Control": CACHE_VERSIONED if versioned else CACHE_REVALIDATE,
+            "Vary": "Accept-Encoding",
+        }
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        return headers
+
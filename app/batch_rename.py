@@ -7,12 +7,17 @@ MAE Batch Rename - Пакетное переименование докумен
 import os
 import sys
 import re
-import shutil
+import json
+import contextlib
 import logging
+import multiprocessing
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from datetime import datetime
-from dataclasses import dataclass
-from typing import Optional, List
+from dataclasses import dataclass, asdict
+from typing import Optional, List, Dict, Any, Iterable, Iterator, BinaryIO
 import argparse
 
 # Add app directory to path for imports
@@ -32,7 +37,13 @@ from setup_env import setup_all
 setup_all()
 
 # Core OCR processing
-from core import BaseOCRProcessor, ConfidenceScore
+from core import BaseOCRProcessor, ConfidenceScore, InkGateStats, corner_stats
+from ocr_profiles import DEFAULT_PROFILE, OCRProfile, load_profile
+from zonal import ZoneTemplateStore
+from memprofile import MemoryProfiler, enabled_from_env
+from cache import OCRCache, get_cache
+from placement import PLACEMENT_MODES, Placer
+from reports import REPORT_FORMATS, open_report
 
 
 @dataclass
@@ -47,75 +58,294 @@ class DocInfo:
     status: str = "pending"  # pending, success, review, error
     error: Optional[str] = None
     confidence: int = 0
+    file_hash: Optional[str] = None  # SHA-256 содержимого (ключ OCR-кеша и манифеста)
+    cached: bool = False  # Результат взят из OCR-кеша
+    dest: Optional[str] = None  # Полный путь после размещения (None — не размещён)
+
+
+class RunManifest:
+    """
+    Манифест обработанных файлов в output_dir для инкрементального режима.
+    Ключ — исходный путь; файл пропускается, если совпадают размер и mtime,
+    либо (после переименования/touch) SHA-256 содержимого.
+    Файлы с ошибкой (OCR, загрузка, упавший воркер) записываются, но не
+    пропускаются: следующий прогон обрабатывает их заново.
+    """
+
+    FILENAME = ".mae_manifest.json"
+    VERSION = 1
+
+    def __init__(self, output_dir: Path):
+        self.path = output_dir / self.FILENAME
+        self._lock = threading.Lock()  # record() from walk and placement stages
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self._dirty = 0
+        if self.path.exists():
+            try:
+                data = json.loads(self.path.read_text(encoding="utf-8"))
+                if data.get("version") == self.VERSION:
+                    self.files = data.get("files", {})
+            except (json.JSONDecodeError, AttributeError):
+                logger.warning("Манифест повреждён, полная обработка: %s", self.path)
+        # Only earlier runs: within a run the walk stage is ahead of placement,
+        # skipping by hashes recorded meanwhile would depend on timing
+        self._hashes = frozenset(entry["sha256"] for entry in self.files.values() if self._done(entry))
+
+    @staticmethod
+    def _done(entry: Dict[str, Any]) -> bool:
+        return entry.get("status") != "error"
+
+    @staticmethod
+    def key(path: Path) -> str:
+        return str(path.resolve())
+
+    def is_unchanged(self, path: Path, st: os.stat_result) -> bool:
+        """Дешёвая проверка по размеру и mtime, без чтения файла"""
+        entry = self.files.get(self.key(path))
+        return entry is not None and self._done(entry) \
+            and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns
+
+    def has_hash(self, file_hash: str) -> bool:
+        return file_hash in self._hashes
+
+    def record(self, path: Path, st: os.stat_result, file_hash: str, status: str, dest: Optional[str]):
+        with self._lock:
+            self.files[self.key(path)] = {
+                "size": st.st_size,
+                "mtime_ns": st.st_mtime_ns,
+                "sha256": file_hash,
+                "status": status,
+                "dest": dest,
+            }
+            self._dirty += 1
+            if self._dirty >= 200:  # Прогресс не теряется при обрыве длинного прогона
+                self._save()
+
+    def save(self):
+        with self._lock:
+            self._save()
+
+    def _save(self):
+        tmp = self.path.with_name(f"{self.path.name}.tmp")
+        tmp.write_text(json.dumps({"version": self.VERSION, "files": self.files}), encoding="utf-8")
+        os.replace(tmp, self.path)
+        self._dirty = 0
+
+
+# In-flight files per worker for --jobs: bounds memory and the reorder buffer
+JOBS_WINDOW_PER_WORKER = 4
+
+# Capacity of the queues between pipeline stages (rasters in flight for jobs=1)
+PIPELINE_QUEUE_SIZE = 4
+
+# End-of-stream marker passed between pipeline stages
+_DONE = object()
+
+SUPPORTED_EXTENSIONS = {'.pdf', '.jpg', '.jpeg', '.png', '.tiff', '.tif'}
+
+
+def iter_input_files(input_dir: Path) -> Iterator[Path]:
+    """
+    Supported files under input_dir, streamed while walking (no full list first).
+    Entries are visited in name order, giving the same order as sorted(rglob()).
+    """
+    try:
+        with os.scandir(input_dir) as it:
+            entries = sorted(it, key=lambda e: e.name)
+    except OSError as e:
+        logger.warning("Папка недоступна: %s (%s)", input_dir, e)
+        return
+    for entry in entries:
+        try:
+            # Like rglob(): directory symlinks aren't followed (a link to a parent would loop)
+            is_dir = entry.is_dir(follow_symlinks=False)
+        except OSError:
+            continue
+        if is_dir:
+            yield from iter_input_files(Path(entry.path))
+        elif os.path.splitext(entry.name)[1].lower() in SUPPORTED_EXTENSIONS:
+            yield Path(entry.path)
+
+
+def iter_file_list(stream: BinaryIO, null_separated: bool = False) -> Iterator[Path]:
+    """
+    Paths from a newline- or NUL-separated list (find -print0, xargs -0), read lazily:
+    processing starts while the producer is still writing.
+    """
+    sep = b"\0" if null_separated else b"\n"
+    buf = b""
+    while True:
+        chunk = stream.read1(65536) if hasattr(stream, "read1") else stream.read(65536)
+        if not chunk:
+            break
+        buf += chunk
+        *names, buf = buf.split(sep)
+        for name in names:
+            name = name.rstrip(b"\r") if not null_separated else name
+            if name:
+                yield Path(os.fsdecode(name))
+    # Unterminated last entry; with -0 every byte (\n, \r included) belongs to the name
+    name = buf.rstrip(b"\r") if not null_separated else buf
+    if name:
+        yield Path(os.fsdecode(name))
+
+
+def _filter_supported(files: Iterable[Path]) -> Iterator[Path]:
+    for path in files:
+        if path.suffix.lower() in SUPPORTED_EXTENSIONS:
+            yield path
+        else:
+            logger.warning("Пропущен (формат не поддерживается): %s", path)
+
+
+# Колонки отчёта (xlsx/csv/jsonl), см. report_row()
+REPORT_COLUMNS = ["Оригинальный файл", "Статус", "Vendor", "Invoice Number", "Internal Number",
+                  "VAT ID", "Новое имя", "Confidence", "Ошибка"]
+
+
+def report_row(r: "DocInfo") -> Dict[str, Any]:
+    return {
+        "Оригинальный файл": Path(r.original_path).name,
+        "Статус": r.status,
+        "Vendor": r.vendor or "",
+        "Invoice Number": r.invoice_number or "",
+        "Internal Number": r.internal_number or "",
+        "VAT ID": r.vat_id or "",
+        "Новое имя": r.new_filename or "",
+        "Confidence": f"{r.confidence}%",
+        "Ошибка": r.error or ""
+    }
+
+
+# Processor instance of a pool worker process (see _init_worker)
+_worker_processor = None
+
+
+def _init_worker(processor_cls, ocr_threads: int, use_cache: bool, profile: OCRProfile = DEFAULT_PROFILE,
+                 qr_verify: bool = False, zonal: bool = False):
+    """Pool initializer: limit OCR threads, then create one processor per worker"""
+    global _worker_processor
+    # Tesseract (OpenMP) runs as a subprocess and inherits this limit;
+    # N workers x all cores each would oversubscribe the CPU
+    os.environ["OMP_THREAD_LIMIT"] = str(ocr_threads)
+    try:
+        import cv2
+        cv2.setNumThreads(ocr_threads)
+    except ImportError:
+        pass
+    _worker_processor = processor_cls()
+    _worker_processor.profile = profile
+    _worker_processor.qr_verify = qr_verify
+    # Own template store per worker; learned zones are merged into the file on save
+    _worker_processor.zone_templates = ZoneTemplateStore() if zonal else None
+    # Read-only in workers: only the parent writes new entries (see process_folder)
+    _worker_processor.cache = get_cache() if use_cache else None
+
+
+def _worker_counters() -> Dict[str, Optional[Dict[str, int]]]:
+    """Zonal OCR / corner ink gate counters of the current process"""
+    store = _worker_processor.zone_templates
+    return {"zonal": store.counts() if store is not None else None, "corner": corner_stats.counts()}
+
+
+def _process_in_worker(path: Path, file_hash: Optional[str]):
+    # Cumulative counters of this worker ride along; the parent keeps the latest per process
+    return _worker_processor.process_file(path, file_hash), os.getpid(), _worker_counters()
+
+
+def _sum_counts(counts: List[Dict[str, int]]) -> Dict[str, int]:
+    total: Dict[str, int] = {}
+    for c in counts:
+        for key, value in c.items():
+            total[key] = total.get(key, 0) + value
+    return total
 
 
 class BatchProcessor(BaseOCRProcessor):
     """Batch document processor using shared OCR logic"""
 
-    def process_file(self, path: Path) -> DocInfo:
-        """Обрабатывает один файл"""
-        info = DocInfo(original_path=str(path))
+    # OCR-кеш веб-приложения (cache.py); None — без кеша
+    cache: Optional[OCRCache] = None
+    # Пропущено по манифесту в последнем process_folder(incremental=True)
+    skipped: int = 0
+    # Найдено файлов для обработки; walk_done — обход папки закончен
+    discovered: int = 0
+    walk_done: bool = False
+    placer: Optional[Placer] = None
+    # Счётчики воркеров --jobs (pid -> последний снимок _worker_counters)
+    worker_counters: Optional[Dict[int, Dict[str, Any]]] = None
+
+    def ocr_counters(self) -> Dict[str, Optional[Dict[str, int]]]:
+        """Счётчики зонального OCR и проверки угла: суммой по воркерам --jobs или этого процесса"""
+        if not self.worker_counters:
+            return {"zonal": self.zone_templates.counts() if self.zone_templates is not None else None,
+                    "corner": corner_stats.counts()}
+        snapshots = list(self.worker_counters.values())
+        zonal = [c["zonal"] for c in snapshots if c["zonal"] is not None]
+        return {"zonal": _sum_counts(zonal) if zonal else None,
+                "corner": _sum_counts([c["corner"] for c in snapshots])}
+
+    def process_file(self, path: Path, file_hash: str = None) -> DocInfo:
+        """Обрабатывает один файл (с file_hash — сначала ищет в OCR-кеше)"""
+        cached = self.from_cache(path, file_hash)
+        if cached is not None:
+            return cached
+        if not self.ocr_ok:
+            return self.process_image(path, None, file_hash)
+        try:
+            img = self.load_image(path)
+        except Exception as e:
+            return DocInfo(original_path=str(path), file_hash=file_hash, status="error", error=str(e))
+        return self.process_image(path, img, file_hash)
+
+    def from_cache(self, path: Path, file_hash: str = None) -> Optional[DocInfo]:
+        """Результат из OCR-кеша веб-приложения или None"""
+        if self.cache is None or not file_hash:
+            return None
+        cached = self.cache.get(path, file_hash)
+        if not cached or cached.get("status") == "error":
+            return None
+        info = DocInfo(original_path=str(path), file_hash=file_hash, cached=True)
+        info.vendor = cached.get("vendor")
+        info.invoice_number = cached.get("invoice_number")
+        info.internal_number = cached.get("internal_number")
+        info.vat_id = cached.get("vat_id")
+        self._finish(info, path)
+        return info
+
+    def process_image(self, path: Path, img, file_hash: str = None) -> DocInfo:
+        """QR, OCR и извлечение полей из загруженного растра (img=None — не загрузился)"""
+        info = DocInfo(original_path=str(path), file_hash=file_hash)
 
         if not self.ocr_ok:
             info.status = "error"
             info.error = "OCR (Tesseract) не установлен"
             return info
 
-        try:
-            # Загружаем изображение
-            img = self.load_image(path)
-            if img is None:
-                info.status = "error"
-                info.error = "Не удалось загрузить файл"
-                return info
+        if img is None:
+            info.status = "error"
+            info.error = "Не удалось загрузить файл"
+            return info
 
-            # Извлекаем QR-коды
+        try:
+            # Извлекаем QR-коды (SN<...>, платёжные EPC / Swiss QR)
             qr_data = self.extract_qr_codes(img)
+            fields = self.fields_from_qr(qr_data)
 
             # Ищем internal number в QR
-            info.internal_number = self.extract_internal_from_qr(qr_data)
+            info.internal_number = fields["internal_number"]
 
             # Если не нашли в QR, ищем в углу (рукописный)
             if not info.internal_number:
                 info.internal_number = self.extract_internal_from_corner(img)
 
-            # OCR using base class method
-            text = self.run_ocr(img)
-
-            # Извлекаем данные (vendor: header → footer → full text)
-            info.vendor = self.extract_vendor(text, img)
-            info.invoice_number = self.extract_invoice_number(text)
-            info.vat_id = self.extract_vat_id(text)
-
-            # Подсчёт confidence (using shared weights)
-            conf = 0
-            if info.vendor:
-                conf += ConfidenceScore.VENDOR
-            if info.invoice_number:
-                conf += ConfidenceScore.INVOICE_NUMBER
-            if info.internal_number:
-                conf += ConfidenceScore.INTERNAL_NUMBER
-            if info.vat_id:
-                conf += ConfidenceScore.VAT_ID
-            info.confidence = min(conf, 100)
-
-            # Формируем новое имя файла
-            if info.confidence >= ConfidenceScore.THRESHOLD and info.vendor and info.invoice_number:
-                # Очищаем имена от недопустимых символов
-                vendor_clean = re.sub(r'[^\w\s-]', '', info.vendor).replace(' ', '')
-                invoice_clean = re.sub(r'[^\w-]', '', info.invoice_number)
-                internal_clean = re.sub(r'[^\d]', '', info.internal_number) if info.internal_number else "0"
-
-                info.new_filename = f"{vendor_clean}_{invoice_clean}_{internal_clean}{path.suffix.lower()}"
-                info.status = "success"
-            else:
-                info.status = "review"
-                # Частичное имя для review
-                parts = []
-                parts.append(info.vendor or "UNKNOWN")
-                parts.append(info.invoice_number or "UNKNOWN")
-                parts.append(info.internal_number or "UNKNOWN")
-                info.new_filename = f"{'_'.join(parts)}{path.suffix.lower()}"
+            # Полный OCR страницы — только если QR не дал vendor и номер счёта
+            fields = self.extract_text_fields(img, fields)
+            info.vendor = fields["vendor"]
+            info.invoice_number = fields["invoice_number"]
+            info.vat_id = fields["vat_id"]
+
+            self._finish(info, path)
 
         except Exception as e:
             info.status = "error"
@@ -123,94 +353,310 @@ class BatchProcessor(BaseOCRProcessor):
 
         return info
 
+    def _finish(self, info: DocInfo, path: Path):
+        """Confidence, статус и новое имя файла по извлечённым полям"""
+        # Подсчёт confidence (using shared weights)
+        conf = 0
+        if info.vendor:
+            conf += ConfidenceScore.VENDOR
+        if info.invoice_number:
+            conf += ConfidenceScore.INVOICE_NUMBER
+        if info.internal_number:
+            conf += ConfidenceScore.INTERNAL_NUMBER
+        if info.vat_id:
+            conf += ConfidenceScore.VAT_ID
+        info.confidence = min(conf, 100)
+
+        # Формируем новое имя файла
+        if info.confidence >= ConfidenceScore.THRESHOLD and info.vendor and info.invoice_number:
+            # Очищаем имена от недопустимых символов
+            vendor_clean = re.sub(r'[^\w\s-]', '', info.vendor).replace(' ', '')
+            invoice_clean = re.sub(r'[^\w-]', '', info.invoice_number)
+            internal_clean = re.sub(r'[^\d]', '', info.internal_number) if info.internal_number else "0"
+
+            info.new_filename = f"{vendor_clean}_{invoice_clean}_{internal_clean}{path.suffix.lower()}"
+            info.status = "success"
+        else:
+            info.status = "review"
+            # Частичное имя для review
+            parts = []
+            parts.append(info.vendor or "UNKNOWN")
+            parts.append(info.invoice_number or "UNKNOWN")
+            parts.append(info.internal_number or "UNKNOWN")
+            info.new_filename = f"{'_'.join(parts)}{path.suffix.lower()}"
+
+    def _cache_result(self, info: DocInfo, path: Path):
+        """Сохраняет результат в OCR-кеш в формате веб-приложения (ParsedDoc)"""
+        if self.cache is None or info.cached or not info.file_hash or info.status == "error":
+            return
+        self.cache.set(path, {
+            "filename": path.name,
+            "status": "success" if info.confidence >= ConfidenceScore.THRESHOLD else "review",
+            "vendor": info.vendor,
+            "invoice_number": info.invoice_number,
+            "internal_number": info.internal_number,
+            "vat_id": info.vat_id,
+            "confidence": info.confidence,
+            "error": None,
+            "timestamp": datetime.now().isoformat(),
+        }, info.file_hash, save=False)
+
     def process_folder(self, input_dir: Path, output_dir: Path,
                        move_files: bool = True,
-                       progress_callback=None) -> List[DocInfo]:
-        """Обрабатывает все файлы в папке"""
+                       progress_callback=None,
+                       **options) -> List[DocInfo]:
+        """
+        Обрабатывает все файлы в папке (параметры — см. iter_folder).
+        progress_callback(current, total, filename): total=None, пока обход папки не закончен.
+        """
+        results = []
+        for info in self.iter_folder(input_dir, output_dir, move_files, **options):
+            results.append(info)
+            if progress_callback:
+                progress_callback(len(results), self.discovered if self.walk_done else None,
+                                  Path(info.original_path).name)
+        return results
+
+    def iter_folder(self, input_dir: Path, output_dir: Path,
+                    move_files: bool = True,
+                    jobs: int = 1,
+                    ocr_threads: int = 1,
+                    incremental: bool = False,
+                    use_cache: bool = False,
+                    placement: str = "copy",
+                    files: Iterable[Path] = None) -> Iterator[DocInfo]:
+        """
+        Потоковый конвейер: обход папки → чтение/растеризация → OCR → размещение.
+        Стадии — отдельные потоки с ограниченными очередями, так что диск и CPU
+        работают одновременно; результаты отдаются по мере готовности, в порядке обхода.
+
+        jobs > 1: чтение и OCR в пуле процессов, копирование — в родительском процессе
+        (результаты и имена при коллизиях не зависят от jobs).
+        incremental: пропускает файлы из манифеста output_dir (число — в self.skipped).
+        use_cache: общий OCR-кеш с веб-приложением (по SHA-256 содержимого).
+        placement: copy, move, hardlink или reflink (см. placement.py), статистика в self.placer.
+        files: готовый список/поток путей (например, из stdin) вместо обхода input_dir.
+        """
 
         # Создаём выходные папки
         output_dir.mkdir(parents=True, exist_ok=True)
         review_dir = output_dir / "_ПРОВЕРИТЬ"
         review_dir.mkdir(exist_ok=True)
 
-        # Собираем файлы
-        extensions = {'.pdf', '.jpg', '.jpeg', '.png', '.tiff', '.tif'}
-        files = [f for f in input_dir.rglob('*') if f.suffix.lower() in extensions]
-
-        results = []
-        total = len(files)
-
-        for i, file_path in enumerate(files):
-            if progress_callback:
-                progress_callback(i + 1, total, file_path.name)
-
-            # Обрабатываем файл
-            info = self.process_file(file_path)
-            results.append(info)
-
-            if not move_files:
+        self.placer = Placer(placement)
+        if use_cache and self.cache is None:
+            self.cache = get_cache()
+        manifest = RunManifest(output_dir) if incremental and move_files else None
+        need_hash = manifest is not None or use_cache
+
+        stop = threading.Event()
+        discovered: "queue.Queue" = queue.Queue(PIPELINE_QUEUE_SIZE)
+        threads = [threading.Thread(target=self._walk_stage,
+                                    args=(input_dir, files, manifest, need_hash, discovered, stop),
+                                    name="batch-walk", daemon=True)]
+        pool = None
+
+        if jobs <= 1:
+            loaded: "queue.Queue" = queue.Queue(PIPELINE_QUEUE_SIZE)
+            done: "queue.Queue" = queue.Queue(PIPELINE_QUEUE_SIZE)
+            threads.append(threading.Thread(target=self._load_stage, args=(discovered, loaded, stop),
+                                            name="batch-load", daemon=True))
+            threads.append(threading.Thread(target=self._ocr_stage, args=(loaded, done, stop),
+                                            name="batch-ocr", daemon=True))
+            slots = None
+        else:
+            # Window of submitted-but-not-placed files bounds memory and the reorder buffer
+            window = jobs * JOBS_WINDOW_PER_WORKER
+            done = queue.Queue()
+            slots = threading.Semaphore(window)
+            self.worker_counters = {}
+            # spawn: forking a process that already runs pipeline threads can deadlock
+            pool = ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context("spawn"),
+                                       initializer=_init_worker,
+                                       initargs=(type(self), ocr_threads, use_cache, self.profile, self.qr_verify,
+                                                 self.zone_templates is not None))
+            threads.append(threading.Thread(target=self._dispatch_stage,
+                                            args=(pool, discovered, done, slots, stop),
+                                            name="batch-dispatch", daemon=True))
+
+        for t in threads:
+            t.start()
+        try:
+            # Размещение и отчёт — в потоке вызывающего, в порядке обхода
+            while True:
+                item = done.get()
+                if item is _DONE:
+                    break
+                (file_path, st, file_hash), result = item
+                if slots is not None:
+                    try:
+                        info, pid, self.worker_counters[pid] = result.result()
+                    except Exception as e:  # Worker crashed (e.g. BrokenProcessPool)
+                        info = DocInfo(original_path=str(file_path), file_hash=file_hash,
+                                       status="error", error=str(e))
+                    slots.release()
+                else:
+                    info = result
+
+                if use_cache:
+                    self._cache_result(info, file_path)
+                if move_files:
+                    self._place_file(info, file_path, output_dir, review_dir, self.placer)
+                    if manifest is not None and info.file_hash:
+                        manifest.record(file_path, st, info.file_hash, info.status, info.new_filename)
+                yield info
+        finally:
+            stop.set()
+            if pool is not None:
+                pool.shutdown(wait=True, cancel_futures=True)
+            for t in threads:
+                t.join(timeout=5)
+            if manifest is not None:
+                manifest.save()
+            if use_cache:
+                self.cache.flush()
+
+    @staticmethod
+    def _get(q: queue.Queue, stop: threading.Event):
+        """Blocking get that returns _DONE when the pipeline is stopped"""
+        while not stop.is_set():
+            try:
+                return q.get(timeout=0.2)
+            except queue.Empty:
                 continue
+        return _DONE
 
-            # Перемещаем/копируем файл
-            if info.status == "success" and info.vendor:
-                # Создаём папку вендора
-                vendor_dir = output_dir / info.vendor.replace(' ', '_')
-                vendor_dir.mkdir(exist_ok=True)
-                dest = vendor_dir / info.new_filename
-            elif info.status == "review":
-                dest = review_dir / info.new_filename
-            else:
-                # Ошибка - в review с оригинальным именем
-                dest = review_dir / f"ERROR_{file_path.name}"
-
-            # Избегаем перезаписи
-            if dest.exists():
-                stem = dest.stem
-                suffix = dest.suffix
-                counter = 1
-                while dest.exists():
-                    dest = dest.parent / f"{stem}_{counter}{suffix}"
-                    counter += 1
-
+    @staticmethod
+    def _put(q: queue.Queue, item, stop: threading.Event) -> bool:
+        """Blocking put that gives up when the pipeline is stopped (consumer gone)"""
+        while not stop.is_set():
             try:
-                shutil.copy2(file_path, dest)
-                info.new_filename = str(dest.relative_to(output_dir))
-            except Exception as e:
-                info.error = f"Ошибка копирования: {e}"
-
-        return results
-
-    def export_report(self, results: List[DocInfo], output_path: Path):
-        """Экспортирует отчёт в Excel"""
-        import pandas as pd
-
-        data = []
-        for r in results:
-            data.append({
-                "Оригинальный файл": Path(r.original_path).name,
-                "Статус": r.status,
-                "Vendor": r.vendor or "",
-                "Invoice Number": r.invoice_number or "",
-                "Internal Number": r.internal_number or "",
-                "VAT ID": r.vat_id or "",
-                "Новое имя": r.new_filename or "",
-                "Confidence": f"{r.confidence}%",
-                "Ошибка": r.error or ""
-            })
-
-        df = pd.DataFrame(data)
-
-        # Сохраняем с форматированием
-        from openpyxl.utils import get_column_letter
-        with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False, sheet_name='Результаты')
-
-            # Автоширина колонок
-            worksheet = writer.sheets['Результаты']
-            for i, col in enumerate(df.columns):
-                max_len = max(df[col].astype(str).map(len).max(), len(col)) + 2
-                worksheet.column_dimensions[get_column_letter(i + 1)].width = min(max_len, 50)
-
+                q.put(item, timeout=0.2)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _walk_stage(self, input_dir: Path, files: Optional[Iterable[Path]],
+                    manifest: Optional[RunManifest], need_hash: bool,
+                    out: queue.Queue, stop: threading.Event):
+        """
+        Стадия 1: (path, stat, sha256) файлов для обработки.
+        С манифестом: без изменений по размеру/mtime — пропуск без чтения файла;
+        иначе хеш содержимого, уже обработанное содержимое (переименование, touch) — тоже пропуск.
+        """
+        self.skipped = 0
+        self.discovered = 0
+        self.walk_done = False
+        try:
+            source = _filter_supported(files) if files is not None else iter_input_files(input_dir)
+            for file_path in source:
+                if stop.is_set():
+                    return
+                try:
+                    st = file_path.stat()
+                    if manifest is not None and manifest.is_unchanged(file_path, st):
+                        self.skipped += 1
+                        continue
+                    file_hash = OCRCache.compute_hash(file_path) if need_hash else None
+                except OSError as e:
+                    if files is not None:
+                        logger.warning("Файл недоступен: %s (%s)", file_path, e)
+                    continue  # Удалён во время обхода
+                if manifest is not None and manifest.has_hash(file_hash):
+                    manifest.record(file_path, st, file_hash, "duplicate", None)
+                    self.skipped += 1
+                    continue
+                self.discovered += 1
+                if not self._put(out, (file_path, st, file_hash), stop):
+                    return
+        except Exception as e:
+            logger.error("Ошибка обхода %s: %s", input_dir, e)
+        finally:
+            self.walk_done = True
+            self._put(out, _DONE, stop)
+
+    def _load_stage(self, inp: queue.Queue, out: queue.Queue, stop: threading.Event):
+        """Стадия 2: чтение и растеризация (или готовый результат из кеша / ошибка загрузки)"""
+        while True:
+            item = self._get(inp, stop)
+            if item is _DONE:
+                self._put(out, _DONE, stop)
+                return
+            file_path, _, file_hash = item
+            result = self.from_cache(file_path, file_hash)
+            if result is None and self.ocr_ok:
+                try:
+                    result = self.load_image(file_path)
+                except Exception as e:
+                    result = DocInfo(original_path=str(file_path), file_hash=file_hash,
+                                     status="error", error=str(e))
+            if not self._put(out, (item, result), stop):
+                return
+
+    def _ocr_stage(self, inp: queue.Queue, out: queue.Queue, stop: threading.Event):
+        """Стадия 3: QR + OCR + извлечение полей"""
+        while True:
+            item = self._get(inp, stop)
+            if item is _DONE:
+                self._put(out, _DONE, stop)
+                return
+            (file_path, st, file_hash), loaded = item
+            info = loaded if isinstance(loaded, DocInfo) else self.process_image(file_path, loaded, file_hash)
+            if not self._put(out, ((file_path, st, file_hash), info), stop):
+                return
+
+    @staticmethod
+    def _dispatch_stage(pool: ProcessPoolExecutor, inp: queue.Queue, out: queue.Queue,
+                        slots: threading.Semaphore, stop: threading.Event):
+        """Стадии 2-3 для jobs > 1: чтение и OCR в пуле, futures — в порядке обхода"""
+        while True:
+            item = BatchProcessor._get(inp, stop)
+            if item is _DONE:
+                break
+            while not slots.acquire(timeout=0.2):
+                if stop.is_set():
+                    return
+            if stop.is_set():
+                return
+            file_path, _, file_hash = item
+            try:
+                future = pool.submit(_process_in_worker, file_path, file_hash)
+            except RuntimeError:  # Pool shut down / broken
+                return
+            out.put((item, future))
+        if not stop.is_set():
+            out.put(_DONE)
+
+    def _place_file(self, info: DocInfo, file_path: Path, output_dir: Path, review_dir: Path,
+                    placer: Placer):
+        """Перемещает/связывает/копирует файл в папку вендора или на проверку"""
+        if info.status == "success" and info.vendor:
+            # Создаём папку вендора
+            vendor_dir = output_dir / info.vendor.replace(' ', '_')
+            vendor_dir.mkdir(exist_ok=True)
+            dest = vendor_dir / info.new_filename
+        elif info.status == "review":
+            dest = review_dir / info.new_filename
+        else:
+            # Ошибка - в review с оригинальным именем
+            dest = review_dir / f"ERROR_{file_path.name}"
+
+        # Избегаем перезаписи (индекс имён в памяти, без dest.exists() в цикле)
+        dest = placer.reserve(dest)
+        try:
+            placer.place(file_path, dest)
+            info.new_filename = str(dest.relative_to(output_dir))
+            info.dest = str(dest)
+        except Exception as e:
+            placer.release(dest)
+            info.error = f"Ошибка размещения ({placer.mode}): {e}"
+
+    def export_report(self, results: Iterable[DocInfo], output_path: Path, fmt: str = None):
+        """Экспортирует отчёт (xlsx/csv/jsonl, по умолчанию по расширению) построчно"""
+        with open_report(output_path, REPORT_COLUMNS, fmt) as report:
+            for r in results:
+                report.write(report_row(r))
         return output_path
 
 
@@ -221,23 +667,87 @@ def main():
         epilog='''
 Примеры:
   python batch_rename.py "D:\\Invoices" "D:\\Sorted"
+  python batch_rename.py "D:\\Invoices" "D:\\Sorted" --jobs 8
+  python batch_rename.py "D:\\Invoices" "D:\\Sorted" --incremental   # только новые файлы
+  python batch_rename.py "D:\\Scans" "D:\\Sorted" --placement move     # без копирования данных
   python batch_rename.py "C:\\Users\\User\\Google Drive\\Invoices" "C:\\Users\\User\\Documents\\Sorted"
+  find /scans -name '*.pdf' -mtime -1 -print0 | python batch_rename.py -0 - /sorted --jsonl > results.jsonl
         '''
     )
 
-    parser.add_argument('input_dir', help='Папка с исходными файлами')
+    parser.add_argument('input_dir', help="Папка с исходными файлами или '-' — список файлов из stdin")
     parser.add_argument('output_dir', help='Папка для результатов')
     parser.add_argument('--dry-run', action='store_true',
                         help='Только анализ, без копирования файлов')
     parser.add_argument('--no-report', action='store_true',
-                        help='Не создавать Excel отчёт')
+                        help='Не создавать отчёт')
+    parser.add_argument('--report-format', choices=REPORT_FORMATS, default='xlsx',
+                        help='Формат отчёта: xlsx (по умолчанию), csv, jsonl')
+    parser.add_argument('--jobs', '-j', type=int, default=1,
+                        help='Число процессов OCR (0 = все ядра, по умолчанию 1)')
+    parser.add_argument('--ocr-threads', type=int, default=1,
+                        help='Потоков Tesseract на процесс при --jobs > 1 (по умолчанию 1)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Пропускать файлы, обработанные прошлыми запусками (манифест в выходной папке)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Не использовать общий OCR-кеш веб-приложения')
+    parser.add_argument('--placement', choices=PLACEMENT_MODES, default='copy',
+                        help='Размещение файлов: copy (по умолчанию), move, hardlink, reflink (copy-on-write); '
+                             'при невозможности (другой диск/ФС) — автоматически копия')
+    parser.add_argument('--ocr-profile', default='default',
+                        help='Профиль OCR из data/ocr_profiles.json (см. benchmarks/bench_ocr_sweep.py)')
+    parser.add_argument('--qr-verify', action='store_true',
+                        help='Полный OCR страницы даже если платёжный QR (EPC / Swiss QR-bill) '
+                             'уже дал vendor и номер счёта; расхождения — в лог')
+    parser.add_argument('--no-zonal', action='store_true',
+                        help='Не использовать зональный OCR (шаблоны полей по vendor, data/zone_templates.json)')
+    parser.add_argument('--memprofile', action='store_true', default=enabled_from_env(),
+                        help='Профиль памяти по стадиям и документам (tracemalloc + RSS), '
+                             'отчёт memprofile_*.json в выходной папке; также MAE_MEMPROFILE=1')
+    parser.add_argument('--jsonl', action='store_true',
+                        help='JSON-объект на каждый файл в stdout сразу после обработки; '
+                             'текстовый вывод — в stderr')
+    parser.add_argument('-0', '--null', action='store_true',
+                        help="Список файлов из stdin (input_dir '-') разделён NUL, а не переводом строки")
 
     args = parser.parse_args()
 
+    # --jsonl: stdout только для JSON, всё остальное (print) — в stderr
+    json_out = sys.stdout if args.jsonl else None
+    with contextlib.redirect_stdout(sys.stderr) if args.jsonl else contextlib.nullcontext():
+        run(args, json_out)
+
+
+def print_memory_summary(profiler: MemoryProfiler, output_dir: Path):
+    """Сводка --memprofile: пики по стадиям + JSON-отчёт со всеми документами"""
+    summary = profiler.summary()
+    print(f"\nПАМЯТЬ (документов: {summary['documents']}, пик RSS: {summary['peak_rss_mb']} MB):")
+    for name, stage in summary["stages"].items():
+        peak = stage["traced_peak_mb"]
+        print(f"  {name:<30} пик {peak['max']:>8.1f} MB (p95 {peak['p95']:.1f}, среднее {peak['mean']:.1f})")
+    for doc in summary["heaviest_documents"][:3]:
+        print(f"  {Path(doc['document']).name[:40]:<40} {doc['traced_peak_mb']:>8.1f} MB в {doc['peak_stage']}")
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    path = output_dir / f"memprofile_{datetime.now():%Y%m%d_%H%M%S}.json"
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"summary": summary, "documents": list(profiler.documents)}, f, ensure_ascii=False, indent=2)
+    print(f"📈 Профиль памяти: {path}")
+
+
+def run(args: argparse.Namespace, json_out=None):
+    """Обработка по аргументам CLI; json_out — поток для --jsonl"""
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    if args.memprofile and jobs > 1:
+        # Профиль одного процесса = профиль одного воркера --jobs; стадии в пуле не видны
+        print("--memprofile: обработка в одном процессе (--jobs 1)")
+        jobs = 1
+
+    from_stdin = args.input_dir == "-"
     input_dir = Path(args.input_dir)
     output_dir = Path(args.output_dir)
 
-    if not input_dir.exists():
+    if not from_stdin and not input_dir.exists():
         logger.error("Папка не найдена: %s", input_dir)
         print(f"ОШИБКА: Папка не найдена: {input_dir}")
         sys.exit(1)
@@ -247,16 +757,33 @@ def main():
     print("=" * 60)
     print("MAE Batch Rename - Пакетное переименование документов")
     print("=" * 60)
-    print(f"Входная папка:  {input_dir}")
+    print(f"Входная папка:  {'stdin (список файлов)' if from_stdin else input_dir}")
     print(f"Выходная папка: {output_dir}")
     print(f"Режим: {'Анализ (dry-run)' if args.dry_run else 'Обработка + копирование'}")
+    print(f"Процессов OCR:  {jobs}")
+    if not args.dry_run:
+        print(f"Размещение:     {args.placement}")
+    if args.incremental:
+        print(f"Инкрементально: манифест {output_dir / RunManifest.FILENAME}")
     print("=" * 60)
 
     processor = BatchProcessor()
+    try:
+        processor.profile = load_profile(args.ocr_profile)
+    except KeyError as e:
+        print(f"ОШИБКА: {e.args[0]}")
+        sys.exit(1)
+    processor.qr_verify = args.qr_verify
+    processor.zone_templates = None if args.no_zonal else ZoneTemplateStore()
+    profiler = MemoryProfiler(enabled=args.memprofile)
+    profiler.instrument(processor)
 
     # Проверяем зависимости
     print(f"\nOCR (Tesseract): {'✓ OK' if processor.ocr_ok else '✗ НЕ УСТАНОВЛЕН'}")
     print(f"QR Reader:       {'✓ OK' if processor.qr_ok else '✗ НЕ УСТАНОВЛЕН (pip install pyzbar)'}")
+    print(f"Профиль OCR:     {processor.profile.name}")
+    if processor.qr_verify:
+        print("Проверка QR:     полный OCR и при платёжном QR-коде")
 
     if not processor.ocr_ok:
         print("\nОШИБКА: Tesseract OCR не установлен!")
@@ -267,40 +794,83 @@ def main():
     print("-" * 60)
 
     def progress(current, total, filename):
+        if json_out is not None and not sys.stderr.isatty():
+            return  # Конвейер: без progress bar в логах
+        if total is None:  # Обход папки ещё идёт, общее число неизвестно
+            print(f"\r[{'·' * 20}] {current}/? - {filename[:40]:<40}", end="", flush=True)
+            return
         pct = int(current / total * 100)
         bar = "█" * (pct // 5) + "░" * (20 - pct // 5)
         print(f"\r[{bar}] {current}/{total} ({pct}%) - {filename[:40]:<40}", end="", flush=True)
 
-    results = processor.process_folder(
-        input_dir,
-        output_dir,
-        move_files=not args.dry_run,
-        progress_callback=progress
-    )
+    # Результаты не накапливаются: счётчики и строки отчёта — по мере готовности
+    counts = {"success": 0, "review": 0, "error": 0}
+    total = 0
+    report = None
+    report_path = output_dir / f"отчёт_{datetime.now():%Y%m%d_%H%M%S}.{args.report_format}"
+    try:
+        for info in processor.iter_folder(
+            input_dir,
+            output_dir,
+            move_files=not args.dry_run,
+            jobs=jobs,
+            ocr_threads=args.ocr_threads,
+            incremental=args.incremental,
+            use_cache=not args.no_cache,
+            placement=args.placement,
+            files=iter_file_list(sys.stdin.buffer, args.null) if from_stdin else None
+        ):
+            total += 1
+            counts[info.status] = counts.get(info.status, 0) + 1
+            progress(total, processor.discovered if processor.walk_done else None,
+                     Path(info.original_path).name)
+            if json_out is not None:
+                json_out.write(json.dumps(asdict(info), ensure_ascii=False) + "\n")
+                json_out.flush()
+            if not args.no_report:
+                if report is None:
+                    report = open_report(report_path, REPORT_COLUMNS, args.report_format)
+                report.write(report_row(info))
+    finally:
+        if report is not None:
+            report.close()
+        profiler.stop()
 
     print("\n" + "-" * 60)
 
     # Статистика
-    success = sum(1 for r in results if r.status == "success")
-    review = sum(1 for r in results if r.status == "review")
-    errors = sum(1 for r in results if r.status == "error")
-    total = len(results)
+    success, review, errors = counts["success"], counts["review"], counts["error"]
 
     print(f"\nРЕЗУЛЬТАТЫ:")
     print(f"  Всего файлов:    {total}")
+    if args.incremental:
+        print(f"  Пропущено:       {processor.skipped} (без изменений)")
     if total:
         print(f"  ✓ Успешно:       {success} ({success/total*100:.1f}%)")
         print(f"  ⚠ На проверку:   {review} ({review/total*100:.1f}%)")
         print(f"  ✗ Ошибки:        {errors} ({errors/total*100:.1f}%)")
     else:
         logger.warning("Нет файлов для обработки")
-
-    # Экспорт отчёта
-    if not args.no_report and results:
-        report_path = output_dir / f"отчёт_{datetime.now():%Y%m%d_%H%M%S}.xlsx"
-        processor.export_report(results, report_path)
+    if not args.dry_run and processor.placer.counts:
+        methods = ", ".join(f"{m}: {n}" for m, n in processor.placer.counts.most_common())
+        print(f"  Размещение:      {methods}")
+    counters = processor.ocr_counters()
+    if counters["zonal"] is not None:
+        zonal = ZoneTemplateStore.summarize(counters["zonal"])
+        if zonal["zonal"] or zonal["learned"]:
+            saved = f", пикселей OCR −{zonal['pixels_saved'] * 100:.0f}%" if zonal["pixels_saved"] is not None else ""
+            print(f"  Зональный OCR:   {zonal['zonal']} док. (откат на полный OCR: {zonal['fallback']}, "
+                  f"выучено: {zonal['learned']}){saved}")
+    corner = InkGateStats.summarize(counters["corner"])
+    if corner["calls"]:
+        print(f"  Угол (рукопись): пустых без OCR {corner['blank_skipped']}, обрезано по чернилам {corner['cropped']}")
+
+    if report is not None:
         print(f"\n📊 Отчёт сохранён: {report_path}")
 
+    if profiler.enabled:
+        print_memory_summary(profiler, output_dir)
+
     print(f"\n📁 Результаты в папке: {output_dir}")
     if review > 0:
         print(f"⚠  Файлы на проверку: {output_dir / '_ПРОВЕРИТЬ'}")
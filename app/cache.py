@@ -5,9 +5,12 @@ Hash-based caching to avoid re-processing identical documents
 
 import hashlib
 import json
+import os
+import sys
 import time
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterable
 from dataclasses import dataclass, asdict
 import threading
 
@@ -21,6 +24,28 @@ class CacheEntry:
     hits: int = 0
 
 
+@contextmanager
+def _file_lock(path: Path):
+    """Exclusive inter-process lock (web app and CLI share the cache file)"""
+    with open(path, "a+b") as f:
+        if sys.platform == "win32":
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
 class OCRCache:
     """
     Simple file-based cache for OCR results.
@@ -46,7 +71,12 @@ class OCRCache:
 
     def _load_cache(self):
         """Load cache from disk"""
+        self._memory_cache = self._read_disk()
+
+    def _read_disk(self) -> Dict[str, CacheEntry]:
+        """Unexpired entries of the cache file"""
         cache_file = self._cache_file()
+        entries: Dict[str, CacheEntry] = {}
         if cache_file.exists():
             try:
                 data = json.loads(cache_file.read_text(encoding="utf-8"))
@@ -54,26 +84,49 @@ class OCRCache:
                 for key, entry in data.items():
                     # Skip expired entries
                     if now - entry.get("created_at", 0) < self.ttl_seconds:
-                        self._memory_cache[key] = CacheEntry(
+                        entries[key] = CacheEntry(
                             file_hash=key,
                             result=entry.get("result", {}),
                             created_at=entry.get("created_at", now),
                             hits=entry.get("hits", 0)
                         )
             except (json.JSONDecodeError, KeyError):
-                self._memory_cache = {}
+                return {}
+        return entries
+
+    def _merge_and_save(self, removed: Iterable[str] = ()):
+        """
+        Merge memory with the file under an inter-process lock and replace it
+        (caller holds self._lock). Entries another process wrote meanwhile are
+        kept and become visible here too; the newer of two entries wins.
+        """
+        cache_file = self._cache_file()
+        with _file_lock(cache_file.with_name(f"{cache_file.name}.lock")):
+            merged = self._read_disk()
+            for key, entry in self._memory_cache.items():
+                current = merged.get(key)
+                if current is None or entry.created_at >= current.created_at:
+                    merged[key] = entry
+            for key in removed:
+                merged.pop(key, None)
+            self._memory_cache = merged
+            self._evict_old_entries()
+            self._save_cache()
 
     def _save_cache(self):
-        """Save cache to disk"""
+        """Save cache to disk (atomic: web app and CLI may share the file)"""
         cache_file = self._cache_file()
         data = {
             key: asdict(entry)
             for key, entry in self._memory_cache.items()
         }
-        cache_file.write_text(json.dumps(data, indent=2), encoding="utf-8")
+        tmp = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(data, indent=2), encoding="utf-8")
+        os.replace(tmp, cache_file)
 
-    def _compute_hash(self, file_path: Path) -> str:
-        """Compute SHA-256 hash of file content"""
+    @staticmethod
+    def compute_hash(file_path: Path) -> str:
+        """Compute SHA-256 hash of file content (also used as preview key)"""
         hasher = hashlib.sha256()
         with open(file_path, "rb") as f:
             for chunk in iter(lambda: f.read(65536), b""):
@@ -96,12 +149,13 @@ class OCRCache:
         for key, _ in sorted_entries[:to_remove]:
             del self._memory_cache[key]
 
-    def get(self, file_path: Path) -> Optional[Dict[str, Any]]:
+    def get(self, file_path: Path, file_hash: str = None) -> Optional[Dict[str, Any]]:
         """
         Get cached result for file.
         Returns None if not cached or expired.
+        Pass file_hash if already computed to avoid re-reading the file.
         """
-        file_hash = self._compute_hash(file_path)
+        file_hash = file_hash or self.compute_hash(file_path)
 
         with self._lock:
             entry = self._memory_cache.get(file_hash)
@@ -117,9 +171,12 @@ class OCRCache:
             entry.hits += 1
             return entry.result.copy()
 
-    def set(self, file_path: Path, result: Dict[str, Any]):
-        """Cache OCR result for file"""
-        file_hash = self._compute_hash(file_path)
+    def set(self, file_path: Path, result: Dict[str, Any], file_hash: str = None, save: bool = True):
+        """
+        Cache OCR result for file.
+        save=False only updates memory; call flush() once after a batch.
+        """
+        file_hash = file_hash or self.compute_hash(file_path)
 
         with self._lock:
             self._memory_cache[file_hash] = CacheEntry(
@@ -129,15 +186,23 @@ class OCRCache:
                 hits=0
             )
             self._evict_old_entries()
-            self._save_cache()
+            if save:
+                self._merge_and_save()
+
+    def flush(self):
+        """
+        Save after set(save=False) calls, keeping entries another process
+        (e.g. the web app) wrote to disk in the meantime
+        """
+        with self._lock:
+            self._merge_and_save()
 
     def invalidate(self, file_path: Path):
         """Remove file from cache"""
-        file_hash = self._compute_hash(file_path)
+        file_hash = self.compute_hash(file_path)
         with self._lock:
-            if file_hash in self._memory_cache:
-                del self._memory_cache[file_hash]
-                self._save_cache()
+            self._memory_cache.pop(file_hash, None)
+            self._merge_and_save(removed=[file_hash])
 
     def clear(self):
         """Clear all cache"""
@@ -3,8 +3,21 @@ MAE Core - Shared OCR processing logic
 Used by both mae.py (web UI) and batch_rename.py (CLI)
 """
 
+import os
 import re
-from typing import Optional, List
+import statistics
+import subprocess
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional, List, Tuple
+
+from logging_config import get_logger
+from ocr_profiles import DEFAULT_PROFILE, TEXT_BANDS, OCRProfile
+from qr_payloads import parse_payloads
+from stages import Stage, StageGraph, current_cancel
+from zonal import ZONE_FIELDS, ZoneTemplate, ZoneTemplateStore, line_box
+
+logger = get_logger("core")
 
 
 class ConfidenceScore:
@@ -32,6 +45,14 @@ EXCLUDED_INVOICE_PATTERNS = [
     r'Auftrags[- ]?(?:Nr|No|Nummer|nummer)',
 ]
 
+# Поля, без которых полный OCR страницы нужен даже при платёжном QR-коде
+QR_REQUIRED_FIELDS = ("vendor", "invoice_number")
+# Номер счёта без ключевого слова в тексте перевода (EPC / QR-bill): токен с цифрой
+REMITTANCE_TOKEN = re.compile(r'(?<![\w-])([A-Z0-9][A-Z0-9/-]{4,})(?![\w-])', re.I)
+# Short invoice labels of remittance texts ("Rechnung RE-2024-12345", "Rg. 4711", "Invoice 2024-0815")
+REMITTANCE_INVOICE_LABEL = re.compile(
+    r'\b(?:Rechnung|Rechn\.|Rg\.?|Invoice|Inv\.|Faktura)\s*[:#]?\s*([A-Z0-9][A-Z0-9/-]{4,})(?![\w-])', re.I)
+
 # Валидация VAT по формату страны
 VAT_FORMATS = {
     'DE': r'^DE\d{9}$',
@@ -109,16 +130,248 @@ KNOWN_VENDORS = {
 }
 
 
+# Reduced-resolution decoding: keep ~300 DPI (what PDFs are rendered at),
+# or an A4 page at 300 DPI when the image has no meaningful DPI (phone photos)
+TARGET_DPI = 300
+TARGET_LONG_SIDE = 3508
+
+
+def choose_reduction(width: int, height: int, dpi: Optional[float] = None,
+                     target_dpi: int = TARGET_DPI) -> int:
+    """Pick decode reduction factor (1, 2, 4, 8) that keeps at least target resolution.
+
+    DPI below target_dpi is ignored: cameras write 72 DPI regardless of content.
+    """
+    long_side = max(width, height)
+    target_long_side = TARGET_LONG_SIDE * target_dpi / TARGET_DPI
+    factor = 1
+    for candidate in (2, 4, 8):
+        if long_side / candidate < target_long_side:
+            break
+        if dpi and dpi >= target_dpi and dpi / candidate < target_dpi:
+            break
+        factor = candidate
+    return factor
+
+
+def _header_dpi(info: dict) -> Optional[float]:
+    dpi = info.get("dpi")
+    if not dpi:
+        return None
+    try:
+        return float(min(dpi[0], dpi[1]))
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def read_image_header(path) -> Optional[dict]:
+    """Read image size, DPI and frame count without decoding pixel data"""
+    try:
+        from PIL import Image
+        with Image.open(path) as im:
+            return {
+                "width": im.width,
+                "height": im.height,
+                "dpi": _header_dpi(im.info),
+                "frames": getattr(im, "n_frames", 1),
+            }
+    except Exception:
+        return None
+
+
+def _imread_flag(factor: int) -> int:
+    """cv2.imread flag decoding straight to grayscale at 1/factor resolution"""
+    import cv2
+    return {
+        1: cv2.IMREAD_GRAYSCALE,
+        2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+        4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+        8: cv2.IMREAD_REDUCED_GRAYSCALE_8,
+    }[factor]
+
+
+def _pytesseract():
+    """Import pytesseract on first use and apply TESSERACT_CMD from setup_env.
+
+    pytesseract pulls in PIL, numpy and pandas at import time, so it is kept
+    out of module import to keep server cold start fast.
+    """
+    import pytesseract
+    cmd = os.environ.get("TESSERACT_CMD")
+    if cmd and pytesseract.pytesseract.tesseract_cmd != cmd:
+        pytesseract.pytesseract.tesseract_cmd = cmd
+    if not isinstance(pytesseract.pytesseract.subprocess, _StageSubprocess):
+        pytesseract.pytesseract.subprocess = _StageSubprocess()
+    return pytesseract
+
+
+class _StageSubprocess:
+    """pytesseract's `subprocess`: Tesseract started by a speculative stage is registered with
+    its kill handle (stages.current_cancel), so a discarded OCR run is terminated, not waited for"""
+
+    def __getattr__(self, name):
+        return getattr(subprocess, name)
+
+    @staticmethod
+    def Popen(*args, **kwargs):
+        proc = subprocess.Popen(*args, **kwargs)
+        handle = current_cancel()
+        if handle is not None:
+            handle.register(proc)
+        return proc
+
+
+# Ink gate before the corner OCR: blank corners (digital invoices) skip Tesseract,
+# others are cropped to the ink. Full resolution, so one-pixel pencil strokes
+# count; the threshold follows the paper level of the region (gray recycled
+# paper, dark scans), and isolated scan specks are dropped as tiny components.
+INK_CONTRAST = 32  # Darker than the paper by this much (after a 3x3 blur) = ink
+MIN_INK_COMPONENT = 16  # Smaller connected blobs are specks and dust (digit strokes: ~60 px at 300 DPI)
+MIN_INK_PIXELS = 100  # Less ink than about one handwritten digit in thin strokes (300 DPI) = blank
+INK_MARGIN = 16  # Pixels around the ink bounding box
+
+
+def ink_bbox(gray) -> Optional[Tuple[int, int, int, int]]:
+    """Bounding box (x0, y0, x1, y1) of the ink in a grayscale region, None if blank"""
+    import cv2
+    import numpy as np
+    h, w = gray.shape[:2]
+    # Paper level: median of a sparse sample (ink covers little of the region)
+    background = int(np.median(gray[::8, ::8]))
+    # Light blur: scanner noise averages out, a one-pixel stroke keeps half its contrast
+    blurred = cv2.GaussianBlur(gray, (3, 3), 0)
+    ink = (blurred < background - INK_CONTRAST).astype(np.uint8)
+    if cv2.countNonZero(ink) < MIN_INK_PIXELS:
+        return None
+    _, _, stats, _ = cv2.connectedComponentsWithStats(ink, connectivity=8)
+    blobs = stats[1:][stats[1:, cv2.CC_STAT_AREA] >= MIN_INK_COMPONENT]
+    if blobs[:, cv2.CC_STAT_AREA].sum() < MIN_INK_PIXELS:
+        return None
+    x0, y0 = blobs[:, cv2.CC_STAT_LEFT].min(), blobs[:, cv2.CC_STAT_TOP].min()
+    x1 = (blobs[:, cv2.CC_STAT_LEFT] + blobs[:, cv2.CC_STAT_WIDTH]).max()
+    y1 = (blobs[:, cv2.CC_STAT_TOP] + blobs[:, cv2.CC_STAT_HEIGHT]).max()
+    return (int(max(0, x0 - INK_MARGIN)), int(max(0, y0 - INK_MARGIN)),
+            int(min(w, x1 + INK_MARGIN)), int(min(h, y1 + INK_MARGIN)))
+
+
+class InkGateStats:
+    """Process-wide counters of the corner OCR ink gate (/api/status "corner_ocr")"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {"blank_skipped": 0, "cropped": 0, "region_pixels": 0, "ocr_pixels": 0}
+
+    def record(self, region_pixels: int, ocr_pixels: int):
+        with self._lock:
+            self._counts["blank_skipped" if not ocr_pixels else "cropped"] += 1
+            self._counts["region_pixels"] += region_pixels
+            self._counts["ocr_pixels"] += ocr_pixels
+
+    def counts(self) -> dict:
+        """Raw counters (summed over batch worker processes, see summarize)"""
+        with self._lock:
+            return dict(self._counts)
+
+    def stats(self) -> dict:
+        return self.summarize(self.counts())
+
+    @staticmethod
+    def summarize(counts: dict) -> dict:
+        counts = dict(counts)
+        region = counts.pop("region_pixels")
+        ocr = counts.pop("ocr_pixels")
+        return {**counts, "calls": counts["blank_skipped"] + counts["cropped"],
+                # Share of corner pixels not sent to Tesseract
+                "pixels_saved": round(1 - ocr / region, 3) if region else None}
+
+
+corner_stats = InkGateStats()
+
+
+# Layout regions for vendor detection (fractions of the page)
+HEADER_BAND = 0.20  # Top: letterhead, logo
+FOOTER_BAND = 0.80  # Bottom: company data, register, bank
+LOGO_BAND = 0.12  # Logo area: top-left / top-right corner
+LOGO_SIDE = 1 / 3
+
+# Vendor candidate weights: kind of evidence + where it is on the page
+VENDOR_KIND_SCORE = {"known": 4.0, "email": 1.5, "from": 1.0}
+VENDOR_REGION_SCORE = {"header": 3.0, "footer": 2.0, "body": 0.0}
+VENDOR_LOGO_BONUS = 1.0
+VENDOR_MAX_SIZE_BONUS = 2.0  # For lines set much larger than body text
+VENDOR_KEYWORDS = re.compile(r'@|von|from|sold by|firma|company')  # Prefilter: email and from/Firma patterns
+
+
+@dataclass
+class OCRLine:
+    """One recognized text line with its bounding box in page pixels"""
+    text: str
+    left: int
+    top: int
+    width: int
+    height: int
+
+
+class OCRText(str):
+    """OCR text (usable as plain str) that also carries the recognized lines and page size"""
+
+    def __new__(cls, text: str, lines: List[OCRLine] = (), page_width: int = 0, page_height: int = 0):
+        obj = super().__new__(cls, text)
+        obj.lines = list(lines)
+        obj.page_width = page_width
+        obj.page_height = page_height
+        return obj
+
+
+def ocr_text_from_data(data: dict, page_width: int, page_height: int, remap_top=None) -> OCRText:
+    """Build OCRText from pytesseract image_to_data (DICT): words grouped into lines, blank line between blocks"""
+    groups = {}
+    for i, word in enumerate(data["text"]):
+        word = word.strip()
+        if not word:
+            continue
+        key = (data["page_num"][i], data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        left, top = data["left"][i], data["top"][i]
+        right, bottom = left + data["width"][i], top + data["height"][i]
+        group = groups.get(key)
+        if group is None:
+            groups[key] = [[word], left, top, right, bottom]
+        else:
+            group[0].append(word)
+            group[1], group[2] = min(group[1], left), min(group[2], top)
+            group[3], group[4] = max(group[3], right), max(group[4], bottom)
+
+    lines, parts, previous_block = [], [], None
+    for key, (words, left, top, right, bottom) in groups.items():
+        if previous_block is not None and key[:2] != previous_block:
+            parts.append("")
+        previous_block = key[:2]
+        text = " ".join(words)
+        parts.append(text)
+        if remap_top is not None:
+            top, bottom = remap_top(top), remap_top(bottom)
+        lines.append(OCRLine(text, left, top, right - left, bottom - top))
+    return OCRText("\n".join(parts) + "\n" if parts else "", lines, page_width, page_height)
+
+
 class BaseOCRProcessor:
     """Base class for OCR document processing"""
 
-    def __init__(self):
-        self.ocr_ok = self._check_ocr()
-        self.qr_ok = self._check_qr()
+    # Preprocessing / Tesseract settings (ocr_profiles.py)
+    profile: OCRProfile = DEFAULT_PROFILE
+    # Run the full-page OCR even when QR payloads already filled the required fields
+    qr_verify: bool = False
+    # Per-vendor field zones (zonal.py); None = always full-page OCR
+    zone_templates: Optional[ZoneTemplateStore] = None
+
+    def __init__(self, probe: bool = True):
+        # probe=False defers the tesseract/pyzbar checks (see Parser.warm_up in mae.py)
+        self.ocr_ok = self._check_ocr() if probe else False
+        self.qr_ok = self._check_qr() if probe else False
 
     def _check_ocr(self) -> bool:
         try:
-            import pytesseract
+            pytesseract = _pytesseract()
             pytesseract.get_tesseract_version()
             return True
         except Exception:
@@ -132,29 +385,67 @@ class BaseOCRProcessor:
             return False
 
     def load_image(self, path):
-        """Load image from file (PDF or image).
+        """Load first page of file (PDF or image) as grayscale raster.
 
-        For PDF files, only the first page is loaded to optimize memory usage.
+        For PDF files, only the first page is rendered to optimize memory usage.
+        Large images are decoded at reduced resolution, see iter_pages().
+        """
+        return next(self.iter_pages(path), None)
+
+    def iter_pages(self, path):
+        """Yield pages of a document one at a time as grayscale rasters.
+
+        Only one page is held in memory at a time. The pipeline binarizes
+        anyway, so pages are decoded straight to grayscale (3x less memory than BGR).
         """
-        import cv2
         import numpy as np
 
         ext = path.suffix.lower()
         if ext == ".pdf":
-            from pdf2image import convert_from_path
-            # Only load first page to save memory (50MB PDF = 500MB RAM without this)
-            imgs = convert_from_path(path, dpi=300, first_page=1, last_page=1)
-            if imgs:
-                img = np.array(imgs[0])
-                if len(img.shape) == 3:
-                    img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
-                return img
-            return None
-        else:
-            return cv2.imread(str(path))
+            from pdf2image import convert_from_path, pdfinfo_from_path
+            page, last_page = 1, None
+            while last_page is None or page <= last_page:
+                # One page per call (50MB PDF = 500MB RAM when rendering all at once)
+                imgs = convert_from_path(path, dpi=self.profile.dpi, first_page=page, last_page=page,
+                                         grayscale=True)
+                if not imgs:
+                    return
+                yield np.array(imgs[0])
+                if last_page is None:
+                    # Page count only needed when the caller asks for more than page 1
+                    last_page = pdfinfo_from_path(path).get("Pages", 1)
+                page += 1
+            return
+
+        header = read_image_header(path)
+        if header and header["frames"] > 1:
+            yield from self._iter_image_frames(path)
+            return
+
+        import cv2
+        factor = (choose_reduction(header["width"], header["height"], header["dpi"], self.profile.dpi)
+                  if header else 1)
+        img = cv2.imread(str(path), _imread_flag(factor))
+        if img is not None:
+            yield img
+
+    def _iter_image_frames(self, path):
+        """Decode multi-page TIFF frame by frame at reduced resolution"""
+        import numpy as np
+        from PIL import Image
+
+        with Image.open(path) as im:
+            for i in range(getattr(im, "n_frames", 1)):
+                im.seek(i)
+                dpi = _header_dpi(im.info)
+                factor = choose_reduction(im.width, im.height, dpi, self.profile.dpi)
+                frame = im.convert("L")
+                if factor > 1:
+                    frame = frame.reduce(factor)
+                yield np.asarray(frame)
 
     def preprocess_for_ocr(self, img):
-        """Preprocess image for OCR"""
+        """Preprocess image for OCR (blur and binarization from the profile)"""
         import cv2
 
         if len(img.shape) == 3:
@@ -162,7 +453,14 @@ class BaseOCRProcessor:
         else:
             gray = img
 
-        gray = cv2.GaussianBlur(gray, (3, 3), 0)
+        profile = self.profile
+        if profile.blur:
+            gray = cv2.GaussianBlur(gray, (profile.blur, profile.blur), 0)
+        if profile.binarization == "adaptive":
+            # Local threshold: uneven lighting of phone photos, stamps, shadows
+            return cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 15)
+        if profile.binarization == "none":
+            return gray
         _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
         return binary
 
@@ -178,33 +476,233 @@ class BaseOCRProcessor:
         return results
 
     def extract_internal_from_qr(self, qr_data: List[str]) -> Optional[str]:
-        """Extract internal number from QR data (format SN<...>)"""
-        for data in qr_data:
-            match = re.search(r'SN[<\[]?0*(\d+)[>\]]?', data, re.I)
-            if match:
-                return match.group(1)
-            match = re.search(r'SN\s*:?\s*0*(\d+)', data, re.I)
-            if match:
+        """Extract internal number from QR data (format SN<...>); payment codes are never read as SN"""
+        for payload in parse_payloads(qr_data):
+            if payload.kind == "sn":
+                return payload.internal_number
+        return None
+
+    def fields_from_qr(self, qr_data: List[str]) -> Dict[str, Optional[str]]:
+        """vendor, invoice_number and internal_number from structured QR payloads (qr_payloads.py).
+
+        Vendor is the beneficiary of an EPC / Swiss QR payment code (known vendor
+        name if it matches one), invoice number the Swico billing tag or a
+        labelled number in the remittance text. An unlabelled token of the
+        remittance text is only kept as invoice_hint: the full-page OCR still
+        runs and has to confirm it (see merge_ocr_fields).
+        """
+        fields = {"vendor": None, "invoice_number": None, "internal_number": self.extract_internal_from_qr(qr_data),
+                  "invoice_hint": None}
+        for payload in parse_payloads(qr_data):
+            if payload.name and not fields["vendor"]:
+                match = self._match_vendor(payload.name)
+                if match and match[1] == "known":
+                    fields["vendor"] = match[0]
+                elif not any(excl in payload.name.lower() for excl in EXCLUDED_VENDORS):
+                    fields["vendor"] = " ".join(payload.name.split()[:3])
+            if not fields["invoice_number"]:
+                fields["invoice_number"] = payload.invoice_number or self._invoice_from_remittance(payload.remittance)
+            if not fields["invoice_number"] and not fields["invoice_hint"]:
+                fields["invoice_hint"] = self._invoice_hint_from_remittance(payload.remittance)
+        if fields["invoice_number"]:
+            fields["invoice_hint"] = None
+        return fields
+
+    def _invoice_from_remittance(self, text: Optional[str]) -> Optional[str]:
+        """Labelled invoice number in a transfer's remittance text"""
+        if not text:
+            return None
+        labelled = self.extract_invoice_number(text)
+        if labelled:
+            return labelled
+        match = REMITTANCE_INVOICE_LABEL.search(text)
+        if match and any(c.isdigit() for c in match.group(1)):
+            return match.group(1)
+        return None
+
+    def _invoice_hint_from_remittance(self, text: Optional[str]) -> Optional[str]:
+        """First unlabelled token with a digit: may as well be a date or a reference, OCR must confirm it"""
+        if not text:
+            return None
+        for match in REMITTANCE_TOKEN.finditer(text):
+            # Label directly in front of the token (customer / order number)
+            context = text[max(0, match.start() - 20):match.start()]
+            if any(c.isdigit() for c in match.group(1)) \
+                    and not any(re.search(p + r'[.:\s]*$', context, re.I) for p in EXCLUDED_INVOICE_PATTERNS):
                 return match.group(1)
         return None
 
+    def needs_ocr(self, fields: Dict[str, Optional[str]]) -> bool:
+        """Full-page OCR is needed unless QR payloads filled all QR_REQUIRED_FIELDS (or qr_verify is set)"""
+        return self.qr_verify or not all(fields.get(f) for f in QR_REQUIRED_FIELDS)
+
+    def extract_text_fields(self, img, fields: Dict[str, Optional[str]]) -> Dict[str, Optional[str]]:
+        """Fill vendor, invoice_number and vat_id from the full-page OCR where QR left them empty.
+
+        Skips the OCR entirely when needs_ocr() is False and OCRs only the
+        learned field zones when the vendor has a template. QR values win over
+        OCR, disagreements are logged (qr_verify runs the full OCR to get them).
+        """
+        fields.setdefault("vat_id", None)
+        if not self.needs_ocr(fields):
+            logger.debug("Fields from QR payload, full-page OCR skipped")
+            return fields
+        if self.use_zones(fields) and self._extract_zones(img, fields):
+            return fields
+        return self.merge_ocr_fields(img, self.run_ocr(img), fields)
+
+    def use_zones(self, fields: Dict[str, Optional[str]]) -> bool:
+        """Zone-only OCR is worth a try: templates enabled, OCR needed and no qr_verify"""
+        return self.zone_templates is not None and not self.qr_verify and self.needs_ocr(fields)
+
+    def merge_ocr_fields(self, img, text: str, fields: Dict[str, Optional[str]]) -> Dict[str, Optional[str]]:
+        """Fill empty fields from the full-page OCR text (QR values win) and learn the vendor's zones"""
+        fields.setdefault("vat_id", None)
+        ocr = {"vendor": self.extract_vendor(text, img), "invoice_number": self.extract_invoice_number(text),
+               "vat_id": self.extract_vat_id(text)}
+        for name, value in ocr.items():
+            if not fields.get(name):
+                fields[name] = value
+            elif value and value.casefold() != fields[name].casefold():
+                logger.info("QR / OCR mismatch for %s: %r (QR) vs %r (OCR)", name, fields[name], value)
+        hint = fields.get("invoice_hint")
+        if not fields["invoice_number"] and hint \
+                and re.search(r'(?<![\w-])' + re.escape(hint) + r'(?![\w-])', text, re.I):
+            # Unlabelled remittance token printed on the page as well
+            fields["invoice_number"] = hint
+        if self.zone_templates is not None:
+            self._learn_zones(img, text, fields)
+        return fields
+
+    def _extract_zones(self, img, fields: Dict[str, Optional[str]],
+                       candidates: Optional[List[ZoneTemplate]] = None) -> bool:
+        """Fill missing fields from the template zones only; False (fields untouched) = full-page OCR.
+
+        candidates: letterhead matches of this page already computed (see stage_graph);
+        a vendor from the QR payload still selects its template directly.
+        """
+        h, w = img.shape[:2]
+        pixels = 0
+        if candidates is None or fields.get("vendor"):
+            candidates = self.zone_templates.match(img, fields.get("vendor"))
+        for template in candidates:
+            zones = {name: template.zone(name) for name in ZONE_FIELDS if not fields.get(name)}
+            if any(zones.get(name, True) is None for name in QR_REQUIRED_FIELDS):
+                continue  # Field never located for this vendor
+            found = {}
+            for name, zone in zones.items():  # Vendor first: confirms a fingerprint match
+                if zone is None:
+                    continue  # Optional field (VAT ID) not seen on this vendor's documents
+                x0, y0, x1, y1 = zone
+                crop = img[int(y0 * h):int(y1 * h), int(x0 * w):int(x1 * w)]
+                pixels += crop.shape[0] * crop.shape[1]
+                value = self._zone_value(template, name, self._ocr_zone(crop, self._single_line(template, name)))
+                if value is None:
+                    break
+                found[name] = value
+            if len(found) == sum(zone is not None for zone in zones.values()):
+                self.zone_templates.record(template, True, pixels, h * w)
+                fields.update(found)
+                return True
+            if "vendor" in found or "vendor" not in zones:
+                # Right vendor, but a field moved: the template is wrong for this document
+                logger.debug("Zones of %s did not validate, full-page OCR", template.vendor)
+                self.zone_templates.record(template, False, pixels, h * w)
+                return False
+        if pixels:
+            self.zone_templates.record(None, False, pixels, h * w)
+        return False
+
+    def _zone_value(self, template: ZoneTemplate, name: str, text: str) -> Optional[str]:
+        """Validated field value of a zone's text (same extractors as the full page)"""
+        if name == "vendor":
+            return template.vendor if self._find_vendor_in_text(text) == template.vendor else None
+        if name == "invoice_number":
+            return self.extract_invoice_number(text)
+        return self.extract_vat_id(text)
+
+    @staticmethod
+    def _single_line(template: ZoneTemplate, name: str) -> bool:
+        """All observed boxes on one line (same rows) -> OCR as a single text line"""
+        boxes = template.boxes[name]
+        height = max(b[3] - b[1] for b in boxes)
+        return max(b[3] for b in boxes) - min(b[1] for b in boxes) <= 1.5 * height
+
+    def _ocr_zone(self, crop, single_line: bool) -> str:
+        """OCR of one field zone: single line (PSM 7) or uniform block (PSM 6)"""
+        pytesseract = _pytesseract()
+        return pytesseract.image_to_string(self.preprocess_for_ocr(crop), lang=self.profile.lang,
+                                           config=f"--psm {7 if single_line else 6}")
+
+    def _learn_zones(self, img, text, fields: Dict[str, Optional[str]]):
+        """Record where vendor, invoice number and VAT ID were found (complete results only)"""
+        lines = getattr(text, "lines", None)
+        if not lines or not all(fields.get(f) for f in QR_REQUIRED_FIELDS):
+            return
+        extractors = {"vendor": self._find_vendor_in_text, "invoice_number": self.extract_invoice_number,
+                      "vat_id": self.extract_vat_id}
+        boxes = {}
+        # Topmost line with the value: letterhead rather than a mention in the body
+        for line in sorted(lines, key=lambda line: line.top):
+            for name in ZONE_FIELDS:
+                if name not in boxes and fields.get(name) and extractors[name](line.text) == fields[name]:
+                    boxes[name] = line_box(line.left, line.top, line.width, line.height,
+                                           text.page_width, text.page_height)
+        if "invoice_number" in boxes:
+            self.zone_templates.learn(fields["vendor"], img, boxes)
+
+    def stage_graph(self, img) -> StageGraph:
+        """Stages of one page: the QR payloads decide which OCR is needed.
+
+        - qr: SN<...> label, EPC / Swiss QR payment codes (fields_from_qr)
+        - zones: learned field zones of the vendor, if the QR left fields empty
+        - ocr: full-page OCR, unless QR or zones filled vendor and invoice number;
+          speculative, so it runs alongside the QR decode
+        - corner: handwritten internal number, unless a QR code carried it; speculative
+        """
+        # Letterhead matched once per page (the zones stage reuses it). A page with a zone template will
+        # most likely be read from its zones: don't burn a Tesseract run on the full page in the meantime
+        # (a template found via the QR vendor can't be known yet)
+        candidates = self.zone_templates.match(img) if self.zone_templates is not None and not self.qr_verify else []
+        return StageGraph([
+            Stage("qr", lambda res: self.fields_from_qr(self.extract_qr_codes(img))),
+            Stage("zones", lambda res: self._extract_zones(img, res["qr"], candidates), after=("qr",),
+                  needed=lambda res: self.use_zones(res["qr"])),
+            Stage("ocr", lambda res: self.run_ocr(img), after=("qr", "zones"),
+                  needed=lambda res: self.needs_ocr(res["qr"]) and not res["zones"], speculative=not candidates),
+            Stage("corner", lambda res: self.extract_internal_from_corner(img), after=("qr",),
+                  needed=lambda res: not res["qr"]["internal_number"], speculative=True),
+        ])
+
     def extract_internal_from_corner(self, img) -> Optional[str]:
-        """Extract handwritten number from top-right quarter of document"""
+        """Extract handwritten number from top-right quarter of document.
+
+        Blank corners are skipped without OCR, others cropped to the ink (see ink_bbox).
+        """
         import cv2
-        import pytesseract
 
         h, w = img.shape[:2]
-        corner = img[0:int(h*0.50), int(w*0.50):w]  # Top-right quarter (50% x 50%)
+        roi = self.profile.corner_roi
+        corner = img[0:int(h*roi), int(w*(1 - roi)):w]  # Top-right corner (default: quarter, 50% x 50%)
 
         if len(corner.shape) == 3:
             gray = cv2.cvtColor(corner, cv2.COLOR_BGR2GRAY)
         else:
             gray = corner
 
+        bbox = ink_bbox(gray)
+        if bbox is None:
+            corner_stats.record(gray.size, 0)
+            return None
+        x0, y0, x1, y1 = bbox
+        gray = gray[y0:y1, x0:x1]
+        corner_stats.record(corner.shape[0] * corner.shape[1], gray.size)
+
+        pytesseract = _pytesseract()
         gray = cv2.equalizeHist(gray)
         _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
 
-        custom_config = r'--oem 3 --psm 6 -c tessedit_char_whitelist=0123456789'
+        custom_config = f'--oem 3 --psm {self.profile.corner_psm} -c tessedit_char_whitelist=0123456789'
         text = pytesseract.image_to_string(binary, config=custom_config)
 
         numbers = re.findall(r'\d{4,}', text)
@@ -223,20 +721,25 @@ class BaseOCRProcessor:
 
     def _ocr_region(self, img, region: str) -> str:
         """Run OCR on header or footer region"""
-        import pytesseract
+        pytesseract = _pytesseract()
         region_img = self._extract_region(img, region)
         processed = self.preprocess_for_ocr(region_img)
         return pytesseract.image_to_string(processed, lang='deu+eng')
 
     def _find_vendor_in_text(self, text: str) -> Optional[str]:
         """Find vendor in text using patterns"""
+        match = self._match_vendor(text)
+        return match[0] if match else None
+
+    def _match_vendor(self, text: str) -> Optional[Tuple[str, str]]:
+        """(vendor, kind) of the strongest evidence in text: known vendor > email domain > from/von"""
         text_lower = text.lower()
 
         # Check known vendors
         for vendor_name, patterns in KNOWN_VENDORS.items():
             for pattern in patterns:
                 if pattern in text_lower:
-                    return vendor_name
+                    return vendor_name, "known"
 
         # Try email domain
         match = re.search(r'@([a-zA-Z0-9-]+)\.[a-z]{2,}', text)
@@ -244,7 +747,7 @@ class BaseOCRProcessor:
             domain = match.group(1).title()
             # Проверяем что это не исключённый vendor
             if not any(excl in domain.lower() for excl in EXCLUDED_VENDORS):
-                return domain
+                return domain, "email"
 
         # Try "from/von" patterns
         for pattern in [r'(?:von|from|verkauft von|sold by)[:\s]+([A-Z][a-zA-Z0-9\s&]+?)(?:\s*[,\n]|$)',
@@ -256,15 +759,18 @@ class BaseOCRProcessor:
                 if any(excl in vendor.lower() for excl in EXCLUDED_VENDORS):
                     continue
                 words = vendor.split()[:3]
-                return " ".join(words)
+                return " ".join(words), "from"
         return None
 
     def extract_vendor(self, text: str, img=None) -> Optional[str]:
         """Extract vendor name - first from header, then footer, then full text.
 
-        Optimized: Uses text line positions instead of additional OCR calls.
-        Previous version ran OCR 3 times (header, footer, full), now runs once.
+        With OCRText from run_ocr() the real line positions are used (see
+        _vendor_from_layout); plain text falls back to line-count fractions.
         """
+        if getattr(text, "lines", None) and text.page_height:
+            return self._vendor_from_layout(text)
+
         # Split text into lines and estimate regions by line count
         lines = text.split('\n')
         total_lines = len(lines) if lines else 1
@@ -290,6 +796,44 @@ class BaseOCRProcessor:
         # Fallback to full text search
         return self._find_vendor_in_text(text)
 
+    def _vendor_from_layout(self, text: OCRText) -> Optional[str]:
+        """Best vendor candidate in one pass over the OCR lines.
+
+        Score = evidence (known vendor, email domain, from/von) + region (header,
+        footer, body) + logo corner + font size relative to the body text.
+        Ties go to the first line in reading order.
+        """
+        width, height = text.page_width or 1, text.page_height
+        body_height = statistics.median(line.height for line in text.lines) or 1
+        # Known-vendor patterns present anywhere on the page: lines without any
+        # of them, an email or a from/Firma keyword can't match and are skipped
+        text_lower = text.lower()
+        present = [p for patterns in KNOWN_VENDORS.values() for p in patterns if p in text_lower]
+        best, best_score = None, 0.0
+        for line in text.lines:
+            line_lower = line.text.lower()
+            if not (any(p in line_lower for p in present) or VENDOR_KEYWORDS.search(line_lower)):
+                continue
+            match = self._match_vendor(line.text)
+            if not match:
+                continue
+            vendor, kind = match
+            center = (line.top + line.height / 2) / height
+            if center < HEADER_BAND:
+                region = "header"
+            elif center > FOOTER_BAND:
+                region = "footer"
+            else:
+                region = "body"
+            score = VENDOR_KIND_SCORE[kind] + VENDOR_REGION_SCORE[region]
+            if center < LOGO_BAND and (line.left + line.width < width * LOGO_SIDE
+                                       or line.left > width * (1 - LOGO_SIDE)):
+                score += VENDOR_LOGO_BONUS
+            score += min(VENDOR_MAX_SIZE_BONUS, max(0.0, line.height / body_height - 1))
+            if score > best_score:
+                best, best_score = vendor, score
+        return best
+
     def extract_invoice_number(self, text: str) -> Optional[str]:
         """Extract invoice number from text.
 
@@ -353,8 +897,35 @@ class BaseOCRProcessor:
                     return vat
         return None
 
-    def run_ocr(self, img, lang: str = 'deu+eng') -> str:
-        """Run OCR on image"""
-        import pytesseract
+    def run_ocr(self, img, lang: Optional[str] = None) -> OCRText:
+        """Run OCR on image (languages, PSM/OEM and text ROI from the profile).
+
+        One Tesseract pass (image_to_data) yields both the text and the line
+        boxes that extract_vendor() scores by position.
+        """
+        pytesseract = _pytesseract()
+        page_height, page_width = img.shape[:2]
+        remap_top = None
+        if self.profile.text_roi == "bands":
+            img = self._text_bands(img)
+            remap_top = self._band_to_page(page_height)
         processed = self.preprocess_for_ocr(img)
-        return pytesseract.image_to_string(processed, lang=lang)
+        data = pytesseract.image_to_data(processed, lang=lang or self.profile.lang,
+                                         config=self.profile.tesseract_config(),
+                                         output_type=pytesseract.Output.DICT)
+        return ocr_text_from_data(data, page_width, page_height, remap_top)
+
+    @staticmethod
+    def _text_bands(img):
+        """Top and bottom of the page stacked into one image (line order stays top to bottom)"""
+        import numpy as np
+        h = img.shape[0]
+        top, bottom = TEXT_BANDS
+        return np.concatenate([img[:int(h * top)], img[int(h * (1 - bottom)):]])
+
+    @staticmethod
+    def _band_to_page(page_height: int):
+        """Row mapping from the stacked _text_bands() image back to the page"""
+        top_rows = int(page_height * TEXT_BANDS[0])
+        gap = int(page_height * (1 - TEXT_BANDS[1])) - top_rows
+        return lambda y: y if y < top_rows else y + gap
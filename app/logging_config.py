@@ -27,7 +27,7 @@ class JSONFormatter(logging.Formatter):
             log_data["exception"] = self.formatException(record.exc_info)
 
         # Add extra fields
-        for key in ["request_id", "file", "duration_ms", "user_agent"]:
+        for key in ["request_id", "file", "duration_ms", "user_agent", "memprofile"]:
             if hasattr(record, key):
                 log_data[key] = getattr(record, key)
 
@@ -13,6 +13,7 @@ import subprocess
 import shutil
 import time
 import re
+import hmac
 from pathlib import Path, PurePath
 from typing import Optional, List
 from datetime import datetime
@@ -30,6 +31,7 @@ APP_DIR = Path(__file__).parent
 ROOT_DIR = APP_DIR.parent
 DATA_DIR = ROOT_DIR / "data"
 CONFIG_FILE = DATA_DIR / "config.json"
+STATE_DB = DATA_DIR / "state.db"
 TEMPLATES_DIR = APP_DIR / "templates"
 
 # Add app directory to path for imports
@@ -41,14 +43,40 @@ from setup_env import setup_all
 setup_all()
 
 # Core OCR processing
-from core import BaseOCRProcessor, ConfidenceScore
+from core import BaseOCRProcessor, ConfidenceScore, corner_stats
+from ocr_profiles import load_profile
+from zonal import ZoneTemplateStore
+
+# Concurrent stages within one document (QR decode / full OCR / corner OCR)
+from stages import stage_stats
+
+# Opt-in memory profiling per stage / document
+from memprofile import MemoryProfiler
+
+# On-demand CPU sampling of live parsing (admin endpoint)
+from profiling import PROFILE_FORMATS, ProfilerBusy, SamplingProfiler
 
 # OCR cache
 from cache import get_cache
 
+# Thumbnails made from the OCR raster
+from previews import PreviewCache
+
+# Folder watching (watchdog is optional)
+from watcher import BACKENDS as WATCH_BACKENDS, FolderWatcher, ProcessedJournal
+
+# Priority scheduling of parse work
+from scheduler import PriorityScheduler, Priority, SchedulerSaturated, default_workers
+
+# In-memory, pre-compressed UI and static files
+from assets import AssetStore
+
+# State shared between server processes (also registers sqlite:// for the rate limiter)
+from state import SharedState, process_id
+
 import uvicorn
 from fastapi import FastAPI, HTTPException, UploadFile, File, Request
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 
 # Rate limiting
@@ -66,21 +94,35 @@ if os.environ.get("DISPLAY") or sys.platform == "darwin" or sys.platform == "win
     except ImportError:
         pass
 
-try:
-    from watchdog.observers import Observer
-    from watchdog.events import FileSystemEventHandler
-    WATCHDOG_OK = True
-except ImportError:
-    WATCHDOG_OK = False
-    Observer = None
-    FileSystemEventHandler = object
-
 
 class Config:
     APP_NAME = "MAE-IDP"
     VERSION = "1.5.0"
     HOST = "0.0.0.0"  # Allow access from local network
     PORT = int(os.environ.get("PORT", 8766))  # Render sets PORT env var
+    PARSE_WORKERS = int(os.environ.get("MAE_PARSE_WORKERS", default_workers()))  # Parallel parse jobs
+    # Stages of one document running at once (QR decode, full-page OCR, corner OCR); 1 = one after another.
+    # Default: the cores left per parse worker, at most the 3 independent stages
+    PARSE_PARALLELISM = int(os.environ.get("MAE_PARSE_PARALLELISM",
+                                           min(3, max(1, (os.cpu_count() or 1) // max(1, PARSE_WORKERS)))))
+    WATCHER_WORKERS = int(os.environ.get("MAE_WATCHER_WORKERS", 4))  # Watcher dispatch threads
+    HTTP_WORKERS = int(os.environ.get("MAE_HTTP_WORKERS", 1))  # uvicorn processes on one port
+    # Watcher defaults: "auto" polls SMB/NFS shares, uses native events elsewhere
+    WATCH_BACKEND = os.environ.get("MAE_WATCH_BACKEND", "auto").lower()
+    WATCH_RECURSIVE = os.environ.get("MAE_WATCH_RECURSIVE", "0").lower() in ("1", "true", "yes")
+    WATCH_POLL_INTERVAL = float(os.environ.get("MAE_WATCH_POLL_INTERVAL", 5.0))  # Seconds
+    # "background": bind port first, probe OCR and load cache afterwards; "eager": before serving
+    WARMUP = os.environ.get("MAE_WARMUP", "background").lower()
+    # Named OCR profile (data/ocr_profiles.json, see benchmarks/bench_ocr_sweep.py)
+    OCR_PROFILE = os.environ.get("MAE_OCR_PROFILE", "default")
+    # Full-page OCR also when EPC / Swiss QR payloads already carry vendor and invoice number
+    QR_VERIFY = os.environ.get("MAE_QR_VERIFY", "0").lower() in ("1", "true", "yes")
+    # Per-vendor field zones learned from successful documents (data/zone_templates.json)
+    ZONAL_OCR = os.environ.get("MAE_ZONAL_OCR", "1").lower() in ("1", "true", "yes")
+    # tracemalloc + RSS per stage and document: structured logs and /api/status "memory"
+    MEMPROFILE = os.environ.get("MAE_MEMPROFILE", "0").lower() in ("1", "true", "yes")
+    # Admin endpoints (/api/admin/*) exist only when a token is set; sent as X-Admin-Token
+    ADMIN_TOKEN = os.environ.get("MAE_ADMIN_TOKEN", "")
     INPUT_DIR = DATA_DIR / "input"
     OUTPUT_DIR = DATA_DIR / "output"
     ARCHIVE_DIR = DATA_DIR / "archive"
@@ -105,30 +147,79 @@ class ParsedDoc:
     confidence: int = 0
     error: Optional[str] = None
     timestamp: Optional[str] = None
+    preview: Optional[str] = None  # Thumbnail key (content hash), see /api/preview
+    file_hash: Optional[str] = None  # SHA-256 of the file (watcher journal, no second read)
 
 
 # KNOWN_VENDORS imported from core.py
 
 
 class Parser(BaseOCRProcessor):
-    """Document parser using shared OCR processing logic"""
+    """Document parser using shared OCR processing logic.
+
+    Construction is cheap: the tesseract/pyzbar probes and the cache load run in
+    warm_up(), either from a background thread after the port is bound or on the
+    first parse, whichever comes first.
+    """
 
     def __init__(self):
-        super().__init__()
-        self.cache = get_cache()
+        super().__init__(probe=False)
+        self.cache = None
+        self.previews = None
+        self.warmup_seconds: Optional[float] = None
+        self.stage_budget = 1
+        self.stage_pool: Optional[ThreadPoolExecutor] = None
+        self._ready = threading.Event()
+        self._warmup_lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def warm_up(self):
+        """Probe OCR/QR capabilities and load the OCR cache (idempotent)"""
+        with self._warmup_lock:
+            if self._ready.is_set():
+                return
+            start = time.perf_counter()
+            self.ocr_ok = self._check_ocr()
+            self.qr_ok = self._check_qr()
+            try:
+                self.profile = load_profile(Config.OCR_PROFILE)
+            except KeyError as e:
+                logger.warning("%s - using default", e)
+            self.qr_verify = Config.QR_VERIFY
+            self.zone_templates = ZoneTemplateStore() if Config.ZONAL_OCR else None
+            self.cache = get_cache()
+            self.previews = PreviewCache(DATA_DIR / "previews")
+            # Memory profiling records stages per thread and resets one global peak: sequential stages
+            self.stage_budget = 1 if Config.MEMPROFILE else max(1, Config.PARSE_PARALLELISM)
+            # Tesseract (OpenMP) inherits this: up to workers x budget runs at once share the cores
+            concurrent_ocr = max(1, Config.PARSE_WORKERS) * self.stage_budget
+            os.environ.setdefault("OMP_THREAD_LIMIT", str(max(1, (os.cpu_count() or 1) // concurrent_ocr)))
+            if self.stage_budget > 1:
+                self.stage_pool = ThreadPoolExecutor(max_workers=max(1, Config.PARSE_WORKERS) * (self.stage_budget - 1),
+                                                     thread_name_prefix="parse-stage")
+            self.warmup_seconds = round(time.perf_counter() - start, 3)
+            self._ready.set()
+        logger.info("Warm-up done in %.2fs (ocr=%s, qr=%s, profile=%s)", self.warmup_seconds, self.ocr_ok,
+                    self.qr_ok, self.profile.name)
 
     def parse(self, path: Path, use_cache: bool = True) -> ParsedDoc:
+        self.warm_up()
         r = ParsedDoc(filename=path.name, timestamp=datetime.now().isoformat())
         if not self.ocr_ok:
             r.status, r.error = "error", "OCR not available"
             return r
 
-        # Check cache first
+        # Check cache first (content hash is also the preview key)
+        file_hash = self.cache.compute_hash(path)
+        r.file_hash = file_hash
         if use_cache:
-            cached = self.cache.get(path)
+            cached = self.cache.get(path, file_hash)
             if cached:
                 logger.debug("Cache hit for %s", path.name)
-                return ParsedDoc(**cached)
+                return ParsedDoc(**{**cached, "file_hash": file_hash})
 
         try:
             # Load image using base class method
@@ -136,25 +227,25 @@ class Parser(BaseOCRProcessor):
             if img is None:
                 raise ValueError("Failed to load image")
 
-            # Extract QR codes
-            qr_data = self.extract_qr_codes(img)
-            r.internal_number = self.extract_internal_from_qr(qr_data)
-
-            # If not found in QR, try corner (handwritten)
-            if not r.internal_number:
-                r.internal_number = self.extract_internal_from_corner(img)
+            # Thumbnail from the same raster, no second render for previews
+            r.preview = self._save_preview(file_hash, img)
 
-            # OCR using base class method
-            text = self.run_ocr(img)
+            # QR decode, full-page OCR and corner OCR overlap (see stage_graph in core.py)
+            stages = self.stage_graph(img).run(self.stage_pool, self.stage_budget)
+            fields = stages["qr"]
+            if stages["ocr"] is not None:
+                fields = self.merge_ocr_fields(img, stages["ocr"], fields)
+            fields.setdefault("vat_id", None)
+            r.internal_number = fields["internal_number"] or stages["corner"]
             conf = 0
 
-            # Extract vendor (header first, then footer, then full text)
-            r.vendor = self.extract_vendor(text, img)
+            # Vendor (QR beneficiary, else layout-scored OCR lines)
+            r.vendor = fields["vendor"]
             if r.vendor:
                 conf += ConfidenceScore.VENDOR
 
-            # Extract invoice number
-            r.invoice_number = self.extract_invoice_number(text)
+            # Invoice number
+            r.invoice_number = fields["invoice_number"]
             if r.invoice_number:
                 conf += ConfidenceScore.INVOICE_NUMBER
 
@@ -162,8 +253,8 @@ class Parser(BaseOCRProcessor):
             if r.internal_number:
                 conf += ConfidenceScore.INTERNAL_NUMBER
 
-            # Extract VAT ID (optional)
-            r.vat_id = self.extract_vat_id(text)
+            # VAT ID (optional, OCR only)
+            r.vat_id = fields["vat_id"]
             if r.vat_id:
                 conf += ConfidenceScore.VAT_ID
 
@@ -172,7 +263,7 @@ class Parser(BaseOCRProcessor):
 
             # Save to cache
             if use_cache:
-                self.cache.set(path, asdict(r))
+                self.cache.set(path, asdict(r), file_hash)
                 logger.debug("Cached result for %s", path.name)
 
         except Exception as e:
@@ -180,24 +271,14 @@ class Parser(BaseOCRProcessor):
 
         return r
 
-
-def _wait_for_file_ready(path: Path, timeout: float = 30.0) -> bool:
-    """Ждёт пока файл будет полностью записан (размер стабилизируется)"""
-    prev_size = -1
-    start = time.time()
-    while time.time() - start < timeout:
+    def _save_preview(self, file_hash: str, img) -> Optional[str]:
+        """Store downscaled raster as thumbnail; previews are optional, never fail parsing"""
         try:
-            if not path.exists():
-                time.sleep(0.5)
-                continue
-            size = path.stat().st_size
-            if size == prev_size and size > 0:
-                return True
-            prev_size = size
-        except OSError:
-            pass
-        time.sleep(0.5)
-    return prev_size > 0  # Вернуть True если файл существует
+            if self.previews.put(file_hash, img):
+                return file_hash
+        except Exception as e:
+            logger.debug("Preview failed for %s: %s", file_hash[:12], e)
+        return None
 
 
 def generate_archive_name(result: ParsedDoc, original_path: Path) -> str:
@@ -221,87 +302,9 @@ def generate_archive_name(result: ParsedDoc, original_path: Path) -> str:
         return f"warn_{datetime.now():%Y%m%d_%H%M%S}_{original_path.name}"
 
 
-class FolderWatcher:
-    def __init__(self, parser, on_result):
-        self.parser = parser
-        self.on_result = on_result
-        self.observer = None
-        self.watch_path = None
-        self.running = False
-        self.processed_files = set()
-        self._processed_lock = threading.Lock()  # Thread-safe access to processed_files
-
-    def start(self, watch_path: str, output_path: str = None):
-        if not WATCHDOG_OK:
-            logger.warning("Watchdog not installed, folder watching disabled")
-            return False
-
-        if self.running:
-            self.stop()
-
-        self.watch_path = Path(watch_path)
-        # output_path сохраняется в конфиге, но не используется (архив всегда в ARCHIVE_DIR)
-
-        if not self.watch_path.exists():
-            return False
-
-        watcher = self
-
-        class Handler(FileSystemEventHandler):
-            def on_created(self, event):
-                if event.is_directory:
-                    return
-                ext = Path(event.src_path).suffix.lower()
-                if ext in ['.pdf', '.jpg', '.jpeg', '.png', '.tiff', '.tif']:
-                    file_path = Path(event.src_path)
-                    if _wait_for_file_ready(file_path):
-                        watcher.process_file(file_path)
-                    else:
-                        logger.warning("File not ready after timeout: %s", event.src_path)
-
-        self.observer = Observer()
-        self.observer.schedule(Handler(), str(self.watch_path), recursive=False)
-        self.observer.start()
-        self.running = True
-        
-        # Process existing files
-        for f in self.watch_path.iterdir():
-            if f.suffix.lower() in ['.pdf', '.jpg', '.jpeg', '.png', '.tiff', '.tif']:
-                if str(f) not in self.processed_files:
-                    self.process_file(f)
-        
-        return True
-    
-    def process_file(self, path: Path):
-        # Thread-safe check and add
-        with self._processed_lock:
-            if str(path) in self.processed_files:
-                return
-            self.processed_files.add(str(path))
-        # Processing outside lock (long operation)
-        result = self.parser.parse(path)
-        self.on_result(result)
-        archive_name = generate_archive_name(result, path)
-        shutil.move(str(path), str(Config.ARCHIVE_DIR / archive_name))
-    
-    def stop(self):
-        if self.observer:
-            self.observer.stop()
-            self.observer.join()
-        self.running = False
-        self.observer = None
-    
-    @property
-    def status(self):
-        return {
-            "running": self.running,
-            "watch_path": str(self.watch_path) if self.watch_path else None
-        }
-
-
 # Constants
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
-MAX_RESULTS = 1000  # Maximum results in memory (FIFO)
+MAX_RESULTS = 1000  # Maximum stored results (FIFO)
 
 # File type validation via magic bytes
 ALLOWED_MAGIC_BYTES = {
@@ -323,22 +326,39 @@ def validate_file_magic(content: bytes) -> bool:
             return True
     return False
 
-# Thread-safe results storage
 parser = Parser()
-parser_lock = threading.Lock()  # Защита parser от параллельных вызовов
-results = []
-results_lock = threading.Lock()
+memory_profiler = MemoryProfiler(enabled=Config.MEMPROFILE)
+memory_profiler.instrument(parser)
+sampling_profiler = SamplingProfiler()
+sampling_profiler.instrument(parser)
+# All parse work goes through the scheduler: interactive > watcher > batch
+scheduler = PriorityScheduler(workers=Config.PARSE_WORKERS)
+
+# Results, batch progress, watcher lease and rate-limit counters live in SQLite,
+# so several uvicorn workers behind one port see the same state
+shared_state = SharedState(STATE_DB)
+PROCESS_ID = process_id()
 
 # Thread pool for blocking operations
 _executor = ThreadPoolExecutor(max_workers=2)
 
 def _safe_append_result(r):
-    with results_lock:
-        if len(results) >= MAX_RESULTS:
-            results.pop(0)  # FIFO: remove oldest
-        results.append(asdict(r))
+    shared_state.append_result(asdict(r), MAX_RESULTS)  # FIFO: oldest dropped
+
+def _archive_file(result: ParsedDoc, path: Path):
+    archive_name = generate_archive_name(result, path)
+    shutil.move(str(path), str(Config.ARCHIVE_DIR / archive_name))
+
+watcher = FolderWatcher(parser, _safe_append_result, scheduler,
+                        on_processed=_archive_file, workers=Config.WATCHER_WORKERS,
+                        journal=ProcessedJournal(shared_state), recursive=Config.WATCH_RECURSIVE,
+                        backend=Config.WATCH_BACKEND, poll_interval=Config.WATCH_POLL_INTERVAL,
+                        exclude=[Config.ARCHIVE_DIR])
 
-watcher = FolderWatcher(parser, _safe_append_result)
+# Only the lease holder runs the folder watcher; renewed every TTL/3 seconds
+WATCHER_LEASE = "watcher"
+WATCHER_LEASE_TTL = 30
+_shutdown_event = threading.Event()
 
 
 def load_config():
@@ -348,7 +368,72 @@ def load_config():
 
 
 def save_config(cfg):
-    CONFIG_FILE.write_text(json.dumps(cfg, indent=2))
+    # Atomic replace: other server processes may read the config concurrently
+    tmp = CONFIG_FILE.with_name(f"{CONFIG_FILE.name}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(cfg, indent=2))
+    os.replace(tmp, CONFIG_FILE)
+
+
+# _sync_watcher runs from the endpoints and the lease supervisor thread
+_watcher_lock = threading.Lock()
+
+
+def _sync_watcher():
+    """Run the configured watcher in exactly one server process (the lease holder)"""
+    with _watcher_lock:
+        cfg = load_config()
+        watch_path = cfg.get("watch_path")
+        wanted = bool(watch_path) and Path(watch_path).exists()
+
+        recursive = cfg.get("recursive", Config.WATCH_RECURSIVE)
+        backend = cfg.get("backend", Config.WATCH_BACKEND)
+
+        if wanted and shared_state.acquire_lease(WATCHER_LEASE, PROCESS_ID, WATCHER_LEASE_TTL):
+            if watcher.running and watcher.watch_path == Path(watch_path) \
+                    and (watcher.recursive, watcher.backend) == (recursive, backend):
+                return
+            if watcher.start(watch_path, cfg.get("output_path"), recursive=recursive, backend=backend):
+                logger.info("Watcher started: %s", watch_path)
+                return
+            wanted = False  # Could not start here, let another process try
+
+        if watcher.running:
+            watcher.stop()
+            logger.info("Watcher stopped in this process")
+        if not wanted:
+            shared_state.release_lease(WATCHER_LEASE, PROCESS_ID)
+
+
+def _watcher_status() -> dict:
+    """Watcher status as seen by all processes"""
+    cfg = load_config()
+    leader = shared_state.lease_holder(WATCHER_LEASE)
+    return {
+        "running": bool(cfg.get("watch_path")) and leader is not None,
+        "watch_path": cfg.get("watch_path"),
+        "recursive": cfg.get("recursive", Config.WATCH_RECURSIVE),
+        "backend": cfg.get("backend", Config.WATCH_BACKEND),
+        "leader": leader,
+        "local": watcher.status if watcher.running else None,  # Queue/scan stats of this process
+    }
+
+
+def _watcher_supervisor():
+    """Renew the watcher lease and follow config changes made by other processes"""
+    while not _shutdown_event.wait(WATCHER_LEASE_TTL / 3):
+        try:
+            _sync_watcher()
+        except Exception as e:
+            logger.error("Watcher sync failed: %s", e)
+
+
+def _warm_up_and_resume():
+    """Deferred startup work: parser warm-up, then restore the saved watcher"""
+    try:
+        parser.warm_up()
+    except Exception as e:
+        logger.error("Warm-up failed: %s", e)
+    _sync_watcher()
 
 
 @asynccontextmanager
@@ -356,19 +441,24 @@ async def lifespan(app):
     # Startup
     logger.info("Starting MAE-IDP v%s", Config.VERSION)
     Config.ensure_dirs()
-    cfg = load_config()
-    if cfg.get("watch_path") and Path(cfg["watch_path"]).exists():
-        watcher.start(cfg["watch_path"], cfg.get("output_path"))
-        logger.info("Watcher started: %s", cfg["watch_path"])
+    if Config.WARMUP == "eager":
+        _warm_up_and_resume()
+    else:
+        # Let uvicorn bind the port right away (Render cold start), see /api/ready
+        threading.Thread(target=_warm_up_and_resume, name="warm-up", daemon=True).start()
+    threading.Thread(target=_watcher_supervisor, name="watcher-supervisor", daemon=True).start()
     yield
     # Shutdown
     logger.info("Shutting down...")
+    _shutdown_event.set()
     watcher.stop()
+    shared_state.release_lease(WATCHER_LEASE, PROCESS_ID)
+    scheduler.shutdown()
     _executor.shutdown(wait=False)
 
 
 # Rate limiter setup
-limiter = Limiter(key_func=get_remote_address)
+limiter = Limiter(key_func=get_remote_address, storage_uri=f"sqlite:///{STATE_DB.as_posix()}")
 
 # CORS configuration
 # Default: allow localhost and local network for development
@@ -391,35 +481,80 @@ app.add_middleware(
 )
 
 
+assets = AssetStore(TEMPLATES_DIR)
+
+
 def get_ui() -> str:
-    """Load UI template from file"""
-    return (TEMPLATES_DIR / "index.html").read_text(encoding="utf-8")
+    """Load UI template (read from disk once, then served from memory)"""
+    return assets.get("index.html").body.decode("utf-8")
+
+
+def _serve_asset(request: Request, filename: str, versioned: bool = False) -> Response:
+    """Serve asset with ETag/If-None-Match and gzip/brotli negotiation"""
+    asset = assets.get(filename)
+    if asset is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    encoding, body = asset.select(request.headers.get("accept-encoding", ""))
+    headers = assets.headers(asset, encoding, versioned)
+    if asset.matches(request.headers.get("if-none-match")):
+        headers.pop("Content-Encoding", None)
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=asset.media_type, headers=headers)
 
 
 @app.get("/", response_class=HTMLResponse)
-async def root():
-    return get_ui()
+async def root(request: Request):
+    return _serve_asset(request, "index.html")
 
 
 @app.get("/static/{filename}")
-async def static_file(filename: str):
-    """Serve static files from templates directory"""
-    file_path = TEMPLATES_DIR / filename
-    if file_path.exists():
-        return FileResponse(file_path)
-    raise HTTPException(status_code=404, detail="File not found")
+async def static_file(request: Request, filename: str):
+    """Serve static files from templates directory.
+
+    Requests with a version query (?v=...) get long-lived immutable caching.
+    """
+    return _serve_asset(request, filename, versioned="v" in request.query_params)
 
 
 @app.get("/api/status")
 async def status():
     return {
+        "ready": parser.ready,
         "ocr": parser.ocr_ok,
-        "watcher": watcher.status,
-        "results_count": len(results),
-        "cache": parser.cache.stats()
+        "watcher": _watcher_status(),
+        "results_count": shared_state.count_results(),
+        "cache": parser.cache.stats() if parser.cache else None,
+        "previews": parser.previews.stats() if parser.previews else None,
+        "scheduler": scheduler.stats(),
+        "memory": memory_profiler.summary() if memory_profiler.enabled else None,
+        "zonal": parser.zone_templates.stats() if parser.zone_templates else None,
+        "corner_ocr": corner_stats.stats(),
+        "stages": {"budget": parser.stage_budget, "speculative": stage_stats.stats()}
     }
 
 
+@app.get("/api/preview/{key}")
+async def preview(request: Request, key: str):
+    """Serve document thumbnail; content-addressed, so cacheable forever"""
+    path = parser.previews.get(key) if parser.previews else None
+    if path is None:
+        raise HTTPException(404, "Preview not found")
+    headers = {"ETag": f'"{key}"', "Cache-Control": "public, max-age=31536000, immutable"}
+    if request.headers.get("if-none-match", "").strip().removeprefix("W/") == f'"{key}"':
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, headers=headers)
+
+
+@app.get("/api/ready")
+async def ready():
+    """Readiness probe: 200 once warm-up (OCR probe, cache load) has finished"""
+    body = {"ready": parser.ready, "ocr": parser.ocr_ok, "qr": parser.qr_ok,
+            "warmup_seconds": parser.warmup_seconds}
+    if not parser.ready:
+        return JSONResponse(body, status_code=503, headers={"Retry-After": "1"})
+    return body
+
+
 @app.post("/api/parse")
 @limiter.limit("10/minute")  # Rate limit: 10 files per minute per IP
 async def do_parse(request: Request, file: UploadFile = File(...)):
@@ -441,13 +576,15 @@ async def do_parse(request: Request, file: UploadFile = File(...)):
     tmp = Config.INPUT_DIR / safe_name
     tmp.write_bytes(content)
 
-    # Run OCR in thread pool to avoid blocking event loop (OCR takes 2-10 seconds)
-    def _parse_sync():
-        with parser_lock:
-            return parser.parse(tmp)
-
-    loop = asyncio.get_event_loop()
-    r = await loop.run_in_executor(_executor, _parse_sync)
+    # Run OCR on the scheduler to avoid blocking event loop (OCR takes 2-10 seconds).
+    # Interactive uploads jump ahead of queued watcher and batch files.
+    try:
+        future = scheduler.submit(Priority.INTERACTIVE, parser.parse, tmp)
+    except SchedulerSaturated as e:
+        tmp.unlink(missing_ok=True)
+        raise HTTPException(503, "Server busy, try again later",
+                            headers={"Retry-After": str(e.retry_after)})
+    r = await asyncio.wrap_future(future)
 
     archive_name = generate_archive_name(r, tmp)
     shutil.move(str(tmp), str(Config.ARCHIVE_DIR / archive_name))
@@ -455,23 +592,57 @@ async def do_parse(request: Request, file: UploadFile = File(...)):
     return {"success": True, "data": asdict(r)}
 
 
+def _require_admin(request: Request):
+    """404 without MAE_ADMIN_TOKEN (endpoint doesn't exist), 403 on a wrong token"""
+    if not Config.ADMIN_TOKEN:
+        raise HTTPException(404, "Not Found")
+    token = request.headers.get("x-admin-token", "")
+    if not hmac.compare_digest(token.encode(), Config.ADMIN_TOKEN.encode()):
+        raise HTTPException(403, "Forbidden")
+
+
+@app.post("/api/admin/profile")
+async def admin_profile(request: Request, seconds: float = 10.0, documents: Optional[int] = None,
+                        format: str = "collapsed", interval_ms: float = 5.0, all_threads: bool = False):
+    """Sample the parse threads of this process for N seconds or N documents.
+
+    format=collapsed: folded stacks for flamegraph.pl / speedscope; format=pstats: for snakeviz / pstats.
+    """
+    _require_admin(request)
+    if format not in PROFILE_FORMATS:
+        raise HTTPException(400, f"Unknown format: {format}. Use: {', '.join(PROFILE_FORMATS)}")
+    try:
+        profile = await asyncio.to_thread(sampling_profiler.record, seconds, documents,
+                                          max(interval_ms, 1.0) / 1000, all_threads)
+    except ProfilerBusy as e:
+        raise HTTPException(409, str(e))
+
+    summary = profile.summary()
+    logger.info("Profile recorded: %d samples, %d documents in %.1fs", summary["samples"],
+                summary["documents"], summary["seconds"])
+    headers = {f"X-Profile-{k.replace('_', '-').title()}": str(v) for k, v in summary.items()}
+    headers["X-Process-Id"] = PROCESS_ID
+    if format == "pstats":
+        headers["Content-Disposition"] = 'attachment; filename="mae-profile.pstats"'
+        return Response(content=profile.pstats(), media_type="application/octet-stream", headers=headers)
+    return Response(content=profile.collapsed(), media_type="text/plain; charset=utf-8", headers=headers)
+
+
 @app.get("/api/results")
 async def get_results():
-    with results_lock:
-        return {"results": list(results)}
+    return {"results": shared_state.list_results()}
 
 
 @app.delete("/api/results")
 async def clear_results():
-    with results_lock:
-        results.clear()
+    shared_state.clear_results()
     return {"success": True}
 
 
 @app.post("/api/export")
 async def export(request: Request):
     body = await request.json()
-    data = body.get("results", results)
+    data = body["results"] if "results" in body else shared_state.list_results()
     fmt = body.get("format", "csv").lower()
 
     if not data:
@@ -551,7 +722,7 @@ async def open_folder(folder: str):
         "input": Config.INPUT_DIR,
         "output": Config.OUTPUT_DIR,
         "archive": Config.ARCHIVE_DIR,
-        "watch": watcher.watch_path
+        "watch": Path(load_config().get("watch_path") or "")
     }
     p = folders.get(folder)
     if p and p.exists():
@@ -565,18 +736,28 @@ async def start_watcher(request: Request):
     data = await request.json()
     watch_path = data.get("watch_path", "").strip()
     output_path = data.get("output_path", "").strip() or None
+    recursive = bool(data.get("recursive", Config.WATCH_RECURSIVE))
+    backend = data.get("backend", Config.WATCH_BACKEND)
     if not watch_path or not Path(watch_path).exists():
         raise HTTPException(400, "Invalid watch path")
-    if watcher.start(watch_path, output_path):
-        save_config({"watch_path": watch_path, "output_path": output_path})
-        return {"success": True, "status": watcher.status}
+    if backend not in WATCH_BACKENDS:
+        raise HTTPException(400, f"Invalid backend, expected one of: {', '.join(WATCH_BACKENDS)}")
+    # Shared config: whichever process holds the watcher lease picks it up
+    save_config({"watch_path": watch_path, "output_path": output_path,
+                 "recursive": recursive, "backend": backend})
+    # Lease and config I/O (SQLite, files) off the event loop
+    await asyncio.to_thread(_sync_watcher)
+    status = await asyncio.to_thread(_watcher_status)
+    if status["running"]:
+        return {"success": True, "status": status}
+    save_config({})
     raise HTTPException(500, "Failed to start watcher")
 
 
 @app.post("/api/watcher/stop")
 async def stop_watcher():
-    watcher.stop()
     save_config({})
+    await asyncio.to_thread(_sync_watcher)
     return {"success": True}
 
 
@@ -618,15 +799,30 @@ async def detect_gdrive():
     return {"paths": possible_paths}
 
 
-# Batch processing state
-batch_state = {
+# Batch processing state (shared between server processes, see SharedState)
+BATCH_KEY = "batch"
+BATCH_IDLE = {
     "running": False,
     "total": 0,
     "processed": 0,
     "current_file": None,
-    "results": []
+    "owner": None,
+    "updated_at": 0,
 }
-batch_lock = threading.Lock()
+BATCH_STALE_SECONDS = 300  # A batch without progress this long is treated as dead
+
+
+def _update_batch(**changes) -> dict:
+    """Atomically apply changes to shared batch state"""
+    def apply(b):
+        b = dict(b or BATCH_IDLE)
+        b.update(changes, updated_at=time.time())
+        return b
+    return shared_state.update(BATCH_KEY, apply)
+
+
+def _batch_running() -> bool:
+    return shared_state.get(BATCH_KEY, BATCH_IDLE)["running"]
 
 
 def _process_batch_folder(folder_path: str, archive: bool = True):
@@ -635,29 +831,20 @@ def _process_batch_folder(folder_path: str, archive: bool = True):
     extensions = ['.pdf', '.jpg', '.jpeg', '.png', '.tiff', '.tif']
     files = [f for f in folder.iterdir() if f.suffix.lower() in extensions]
 
-    with batch_lock:
-        batch_state["running"] = True
-        batch_state["total"] = len(files)
-        batch_state["processed"] = 0
-        batch_state["results"] = []
+    _update_batch(running=True, total=len(files), processed=0, owner=PROCESS_ID)
 
     for file_path in files:
-        # Check if stopped
-        with batch_lock:
-            if not batch_state["running"]:
-                break
-            batch_state["current_file"] = file_path.name
+        # Check if stopped (stop may come from any server process)
+        if not _batch_running():
+            break
+        _update_batch(current_file=file_path.name)
 
         try:
-            with parser_lock:
-                result = parser.parse(file_path)
+            # Blocks while the batch queue is full, yields to interactive uploads
+            result = scheduler.run(Priority.BATCH, parser.parse, file_path)
 
             _safe_append_result(result)
 
-            with batch_lock:
-                batch_state["results"].append(asdict(result))
-                batch_state["processed"] += 1
-
             # Archive processed file
             if archive:
                 archive_name = generate_archive_name(result, file_path)
@@ -665,12 +852,11 @@ def _process_batch_folder(folder_path: str, archive: bool = True):
 
         except Exception as e:
             logger.error("Batch error processing %s: %s", file_path.name, e)
-            with batch_lock:
-                batch_state["processed"] += 1
 
-    with batch_lock:
-        batch_state["running"] = False
-        batch_state["current_file"] = None
+        shared_state.update(BATCH_KEY, lambda b: {**b, "processed": b["processed"] + 1,
+                                                  "updated_at": time.time()})
+
+    _update_batch(running=False, current_file=None)
 
 
 @app.post("/api/batch/start")
@@ -687,10 +873,6 @@ async def start_batch(request: Request):
     if not folder.exists() or not folder.is_dir():
         raise HTTPException(400, "Invalid folder path")
 
-    with batch_lock:
-        if batch_state["running"]:
-            raise HTTPException(409, "Batch processing already running")
-
     # Count files
     extensions = ['.pdf', '.jpg', '.jpeg', '.png', '.tiff', '.tif']
     files = [f for f in folder.iterdir() if f.suffix.lower() in extensions]
@@ -698,6 +880,15 @@ async def start_batch(request: Request):
     if not files:
         raise HTTPException(400, "No supported files found in folder")
 
+    # Claim the batch slot atomically across processes
+    def claim(b):
+        b = b or dict(BATCH_IDLE)
+        if b["running"] and time.time() - b["updated_at"] < BATCH_STALE_SECONDS:
+            raise HTTPException(409, "Batch processing already running")
+        return {**BATCH_IDLE, "running": True, "total": len(files), "owner": PROCESS_ID,
+                "updated_at": time.time()}
+    shared_state.update(BATCH_KEY, claim)
+
     # Start processing in background
     loop = asyncio.get_event_loop()
     loop.run_in_executor(_executor, _process_batch_folder, folder_path, archive)
@@ -708,21 +899,20 @@ async def start_batch(request: Request):
 @app.get("/api/batch/status")
 async def batch_status():
     """Get current batch processing status"""
-    with batch_lock:
-        return {
-            "running": batch_state["running"],
-            "total": batch_state["total"],
-            "processed": batch_state["processed"],
-            "current_file": batch_state["current_file"],
-            "progress": round(batch_state["processed"] / batch_state["total"] * 100) if batch_state["total"] > 0 else 0
-        }
+    b = shared_state.get(BATCH_KEY, BATCH_IDLE)
+    return {
+        "running": b["running"],
+        "total": b["total"],
+        "processed": b["processed"],
+        "current_file": b["current_file"],
+        "progress": round(b["processed"] / b["total"] * 100) if b["total"] > 0 else 0
+    }
 
 
 @app.post("/api/batch/stop")
 async def stop_batch():
     """Stop batch processing (will complete current file)"""
-    with batch_lock:
-        batch_state["running"] = False
+    _update_batch(running=False)
     return {"success": True}
 
 
@@ -747,6 +937,12 @@ if __name__ == "__main__":
             min_size=(800, 600)
         )
         webview.start()
+    elif Config.HTTP_WORKERS > 1:
+        # Several processes on one port; shared state keeps them consistent
+        print(f"Starting {Config.APP_NAME} v{Config.VERSION} ({Config.HTTP_WORKERS} workers)")
+        print(f"Open in browser: http://{Config.HOST}:{Config.PORT}")
+        uvicorn.run("mae:app", host=Config.HOST, port=Config.PORT,
+                    workers=Config.HTTP_WORKERS, app_dir=str(APP_DIR))
     else:
         # Web-only mode
         print(f"Starting {Config.APP_NAME} v{Config.VERSION}")
@@ -0,0 +1,237 @@
+"""
+MAE-IDP Memory Profiling
+Opt-in (MAE_MEMPROFILE=1, batch_rename --memprofile): per pipeline stage and
+per document the tracemalloc peak, the memory still held afterwards and the
+process RSS / RSS high-water mark. Every document is logged as a structured
+record; summary() aggregates a whole batch for sizing workers per container.
+Only the most recent records are kept in memory (the web app runs for weeks),
+summary() works from running totals.
+
+tracemalloc sees Python and numpy allocations; OpenCV / Poppler / Tesseract
+buffers only show up in RSS, so both are recorded.
+"""
+
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import deque
+from functools import wraps
+from typing import Any, Deque, Dict, List, Optional
+
+from logging_config import get_logger
+
+logger = get_logger("memprofile")
+
+ENV_FLAG = "MAE_MEMPROFILE"
+
+# Methods of BaseOCRProcessor measured as stages (first argument: path or raster)
+STAGES = ("load_image", "extract_qr_codes", "extract_internal_from_corner", "run_ocr")
+# Methods that process one whole document (first argument: path); outermost one closes the record
+DOCUMENT_METHODS = ("parse", "process_file", "process_image")
+
+TOP_ALLOCATIONS = 5
+MAX_DOCUMENTS = 500  # Recent document records kept; also the window of the stage p95
+HEAVIEST = 5  # Heaviest documents kept for summary()
+MB = 1024 * 1024
+
+
+def enabled_from_env() -> bool:
+    return os.environ.get(ENV_FLAG, "").lower() in ("1", "true", "yes")
+
+
+def rss_mb() -> Optional[float]:
+    """Current resident set size (Linux /proc, otherwise psutil if installed)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return round(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / MB, 1)
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+        return round(psutil.Process().memory_info().rss / MB, 1)
+    except ImportError:
+        return None
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Process RSS high-water mark (None on Windows)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return round(rss / (MB if sys.platform == "darwin" else 1024), 1)
+
+
+def _mb(value: int) -> float:
+    return round(value / MB, 2)
+
+
+class MemoryProfiler:
+    """
+    Measures the stages of a processor instance, see instrument().
+
+    Stages are serialized while profiling: tracemalloc and RSS are process-wide,
+    so concurrent stages (batch pipeline threads, parse workers) would be
+    attributed to each other.
+    """
+
+    def __init__(self, enabled: Optional[bool] = None, top: int = TOP_ALLOCATIONS,
+                 max_documents: int = MAX_DOCUMENTS):
+        self.enabled = enabled_from_env() if enabled is None else enabled
+        self.top = top
+        self.max_documents = max_documents
+        self.documents: Deque[Dict[str, Any]] = deque(maxlen=max_documents)  # Most recent records
+        self.finished = 0
+        self._stages: Dict[str, Dict[str, Any]] = {}  # Running totals per stage
+        self._heaviest: List[Dict[str, Any]] = []
+        self._open: Dict[str, Dict[str, Any]] = {}
+        self._local = threading.local()
+        self._lock = threading.RLock()
+        self._started_tracing = False
+
+    def start(self):
+        if self.enabled and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    def stop(self):
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def instrument(self, processor):
+        """Wrap stage and document methods of processor (no-op when disabled)"""
+        if not self.enabled:
+            return processor
+        self.start()
+        for name in STAGES:
+            if hasattr(processor, name):
+                setattr(processor, name, self._wrap_stage(name, getattr(processor, name)))
+        for name in DOCUMENT_METHODS:
+            if hasattr(processor, name):
+                setattr(processor, name, self._wrap_document(getattr(processor, name)))
+        return processor
+
+    # --- Wrappers ---
+
+    def _record(self, path) -> Dict[str, Any]:
+        key = str(path)
+        record = self._open.get(key)
+        if record is None:
+            record = {"document": key, "stages": [], "depth": 0, "rss_start_mb": rss_mb()}
+            self._open[key] = record
+        return record
+
+    def _wrap_document(self, method):
+        @wraps(method)
+        def document(path, *args, **kwargs):
+            with self._lock:
+                record = self._record(path)
+                record["depth"] += 1
+            previous = getattr(self._local, "record", None)
+            self._local.record = record
+            try:
+                return method(path, *args, **kwargs)
+            finally:
+                self._local.record = previous
+                with self._lock:
+                    record["depth"] -= 1
+                    if record["depth"] == 0:
+                        self._finish(self._open.pop(record["document"]))
+        return document
+
+    def _wrap_stage(self, name, method):
+        @wraps(method)
+        def stage(*args, **kwargs):
+            with self._lock:
+                if name == "load_image" and args:
+                    record = self._record(args[0])  # Batch pipeline loads outside process_image
+                else:
+                    record = getattr(self._local, "record", None)
+                tracemalloc.reset_peak()
+                before, _ = tracemalloc.get_traced_memory()
+                start = time.perf_counter()
+                try:
+                    return method(*args, **kwargs)
+                finally:
+                    seconds = time.perf_counter() - start
+                    after, peak = tracemalloc.get_traced_memory()
+                    if record is not None:
+                        self._add_stage(record, name, seconds, before, after, peak)
+        return stage
+
+    def _add_stage(self, record, name, seconds, before, after, peak):
+        entry = {
+            "stage": name,
+            "seconds": round(seconds, 3),
+            "traced_peak_mb": _mb(peak - before),
+            "retained_mb": _mb(after - before),
+            "rss_mb": rss_mb(),
+            "rss_hwm_mb": peak_rss_mb(),
+        }
+        record["stages"].append(entry)
+        totals = self._stages.setdefault(name, {"calls": 0, "peak_sum": 0.0, "peak_max": 0.0, "retained_max": 0.0,
+                                                "seconds_sum": 0.0, "peaks": deque(maxlen=self.max_documents)})
+        totals["calls"] += 1
+        totals["peak_sum"] += entry["traced_peak_mb"]
+        totals["peak_max"] = max(totals["peak_max"], entry["traced_peak_mb"])
+        totals["retained_max"] = max(totals["retained_max"], entry["retained_mb"])
+        totals["seconds_sum"] += entry["seconds"]
+        totals["peaks"].append(entry["traced_peak_mb"])
+        if entry["traced_peak_mb"] >= record.get("traced_peak_mb", -1):
+            record["traced_peak_mb"] = entry["traced_peak_mb"]
+            record["peak_stage"] = name
+            # Allocations alive at the end of the heaviest stage, by source line
+            stats = tracemalloc.take_snapshot().statistics("lineno")[:self.top]
+            record["top_allocations"] = [{"where": str(s.traceback[0]), "mb": _mb(s.size), "count": s.count}
+                                         for s in stats]
+
+    def _finish(self, record):
+        record.pop("depth", None)
+        record["rss_end_mb"] = rss_mb()
+        record["rss_hwm_mb"] = peak_rss_mb()
+        record.setdefault("traced_peak_mb", 0.0)
+        self.documents.append(record)
+        self.finished += 1
+        self._heaviest = sorted(self._heaviest + [record], key=lambda d: d["traced_peak_mb"], reverse=True)[:HEAVIEST]
+        logger.info("Memory profile %s: peak %.1f MB traced in %s, RSS %s MB (high-water %s MB)",
+                    os.path.basename(record["document"]), record["traced_peak_mb"], record.get("peak_stage"),
+                    record["rss_end_mb"], record["rss_hwm_mb"], extra={"memprofile": record})
+
+    # --- Reports ---
+
+    def summary(self, heaviest: int = HEAVIEST) -> Dict[str, Any]:
+        """Aggregate over all finished documents (p95 over the last max_documents stage calls)"""
+        with self._lock:
+            finished = self.finished
+            totals = {name: dict(t, peaks=sorted(t["peaks"])) for name, t in self._stages.items()}
+            by_peak = list(self._heaviest[:heaviest])
+        stages: Dict[str, Dict[str, Any]] = {}
+        for name in STAGES:
+            t = totals.get(name)
+            if t is None:
+                continue
+            peaks = t["peaks"]
+            stages[name] = {
+                "calls": t["calls"],
+                "traced_peak_mb": {"mean": round(t["peak_sum"] / t["calls"], 2),
+                                   "p95": peaks[min(len(peaks) - 1, round(0.95 * (len(peaks) - 1)))],
+                                   "max": t["peak_max"]},
+                "retained_mb_max": t["retained_max"],
+                "seconds_mean": round(t["seconds_sum"] / t["calls"], 3),
+            }
+        return {
+            "documents": finished,
+            "rss_mb": rss_mb(),
+            "peak_rss_mb": peak_rss_mb(),
+            "stages": stages,
+            "heaviest_documents": [
+                {"document": d["document"], "traced_peak_mb": d["traced_peak_mb"], "peak_stage": d.get("peak_stage"),
+                 "rss_hwm_mb": d["rss_hwm_mb"], "top_allocations": d.get("top_allocations", [])}
+                for d in by_peak
+            ],
+        }
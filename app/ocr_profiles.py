@@ -0,0 +1,101 @@
+"""
+MAE-IDP OCR Profiles
+Named preprocessing and Tesseract settings (DPI, blur, binarization, PSM/OEM,
+languages, regions of interest). "default" is the built-in behaviour; further
+profiles are chosen with benchmarks/bench_ocr_sweep.py and stored in
+data/ocr_profiles.json.
+"""
+
+import json
+import os
+from dataclasses import asdict, dataclass, fields
+from pathlib import Path
+from typing import Dict, Optional
+
+PROFILES_FILE = Path(__file__).parent.parent / "data" / "ocr_profiles.json"
+
+BINARIZATIONS = ("otsu", "adaptive", "none")
+# "bands": OCR only the top and bottom of the page (header/invoice data, footer with VAT)
+TEXT_ROIS = ("full", "bands")
+TEXT_BANDS = (0.45, 0.2)  # Top / bottom fraction of the page height
+
+
+@dataclass(frozen=True)
+class OCRProfile:
+    """Preprocessing and Tesseract settings; defaults = built-in behaviour"""
+    name: str = "default"
+    dpi: int = 300  # PDF render resolution and image decode target
+    blur: int = 3  # Gaussian kernel size, 0 = no blur
+    binarization: str = "otsu"
+    lang: str = "deu+eng"
+    psm: Optional[int] = None  # None = Tesseract default (3)
+    oem: Optional[int] = None
+    text_roi: str = "full"
+    corner_psm: int = 6  # Handwritten internal number (digit whitelist)
+    corner_roi: float = 0.5  # Top-right corner: fraction of width and height
+
+    def __post_init__(self):
+        if self.binarization not in BINARIZATIONS:
+            raise ValueError(f"Unknown binarization: {self.binarization}")
+        if self.text_roi not in TEXT_ROIS:
+            raise ValueError(f"Unknown text ROI: {self.text_roi}")
+        if self.blur and self.blur % 2 == 0:
+            raise ValueError(f"Blur kernel must be odd: {self.blur}")
+
+    def tesseract_config(self) -> str:
+        """Command line options for the full-page OCR"""
+        options = []
+        if self.psm is not None:
+            options.append(f"--psm {self.psm}")
+        if self.oem is not None:
+            options.append(f"--oem {self.oem}")
+        return " ".join(options)
+
+    def to_dict(self) -> dict:
+        return {k: v for k, v in asdict(self).items() if k != "name"}
+
+    @classmethod
+    def from_dict(cls, name: str, data: dict) -> "OCRProfile":
+        known = {f.name for f in fields(cls)}
+        return cls(name=name, **{k: v for k, v in data.items() if k in known and k != "name"})
+
+
+DEFAULT_PROFILE = OCRProfile()
+
+
+def _read(path: Path) -> Dict[str, dict]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def list_profiles(path: Path = PROFILES_FILE) -> Dict[str, OCRProfile]:
+    """All profiles: built-in "default" plus the stored ones"""
+    profiles = {DEFAULT_PROFILE.name: DEFAULT_PROFILE}
+    for name, data in _read(path).items():
+        profiles[name] = OCRProfile.from_dict(name, data)
+    return profiles
+
+
+def load_profile(name: Optional[str] = None, path: Path = PROFILES_FILE) -> OCRProfile:
+    """Profile by name (default: "default"); KeyError if it doesn't exist"""
+    name = name or DEFAULT_PROFILE.name
+    profiles = list_profiles(path)
+    if name not in profiles:
+        raise KeyError(f"Unknown OCR profile: {name}. Available: {', '.join(sorted(profiles))}")
+    return profiles[name]
+
+
+def save_profile(profile: OCRProfile, path: Path = PROFILES_FILE):
+    """Store (or replace) a named profile"""
+    if profile.name == DEFAULT_PROFILE.name:
+        raise ValueError("The default profile is built in and can't be overwritten")
+    profiles = _read(path)
+    profiles[profile.name] = profile.to_dict()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(profiles, f, indent=2)
+    os.replace(tmp, path)
@@ -0,0 +1,133 @@
+"""
+MAE-IDP Preview Cache
+Low-resolution page thumbnails made from the raster already rendered for OCR,
+stored on disk by content hash with a total size limit
+"""
+
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Iterator, Optional
+
+# Content hash (SHA-256 hex) used as preview key
+PREVIEW_KEY_RE = re.compile(r'^[0-9a-f]{64}$')
+# Stored thumbnail formats, preferred first (in-flight writes end in .tmp)
+PREVIEW_SUFFIXES = (".webp", ".jpg")
+
+
+class PreviewCache:
+    """
+    Size-bounded on-disk thumbnail cache.
+    Least recently used files (by mtime, touched on read) are evicted first.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path = None,
+        max_bytes: int = 64 * 1024 * 1024,
+        max_side: int = 480,
+        quality: int = 70
+    ):
+        self.cache_dir = cache_dir or Path(__file__).parent.parent / "data" / "previews"
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_side = max_side
+        self.quality = quality
+        self._lock = threading.Lock()
+        self._total_bytes = sum(p.stat().st_size for p in self._files())
+
+    def _files(self) -> Iterator[Path]:
+        """Stored thumbnails only: *.tmp files of concurrent renders are neither counted nor evicted"""
+        for suffix in PREVIEW_SUFFIXES:
+            yield from self.cache_dir.glob(f"*{suffix}")
+
+    def _find(self, key: str) -> Optional[Path]:
+        for ext in PREVIEW_SUFFIXES:
+            path = self.cache_dir / f"{key}{ext}"
+            if path.exists():
+                return path
+        return None
+
+    def has(self, key: str) -> bool:
+        return bool(PREVIEW_KEY_RE.match(key)) and self._find(key) is not None
+
+    def get(self, key: str) -> Optional[Path]:
+        """Get thumbnail path for key, None if missing or key is invalid"""
+        if not PREVIEW_KEY_RE.match(key):
+            return None
+        path = self._find(key)
+        if path is not None:
+            try:
+                os.utime(path)  # LRU: mark as recently used
+            except OSError:
+                return None
+        return path
+
+    def put(self, key: str, img) -> Optional[Path]:
+        """Downscale raster (BGR or grayscale ndarray) and store it under key"""
+        import cv2
+
+        if not PREVIEW_KEY_RE.match(key):
+            return None
+        existing = self._find(key)
+        if existing is not None:
+            return existing
+
+        h, w = img.shape[:2]
+        scale = self.max_side / max(h, w)
+        if scale < 1:
+            # INTER_AREA: fast and alias-free for strong downscaling
+            img = cv2.resize(img, (max(1, int(w * scale)), max(1, int(h * scale))),
+                             interpolation=cv2.INTER_AREA)
+
+        ok, buf = cv2.imencode(".webp", img, [cv2.IMWRITE_WEBP_QUALITY, self.quality])
+        ext = ".webp"
+        if not ok:
+            ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+            ext = ".jpg"
+        if not ok:
+            return None
+
+        data = buf.tobytes()
+        path = self.cache_dir / f"{key}{ext}"
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+        with self._lock:
+            self._total_bytes += len(data)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+        return path
+
+    def _evict(self):
+        """Remove least recently used thumbnails down to 80% of max_bytes"""
+        files = []
+        for p in self._files():
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, p))
+        files.sort()
+
+        total = sum(size for _, size, _ in files)
+        target = int(self.max_bytes * 0.8)
+        for _, size, p in files:
+            if total <= target:
+                break
+            try:
+                p.unlink()
+                total -= size
+            except OSError:
+                pass
+        self._total_bytes = total
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "cache_dir": str(self.cache_dir),
+            }
@@ -0,0 +1,161 @@
+"""
+MAE-IDP Sampling Profiler
+On-demand CPU profile of live parsing: a background thread samples the Python
+stacks of the parse threads every few milliseconds for N seconds or N
+documents. Nothing runs while it is off.
+
+Output: collapsed stacks (flamegraph.pl, speedscope, inferno) or a pstats file
+(snakeviz, `python -m pstats`). Frames carry the current line, so a slow regex
+in core.py, a raster copy or a wait on the Tesseract subprocess shows up as
+its own line.
+"""
+
+import marshal
+import sys
+import threading
+import time
+from collections import Counter
+from functools import wraps
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+PROFILE_FORMATS = ("collapsed", "pstats")
+DEFAULT_INTERVAL = 0.005  # Seconds between samples
+MAX_SECONDS = 300
+
+# A thread counts as "parsing" while one of these app functions is on its stack
+# (_run_stage: speculative stages of a document in the stage pool, see stages.py)
+PARSE_FUNCTIONS = {"parse", "process_file", "process_image", "_run_stage"}
+
+APP_DIR = str(Path(__file__).parent)
+
+# (filename, first line of the function, function name, current line)
+Frame = Tuple[str, int, str, int]
+
+
+class ProfilerBusy(Exception):
+    """Another profile is already being recorded"""
+
+
+def _is_parse_frame(code) -> bool:
+    return code.co_name in PARSE_FUNCTIONS and code.co_filename.startswith(APP_DIR)
+
+
+class SamplingProfiler:
+    """
+    Samples sys._current_frames() from a daemon thread.
+
+    By default only threads inside a parse call are sampled (idle workers,
+    the event loop and the watcher would otherwise dominate); all_threads=True
+    samples every thread.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active = False
+        self._documents = 0
+
+    @property
+    def active(self) -> bool:
+        return self._active
+
+    def instrument(self, processor, method: str = "parse"):
+        """Count finished documents of processor.method (for the documents limit)"""
+        original = getattr(processor, method)
+
+        @wraps(original)
+        def counted(*args, **kwargs):
+            try:
+                return original(*args, **kwargs)
+            finally:
+                if self._active:
+                    self._documents += 1
+        setattr(processor, method, counted)
+        return processor
+
+    def record(self, seconds: float = 10.0, documents: Optional[int] = None,
+               interval: float = DEFAULT_INTERVAL, all_threads: bool = False) -> "Profile":
+        """Sample until seconds have passed or documents parses have finished (blocking)"""
+        seconds = min(max(seconds, 0.1), MAX_SECONDS)
+        with self._lock:
+            if self._active:
+                raise ProfilerBusy("A profile is already being recorded")
+            self._active = True
+            self._documents = 0
+        profile = Profile(interval)
+        own = threading.get_ident()
+        deadline = time.monotonic() + seconds
+        started = time.perf_counter()
+        try:
+            while time.monotonic() < deadline:
+                if documents and self._documents >= documents:
+                    break
+                for ident, frame in sys._current_frames().items():
+                    if ident != own:
+                        profile.add(frame, all_threads)
+                time.sleep(interval)
+        finally:
+            profile.documents = self._documents
+            profile.seconds = round(time.perf_counter() - started, 3)
+            self._active = False
+        return profile
+
+
+class Profile:
+    """Aggregated samples: stack (root first) -> count"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.documents = 0
+        self.seconds = 0.0
+
+    def add(self, frame, all_threads: bool = False):
+        stack = []
+        parsing = all_threads
+        while frame is not None:
+            code = frame.f_code
+            stack.append((code.co_filename, code.co_firstlineno, code.co_name, frame.f_lineno))
+            parsing = parsing or _is_parse_frame(code)
+            frame = frame.f_back
+        if parsing:
+            stack.reverse()
+            self.stacks[tuple(stack)] += 1
+            self.samples += 1
+
+    @staticmethod
+    def _label(frame: Frame) -> str:
+        filename, _, name, line = frame
+        return f"{name} ({Path(filename).name}:{line})"
+
+    def collapsed(self) -> str:
+        """One line per stack: 'root;...;leaf count' (Brendan Gregg's folded format)"""
+        lines = [";".join(self._label(f) for f in stack) + f" {count}"
+                 for stack, count in self.stacks.most_common()]
+        return "\n".join(lines) + ("\n" if lines else "")
+
+    def pstats(self) -> bytes:
+        """cProfile-compatible stats (marshal), times = samples x interval"""
+        stats: Dict[tuple, list] = {}
+        for stack, count in self.stacks.items():
+            weight = count * self.interval
+            functions = [(f[0], f[1], f[2]) for f in stack]
+            for func in set(functions):
+                entry = stats.setdefault(func, [0, 0, 0.0, 0.0, {}])
+                entry[0] += count
+                entry[1] += count
+                entry[3] += weight
+            stats[functions[-1]][2] += weight
+            for caller, callee in set(zip(functions, functions[1:])):
+                if caller == callee:
+                    continue
+                edges = stats[callee][4]
+                nc, cc, tt, ct = edges.get(caller, (0, 0, 0.0, 0.0))
+                edges[caller] = (nc + count, cc + count, tt + (weight if callee == functions[-1] else 0.0),
+                                 ct + weight)
+        return marshal.dumps({func: (cc, nc, tt, ct, callers) for func, (cc, nc, tt, ct, callers) in stats.items()})
+
+    def summary(self) -> dict:
+        return {"samples": self.samples, "stacks": len(self.stacks), "documents": self.documents,
+                "seconds": self.seconds, "interval_ms": round(self.interval * 1000, 2)}
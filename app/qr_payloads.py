@@ -0,0 +1,112 @@
+"""
+MAE-IDP QR Payloads
+Structured parsers for the codes printed on invoices: EPC069-12 (GiroCode,
+SEPA credit transfer), Swiss QR-bill (SPC) and our SN<...> label. Payment
+codes name the beneficiary and usually carry the invoice number in the
+remittance text, so the full-page OCR can be skipped (see
+BaseOCRProcessor.fields_from_qr in core.py).
+"""
+
+import re
+from dataclasses import dataclass
+from typing import List, Optional
+
+# EPC069-12: service tag, version 001/002, character set 1-8, identification
+EPC_SERVICE_TAG = "BCD"
+EPC_VERSIONS = ("001", "002")
+EPC_IDENTIFICATION = "SCT"
+
+# Swiss QR-bill (Swiss Implementation Guidelines QR-bill): header and trailer
+SWISS_QR_TYPE = "SPC"
+SWISS_TRAILER = "EPD"
+# Swico billing information (structured, after the trailer): tag 10 = invoice number
+SWICO_PREFIX = "//S1/"
+SWICO_INVOICE_TAG = "10"
+
+SN_PATTERNS = [r'SN[<\[]?0*(\d+)[>\]]?', r'SN\s*:?\s*0*(\d+)']
+
+
+@dataclass
+class QRPayload:
+    """Fields of one decoded QR code"""
+    kind: str  # "epc", "swiss", "sn"
+    name: Optional[str] = None  # Beneficiary / creditor
+    iban: Optional[str] = None
+    amount: Optional[str] = None
+    currency: Optional[str] = None
+    reference: Optional[str] = None  # Structured creditor reference (RF / QRR / SCOR)
+    remittance: Optional[str] = None  # Unstructured remittance text / message
+    invoice_number: Optional[str] = None  # Explicit invoice number (Swico billing information)
+    internal_number: Optional[str] = None  # SN<...>
+
+
+def _line(lines: List[str], index: int) -> Optional[str]:
+    value = lines[index].strip() if index < len(lines) else ""
+    return value or None
+
+
+def parse_epc(data: str) -> Optional[QRPayload]:
+    """EPC069-12 (GiroCode): BCD / version / charset / SCT / BIC / name / IBAN / amount / purpose / ref / text"""
+    lines = data.splitlines()
+    if len(lines) < 7 or lines[0].strip() != EPC_SERVICE_TAG or lines[1].strip() not in EPC_VERSIONS \
+            or lines[3].strip() != EPC_IDENTIFICATION:
+        return None
+    name, iban = _line(lines, 5), _line(lines, 6)
+    if not name or not iban:
+        return None
+    amount, currency = _line(lines, 7), None
+    if amount and amount[:3].isalpha():
+        currency, amount = amount[:3], amount[3:] or None
+    return QRPayload(kind="epc", name=name, iban=iban.replace(" ", ""), amount=amount, currency=currency,
+                     reference=_line(lines, 9), remittance=_line(lines, 10))
+
+
+def parse_swiss(data: str) -> Optional[QRPayload]:
+    """Swiss QR-bill: fixed element positions, Swico S1 billing information after the EPD trailer"""
+    lines = data.splitlines()
+    if len(lines) < 31 or lines[0].strip() != SWISS_QR_TYPE or lines[30].strip() != SWISS_TRAILER:
+        return None
+    name, iban = _line(lines, 5), _line(lines, 3)
+    if not name or not iban:
+        return None
+    return QRPayload(kind="swiss", name=name, iban=iban.replace(" ", ""), amount=_line(lines, 18),
+                     currency=_line(lines, 19), reference=_line(lines, 28), remittance=_line(lines, 29),
+                     invoice_number=swico_invoice_number(_line(lines, 31) or ""))
+
+
+def swico_invoice_number(billing: str) -> Optional[str]:
+    """Tag /10/ of Swico S1 billing information ("//S1/10/10201409/11/200701/...")"""
+    if not billing.startswith(SWICO_PREFIX):
+        return None
+    # "/" inside a value is escaped as "\/"
+    parts = re.split(r'(?<!\\)/', billing[len(SWICO_PREFIX):])
+    for tag, value in zip(parts[::2], parts[1::2]):
+        if tag == SWICO_INVOICE_TAG and value:
+            return value.replace("\\/", "/")
+    return None
+
+
+def parse_sn(data: str) -> Optional[QRPayload]:
+    """Internal number label: SN<0012345>, SN[12345], SN: 12345"""
+    for pattern in SN_PATTERNS:
+        match = re.search(pattern, data, re.I)
+        if match:
+            return QRPayload(kind="sn", internal_number=match.group(1))
+    return None
+
+
+# Payment codes first: their remittance text may contain "SN..." by chance
+PARSERS = [parse_epc, parse_swiss, parse_sn]
+
+
+def parse_payload(data: str) -> Optional[QRPayload]:
+    """First parser that recognizes the decoded QR text, None for unknown payloads"""
+    for parser in PARSERS:
+        payload = parser(data)
+        if payload is not None:
+            return payload
+    return None
+
+
+def parse_payloads(qr_data: List[str]) -> List[QRPayload]:
+    return [p for p in map(parse_payload, qr_data) if p is not None]
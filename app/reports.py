@@ -0,0 +1,124 @@
+"""
+MAE-IDP Report Writers
+Streaming XLSX (openpyxl write-only), CSV and JSONL reports with constant
+memory: rows are written as they arrive, nothing is collected in a table first.
+"""
+
+import csv
+import json
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+REPORT_FORMATS = ("xlsx", "csv", "jsonl")
+
+XLSX_MAX_WIDTH = 50
+XLSX_SHEET = "Результаты"
+
+
+class ReportWriter:
+    """Base class: write(row) per result, close() at the end; usable as context manager"""
+
+    def __init__(self, path: Path, columns: List[str]):
+        self.path = Path(path)
+        self.columns = columns
+        self.rows = 0
+
+    def write(self, row: Dict[str, Any]):
+        self._write([row.get(c, "") for c in self.columns], row)
+        self.rows += 1
+
+    def _write(self, values: List[Any], row: Dict[str, Any]):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CSVReportWriter(ReportWriter):
+    """CSV with ';' delimiter and BOM, as Excel expects in DE/RU locales"""
+
+    def __init__(self, path: Path, columns: List[str]):
+        super().__init__(path, columns)
+        self._file = open(self.path, "w", encoding="utf-8-sig", newline="")
+        self._csv = csv.writer(self._file, delimiter=";")
+        self._csv.writerow(columns)
+
+    def _write(self, values, row):
+        self._csv.writerow(values)
+
+    def close(self):
+        self._file.close()
+
+
+class JSONLReportWriter(ReportWriter):
+    """One JSON object per line, keys = columns"""
+
+    def __init__(self, path: Path, columns: List[str]):
+        super().__init__(path, columns)
+        self._file = open(self.path, "w", encoding="utf-8")
+
+    def _write(self, values, row):
+        self._file.write(json.dumps(dict(zip(self.columns, values)), ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class XLSXReportWriter(ReportWriter):
+    """
+    openpyxl write-only workbook with auto column widths.
+
+    Write-only sheets need column widths before the first row, so rows are
+    spooled to a temporary JSONL file while the widths are tracked; close()
+    then streams them into the workbook. Memory stays constant in row count.
+    """
+
+    def __init__(self, path: Path, columns: List[str]):
+        super().__init__(path, columns)
+        self.widths = [len(c) for c in columns]
+        self._spool = tempfile.TemporaryFile(mode="w+", encoding="utf-8")
+
+    def _write(self, values, row):
+        for i, value in enumerate(values):
+            self.widths[i] = max(self.widths[i], len(str(value)))
+        self._spool.write(json.dumps(values, ensure_ascii=False) + "\n")
+
+    def close(self):
+        from openpyxl import Workbook
+        from openpyxl.utils import get_column_letter
+
+        if self._spool.closed:
+            return
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet(XLSX_SHEET)
+        for i, width in enumerate(self.widths):
+            ws.column_dimensions[get_column_letter(i + 1)].width = min(width + 2, XLSX_MAX_WIDTH)
+        ws.append(self.columns)
+        self._spool.seek(0)
+        for line in self._spool:
+            ws.append(json.loads(line))
+        wb.save(self.path)
+        self._spool.close()
+
+
+_WRITERS = {
+    "xlsx": XLSXReportWriter,
+    "csv": CSVReportWriter,
+    "jsonl": JSONLReportWriter,
+}
+
+
+def open_report(path: Path, columns: List[str], fmt: Optional[str] = None) -> ReportWriter:
+    """Report writer for fmt (default: from the file suffix)"""
+    fmt = (fmt or Path(path).suffix.lstrip(".")).lower()
+    if fmt not in _WRITERS:
+        raise ValueError(f"Unsupported report format: {fmt}. Use: {', '.join(REPORT_FORMATS)}")
+    return _WRITERS[fmt](path, columns)
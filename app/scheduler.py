@@ -0,0 +1,208 @@
+"""
+MAE-IDP Priority Scheduler
+Single entry point for parse work from the web UI, folder watcher and batch jobs.
+Interactive uploads are served before watcher files, watcher files before batch
+files; each class has a bounded queue so overload is rejected instead of piling
+up threads.
+"""
+
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from concurrent.futures import Future
+from enum import IntEnum
+from typing import Any, Callable, Dict, List, Optional
+
+
+class Priority(IntEnum):
+    """Work classes, lower value is served first"""
+    INTERACTIVE = 0
+    WATCHER = 1
+    BATCH = 2
+
+
+# Default queue depth per class (queued, not counting running jobs)
+DEFAULT_MAX_DEPTH = {
+    Priority.INTERACTIVE: 16,
+    Priority.WATCHER: 256,
+    Priority.BATCH: 4,
+}
+
+
+def default_workers() -> int:
+    """Parse workers when MAE_PARSE_WORKERS is unset: at least 2, so a watcher burst
+    doesn't run one file at a time; half the cores (Tesseract is CPU-bound), at most 4"""
+    return min(4, max(2, (os.cpu_count() or 1) // 2))
+
+
+class SchedulerSaturated(Exception):
+    """Raised when the queue of a priority class is full"""
+
+    def __init__(self, priority: Priority, retry_after: int):
+        super().__init__(f"{priority.name.lower()} queue is full, retry in {retry_after}s")
+        self.priority = priority
+        self.retry_after = retry_after
+
+
+class PriorityScheduler:
+    """
+    Thread pool with strict priority between classes and FIFO inside a class.
+
+    A running job is never preempted, so an interactive upload waits at most
+    for the documents currently being parsed, not for the whole batch queue.
+    """
+
+    def __init__(
+        self,
+        workers: int = 1,
+        max_depth: Optional[Dict[Priority, int]] = None,
+        name: str = "parse"
+    ):
+        self.workers = max(1, workers)
+        self.max_depth = dict(DEFAULT_MAX_DEPTH)
+        if max_depth:
+            self.max_depth.update(max_depth)
+        self.name = name
+        self._heap: List[tuple] = []
+        self._seq = itertools.count()
+        self._depth = {p: 0 for p in Priority}
+        self._running = 0
+        self._completed = {p: 0 for p in Priority}
+        self._rejected = {p: 0 for p in Priority}
+        self._avg_seconds = 5.0  # Initial guess for one document (OCR takes 2-10 s)
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._shutdown = False
+
+    def _ensure_workers(self):
+        """Start worker threads on first use (keeps import and tests cheap)"""
+        while len(self._threads) < self.workers:
+            t = threading.Thread(
+                target=self._worker,
+                name=f"{self.name}-worker-{len(self._threads)}",
+                daemon=True
+            )
+            self._threads.append(t)
+            t.start()
+
+    def _jobs_ahead(self, priority: Priority) -> int:
+        """Queued jobs that would be served before a new job of this class"""
+        return sum(self._depth[p] for p in Priority if p <= priority)
+
+    def estimated_wait(self, priority: Priority) -> float:
+        """Estimated seconds until a new job of this class starts running"""
+        with self._cond:
+            return self._estimate_locked(priority)
+
+    def _estimate_locked(self, priority: Priority) -> float:
+        ahead = self._jobs_ahead(priority) + self._running
+        return ahead * self._avg_seconds / self.workers
+
+    def submit(
+        self,
+        priority: Priority,
+        fn: Callable,
+        *args,
+        block: bool = False,
+        timeout: Optional[float] = None,
+        **kwargs
+    ) -> Future:
+        """
+        Queue fn(*args, **kwargs) and return a Future for its result.
+
+        With block=False a full queue raises SchedulerSaturated immediately
+        (used for HTTP requests). With block=True the caller waits for a free
+        slot, which gives batch and watcher producers natural back-pressure.
+        """
+        priority = Priority(priority)
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError("Scheduler is shut down")
+
+            while self._depth[priority] >= self.max_depth[priority]:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if not block or (remaining is not None and remaining <= 0):
+                    self._rejected[priority] += 1
+                    retry_after = max(1, math.ceil(self._estimate_locked(priority)))
+                    raise SchedulerSaturated(priority, retry_after)
+                self._cond.wait(remaining)
+                if self._shutdown:
+                    raise RuntimeError("Scheduler is shut down")
+
+            future: Future = Future()
+            heapq.heappush(self._heap, (priority, next(self._seq), future, fn, args, kwargs))
+            self._depth[priority] += 1
+            self._ensure_workers()
+            self._cond.notify_all()
+        return future
+
+    def run(self, priority: Priority, fn: Callable, *args, **kwargs) -> Any:
+        """Submit with back-pressure and wait for the result (for worker threads)"""
+        return self.submit(priority, fn, *args, block=True, **kwargs).result()
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._heap and not self._shutdown:
+                    self._cond.wait()
+                if self._shutdown and not self._heap:
+                    return
+                priority, _, future, fn, args, kwargs = heapq.heappop(self._heap)
+                self._depth[priority] -= 1
+                self._running += 1
+                self._cond.notify_all()  # Wake producers waiting for a free slot
+
+            if future.set_running_or_notify_cancel():
+                start = time.monotonic()
+                try:
+                    future.set_result(fn(*args, **kwargs))
+                except BaseException as e:
+                    future.set_exception(e)
+                elapsed = time.monotonic() - start
+            else:
+                elapsed = None
+
+            with self._cond:
+                self._running -= 1
+                if elapsed is not None:
+                    self._completed[priority] += 1
+                    # Exponential moving average of service time for Retry-After
+                    self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * elapsed
+
+    def stats(self) -> Dict[str, Any]:
+        """Get scheduler statistics"""
+        with self._cond:
+            return {
+                "workers": self.workers,
+                "running": self._running,
+                "avg_seconds": round(self._avg_seconds, 3),
+                "queues": {
+                    p.name.lower(): {
+                        "depth": self._depth[p],
+                        "max_depth": self.max_depth[p],
+                        "completed": self._completed[p],
+                        "rejected": self._rejected[p],
+                        "estimated_wait": round(self._estimate_locked(p), 1),
+                    }
+                    for p in Priority
+                },
+            }
+
+    def shutdown(self, wait: bool = False):
+        """Stop workers; queued jobs that have not started are cancelled"""
+        with self._cond:
+            self._shutdown = True
+            pending, self._heap = self._heap, []
+            for p in Priority:
+                self._depth[p] = 0
+            self._cond.notify_all()
+        for entry in pending:
+            entry[2].cancel()
+        if wait:
+            for t in self._threads:
+                t.join()
@@ -57,12 +57,12 @@ def setup_tesseract() -> bool:
     for p in search_paths:
         if p.exists():
             os.environ["TESSERACT_CMD"] = str(p)
-            # Установить напрямую для pytesseract
-            try:
-                import pytesseract
+            # Установить напрямую для pytesseract, если он уже импортирован.
+            # Иначе core._pytesseract() применит TESSERACT_CMD при первом импорте
+            # (pytesseract тянет pandas/numpy — не импортируем его при старте)
+            pytesseract = sys.modules.get("pytesseract")
+            if pytesseract is not None:
                 pytesseract.pytesseract.tesseract_cmd = str(p)
-            except ImportError:
-                pass
             return True
 
     return False
@@ -0,0 +1,151 @@
+"""
+MAE-IDP Stage Graph
+The stages of one document as a small dependency graph: independent stages
+run concurrently, speculative ones start before the result that decides
+whether they are needed at all (full-page OCR while the QR codes are still
+being decoded) and are cancelled when it says no; one already running is
+stopped through its kill handle (current_cancel), which terminates the
+Tesseract subprocess it registered.
+
+A per-document budget caps how many stages run at once (the calling thread
+counts as one), so N parse workers use at most N x budget threads.
+"""
+
+import threading
+from concurrent.futures import Executor, Future
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+Results = Dict[str, Any]
+
+
+@dataclass
+class Stage:
+    """One step of a document; run() gets the results of the stages finished so far"""
+    name: str
+    run: Callable[[Results], Any]
+    after: Tuple[str, ...] = ()  # Stages that must finish before needed() / a non-speculative run()
+    needed: Optional[Callable[[Results], bool]] = None  # None = always
+    # Start in the pool right away, before `after` finished (run() must not read their results)
+    speculative: bool = False
+
+
+class StageStats:
+    """Speculative starts and their outcome per stage (thread-safe)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[str, Dict[str, int]] = {}
+
+    def record(self, name: str, outcome: str):
+        with self._lock:
+            counts = self._counts.setdefault(name, {"speculated": 0, "used": 0, "cancelled": 0, "discarded": 0})
+            counts[outcome] += 1
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {name: dict(counts) for name, counts in self._counts.items()}
+
+
+stage_stats = StageStats()
+
+
+class CancelHandle:
+    """Kill handle of one speculative stage run: cancel() kills the subprocesses registered so far
+    (and any registered later), so a discarded stage gives its pool slot back"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._procs = []
+        self.cancelled = False
+
+    def register(self, proc):
+        with self._lock:
+            if not self.cancelled:
+                self._procs.append(proc)
+                return
+        proc.kill()
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            procs, self._procs = self._procs, []
+        for proc in procs:
+            proc.kill()
+
+
+_local = threading.local()
+
+
+def current_cancel() -> Optional[CancelHandle]:
+    """Kill handle of the speculative stage running in this thread (None outside the stage pool)"""
+    return getattr(_local, "handle", None)
+
+
+class StageGraph:
+    """Stages in topological order (every `after` name refers to an earlier stage)"""
+
+    def __init__(self, stages: List[Stage]):
+        seen = set()
+        for stage in stages:
+            missing = [name for name in stage.after if name not in seen]
+            if missing:
+                raise ValueError(f"Stage {stage.name!r} runs after unknown or later stages {missing}")
+            seen.add(stage.name)
+        self.stages = stages
+
+    def run(self, pool: Optional[Executor] = None, budget: int = 1) -> Results:
+        """Run the stages and return their results (None for stages that weren't needed).
+
+        budget 1 (or no pool) runs everything in the calling thread, in order;
+        exceptions of needed stages propagate, those of discarded ones don't.
+        """
+        results: Results = {}
+        futures: Dict[str, Future] = {}
+        handles: Dict[str, CancelHandle] = {}
+        slots = budget - 1 if pool is not None else 0
+        try:
+            # Speculative stages first, in graph order (put the longest one first)
+            for stage in self.stages:
+                if stage.speculative and slots > 0:
+                    handles[stage.name] = CancelHandle()
+                    futures[stage.name] = pool.submit(_run_stage, stage, results, handles[stage.name])
+                    stage_stats.record(stage.name, "speculated")
+                    slots -= 1
+            for stage in self.stages:
+                for name in stage.after:
+                    if name in futures:
+                        results[name] = futures.pop(name).result()
+                if stage.needed is not None and not stage.needed(results):
+                    results[stage.name] = None
+                    future = futures.pop(stage.name, None)
+                    if future is not None:
+                        if future.cancel():
+                            stage_stats.record(stage.name, "cancelled")
+                        else:
+                            # Already running: kill its Tesseract subprocess, the (failed) result is dropped
+                            handles[stage.name].cancel()
+                            stage_stats.record(stage.name, "discarded")
+                    continue
+                if stage.name in futures:
+                    stage_stats.record(stage.name, "used")
+                    continue  # In flight; collected by a later stage or at the end
+                results[stage.name] = stage.run(results)
+            for name, future in list(futures.items()):
+                results[name] = future.result()
+                del futures[name]
+        finally:
+            # A stage failed: don't leave speculative work queued or running behind it
+            for name, future in futures.items():
+                if not future.cancel():
+                    handles[name].cancel()
+        return results
+
+
+def _run_stage(stage: Stage, results: Results, handle: CancelHandle):
+    """Pool side of a speculative stage (named for the sampling profiler, see profiling.py)"""
+    _local.handle = handle
+    try:
+        return stage.run(results)
+    finally:
+        _local.handle = None
@@ -0,0 +1,264 @@
+"""
+MAE-IDP Shared State
+SQLite-backed state shared by all server processes (uvicorn --workers N):
+results, batch progress, watcher leadership, the watcher's processed-file
+journal and rate-limit counters
+"""
+
+import itertools
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS kv (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS counters (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS journal (
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    ino INTEGER,
+    ctime_ns INTEGER,
+    sha256 TEXT NOT NULL,
+    processed_at REAL NOT NULL,
+    PRIMARY KEY (path, size, mtime_ns)
+);
+CREATE INDEX IF NOT EXISTS journal_processed_at ON journal (processed_at);
+"""
+
+
+# Every N-th counter increment (per SharedState) also deletes expired counters:
+# one row per client IP and window would otherwise pile up forever
+COUNTER_PRUNE_EVERY = 1000
+
+
+def process_id() -> str:
+    """Identity of this server process for leases"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class SharedState:
+    """
+    Small SQLite store with WAL journaling; every process and thread opens its
+    own connection, SQLite file locking keeps them consistent.
+    """
+
+    def __init__(self, db_path: Path = None):
+        self.db_path = Path(db_path or Path(__file__).parent.parent / "data" / "state.db")
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._increments = itertools.count(1)
+        self._conn().executescript(SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        """Add columns missing in databases created by older versions (NULL for existing rows)"""
+        conn = self._conn()
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(journal)")}
+        for column in ("ino", "ctime_ns"):
+            if column not in columns:
+                try:
+                    conn.execute(f"ALTER TABLE journal ADD COLUMN {column} INTEGER")
+                except sqlite3.OperationalError:
+                    pass  # Added by another process in the meantime
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """Write transaction; BEGIN IMMEDIATE serializes writers across processes"""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    # --- Results (FIFO, bounded) ---
+
+    def append_result(self, data: Dict[str, Any], max_results: int):
+        """Append result, dropping the oldest beyond max_results"""
+        with self._transaction() as conn:
+            cur = conn.execute("INSERT INTO results (data) VALUES (?)", (json.dumps(data),))
+            conn.execute("DELETE FROM results WHERE id <= ?", (cur.lastrowid - max_results,))
+
+    def list_results(self) -> List[Dict[str, Any]]:
+        rows = self._conn().execute("SELECT data FROM results ORDER BY id").fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def count_results(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def clear_results(self):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM results")
+
+    # --- Key/value (batch progress etc.) ---
+
+    def get(self, key: str, default: Any = None) -> Any:
+        row = self._conn().execute("SELECT value FROM kv WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set(self, key: str, value: Any):
+        with self._transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+    def update(self, key: str, fn: Callable[[Any], Any], default: Any = None) -> Any:
+        """Atomic read-modify-write: stores and returns fn(current value)"""
+        with self._transaction() as conn:
+            row = conn.execute("SELECT value FROM kv WHERE key = ?", (key,)).fetchone()
+            value = fn(json.loads(row[0]) if row else default)
+            conn.execute("INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+        return value
+
+    # --- Leases (watcher leadership) ---
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        """Take or renew lease; True if owner holds it for the next ttl seconds"""
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute("SELECT owner, expires_at FROM leases WHERE name = ?", (name,)).fetchone()
+            if row and row[0] != owner and row[1] > now:
+                return False
+            conn.execute("INSERT OR REPLACE INTO leases (name, owner, expires_at) VALUES (?, ?, ?)",
+                         (name, owner, now + ttl))
+        return True
+
+    def release_lease(self, name: str, owner: str):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner))
+
+    def lease_holder(self, name: str) -> Optional[str]:
+        row = self._conn().execute("SELECT owner FROM leases WHERE name = ? AND expires_at > ?",
+                                   (name, time.time())).fetchone()
+        return row[0] if row else None
+
+    # --- Processed-file journal (folder watcher) ---
+
+    def journal_lookup(self, path: str) -> List[tuple]:
+        """All (size, mtime_ns, ino, ctime_ns, sha256) recorded for path (ino/ctime_ns None in old rows)"""
+        return self._conn().execute("SELECT size, mtime_ns, ino, ctime_ns, sha256 FROM journal WHERE path = ?",
+                                    (path,)).fetchall()
+
+    def journal_add(self, path: str, size: int, mtime_ns: int, sha256: str, ino: int = None, ctime_ns: int = None):
+        with self._transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO journal (path, size, mtime_ns, ino, ctime_ns, sha256, processed_at) "
+                         "VALUES (?, ?, ?, ?, ?, ?, ?)", (path, size, mtime_ns, ino, ctime_ns, sha256, time.time()))
+
+    def journal_prune(self, older_than: float) -> int:
+        """Drop journal entries processed before the given timestamp"""
+        with self._transaction() as conn:
+            return conn.execute("DELETE FROM journal WHERE processed_at < ?", (older_than,)).rowcount
+
+    # --- Counters with expiry (rate limiting) ---
+
+    def incr_counter(self, key: str, expiry: float, amount: int = 1) -> int:
+        """Increment fixed-window counter, starting a new window if expired"""
+        now = time.time()
+        prune = next(self._increments) % COUNTER_PRUNE_EVERY == 0
+        with self._transaction() as conn:
+            if prune:
+                conn.execute("DELETE FROM counters WHERE expires_at <= ?", (now,))
+            row = conn.execute("SELECT value, expires_at FROM counters WHERE key = ?", (key,)).fetchone()
+            if row is None or row[1] <= now:
+                value, expires_at = amount, now + expiry
+            else:
+                value, expires_at = row[0] + amount, row[1]
+            conn.execute("INSERT OR REPLACE INTO counters (key, value, expires_at) VALUES (?, ?, ?)",
+                         (key, value, expires_at))
+        return value
+
+    def get_counter(self, key: str) -> int:
+        row = self._conn().execute("SELECT value FROM counters WHERE key = ? AND expires_at > ?",
+                                   (key, time.time())).fetchone()
+        return row[0] if row else 0
+
+    def counter_expiry(self, key: str) -> float:
+        row = self._conn().execute("SELECT expires_at FROM counters WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else time.time()
+
+    def clear_counter(self, key: str):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM counters WHERE key = ?", (key,))
+
+    def reset_counters(self) -> int:
+        with self._transaction() as conn:
+            return conn.execute("DELETE FROM counters").rowcount
+
+
+# Rate-limit storage for slowapi/limits: Limiter(storage_uri="sqlite:///path/to/state.db")
+try:
+    from limits.storage import Storage
+
+    class SQLiteLimiterStorage(Storage):
+        """limits storage backend on top of SharedState counters (fixed window)"""
+
+        STORAGE_SCHEME = ["sqlite"]
+
+        def __init__(self, uri: str, wrap_exceptions: bool = False, **options):
+            super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+            path = uri.split("://", 1)[1]
+            if len(path) > 2 and path[0] == "/" and path[2] == ":":
+                path = path[1:]  # sqlite:///C:/... on Windows
+            self.state = SharedState(Path(path))
+
+        @property
+        def base_exceptions(self):
+            return sqlite3.Error
+
+        def incr(self, key: str, expiry: int, *args, **kwargs) -> int:
+            # Signature differs between limits versions (elastic_expiry was removed)
+            return self.state.incr_counter(key, expiry, kwargs.get("amount", 1))
+
+        def get(self, key: str) -> int:
+            return self.state.get_counter(key)
+
+        def get_expiry(self, key: str) -> float:
+            return self.state.counter_expiry(key)
+
+        def check(self) -> bool:
+            try:
+                self.state.get_counter("__check__")
+                return True
+            except sqlite3.Error:
+                return False
+
+        def reset(self) -> Optional[int]:
+            return self.state.reset_counters()
+
+        def clear(self, key: str):
+            self.state.clear_counter(key)
+
+except ImportError:
+    SQLiteLimiterStorage = None
@@ -0,0 +1,518 @@
+"""
+MAE-IDP Folder Watcher
+Filesystem events only enqueue paths; a readiness checker and a worker pool
+do the waiting and the OCR, so a burst of scanner files is processed in
+parallel and never blocks the observer thread or the HTTP request.
+Network shares (SMB/NFS) deliver no events and are polled instead.
+"""
+
+import hashlib
+import os
+import queue
+import sys
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from logging_config import get_logger
+from scheduler import Priority, PriorityScheduler
+from state import SharedState
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+    WATCHDOG_OK = True
+except ImportError:
+    WATCHDOG_OK = False
+    Observer = None
+    FileSystemEventHandler = object
+
+logger = get_logger("watcher")
+
+SUPPORTED_EXTENSIONS = {'.pdf', '.jpg', '.jpeg', '.png', '.tiff', '.tif'}
+
+READY_POLL_INTERVAL = 0.5  # Size-stability check period for pending files
+READY_TIMEOUT = 30.0  # Give up waiting for a file to finish writing
+
+POLL_INTERVAL = 5.0  # Default scan period of the polling backend
+# Directory mtime granularity on SMB/NFS can be coarse: listings modified this
+# recently are re-read on the next scan even if the mtime looks unchanged
+MTIME_SETTLE_NS = 2 * 10**9
+
+NETWORK_FS_TYPES = {"cifs", "smb3", "smbfs", "nfs", "nfs4", "afpfs", "9p", "fuse.sshfs", "davfs"}
+BACKENDS = ("auto", "events", "polling")
+
+
+def is_network_path(path: Path) -> bool:
+    """True for UNC paths, mapped network drives and SMB/NFS mounts"""
+    path_str = str(path)
+    if path_str.startswith(("\\\\", "//")):
+        return True
+    if sys.platform == "win32":
+        import ctypes
+        drive = os.path.splitdrive(os.path.abspath(path_str))[0]
+        return bool(drive) and ctypes.windll.kernel32.GetDriveTypeW(drive + "\\") == 4  # DRIVE_REMOTE
+    try:
+        resolved = os.path.realpath(path_str)
+        best, fstype = "", ""
+        with open("/proc/mounts", encoding="utf-8") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) < 3:
+                    continue
+                mount = parts[1].replace("\\040", " ")
+                inside = resolved == mount or resolved.startswith(mount.rstrip("/") + "/")
+                if inside and len(mount) > len(best):
+                    best, fstype = mount, parts[2]
+        return fstype in NETWORK_FS_TYPES
+    except OSError:
+        return False  # No /proc (macOS): fall back to native events
+
+
+def _entry_signature(entry: os.DirEntry) -> int:
+    """Cheap identity of a directory entry that needs no extra stat call"""
+    if sys.platform == "win32":
+        return entry.stat().st_mtime_ns  # Filled in by FindNextFile, no syscall
+    return entry.inode()  # d_ino from readdir
+
+
+class TreeSnapshot:
+    """
+    Incremental snapshot of a directory tree for the polling backend.
+
+    Each scan stats every directory once; only directories whose mtime changed
+    are listed again, and known entries are compared by their cached signature
+    (inode), so a tree of 100k+ files costs one stat per directory per scan.
+    Files modified in place do not change the directory mtime; scanners create
+    new files (or rename temp files), which does.
+    """
+
+    def __init__(self, root: Path, recursive: bool = True, exclude: Iterable[Path] = ()):
+        self.root = str(root)
+        self.recursive = recursive
+        self.exclude = {os.path.normcase(os.path.abspath(str(p))) for p in exclude}
+        # dir -> (mtime_ns or None when it must be re-listed, {file name: signature}, {subdir names})
+        self._dirs: Dict[str, tuple] = {}
+        self.scans = 0
+        self.last_scan_ms = 0.0
+        self.last_listed = 0
+
+    def scan(self) -> List[Path]:
+        """Return supported files that are new (or replaced) since the previous scan"""
+        start = time.perf_counter()
+        now_ns = time.time_ns()
+        changed = []
+        seen_dirs: Set[str] = set()
+        listed = 0
+        stack = [self.root]
+
+        while stack:
+            dir_path = stack.pop()
+            seen_dirs.add(dir_path)
+            try:
+                mtime_ns = os.stat(dir_path).st_mtime_ns
+            except OSError:
+                continue
+            known = self._dirs.get(dir_path)
+
+            if known is not None and known[0] == mtime_ns:
+                # Listing unchanged: skip it, but subtrees have their own mtimes
+                if self.recursive:
+                    stack.extend(os.path.join(dir_path, name) for name in known[2])
+                continue
+
+            files: Dict[str, int] = {}
+            subdirs: Set[str] = set()
+            try:
+                with os.scandir(dir_path) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                if self.recursive and os.path.normcase(entry.path) not in self.exclude:
+                                    subdirs.add(entry.name)
+                            elif os.path.splitext(entry.name)[1].lower() in SUPPORTED_EXTENSIONS \
+                                    and entry.is_file():
+                                files[entry.name] = _entry_signature(entry)
+                        except OSError:
+                            continue  # Entry vanished while listing
+            except OSError:
+                continue
+            listed += 1
+
+            old_files = known[1] if known is not None else {}
+            for name, signature in files.items():
+                if old_files.get(name) != signature:
+                    changed.append(Path(dir_path, name))
+            settled = now_ns - mtime_ns > MTIME_SETTLE_NS
+            self._dirs[dir_path] = (mtime_ns if settled else None, files, subdirs)
+            stack.extend(os.path.join(dir_path, name) for name in subdirs)
+
+        # Forget removed directories
+        for dir_path in self._dirs.keys() - seen_dirs:
+            del self._dirs[dir_path]
+
+        self.scans += 1
+        self.last_listed = listed
+        self.last_scan_ms = (time.perf_counter() - start) * 1000
+        return changed
+
+    def stats(self) -> dict:
+        return {
+            "dirs": len(self._dirs),
+            "files": sum(len(files) for _, files, _ in self._dirs.values()),
+            "scans": self.scans,
+            "last_scan_ms": round(self.last_scan_ms, 1),
+            "last_listed_dirs": self.last_listed,
+        }
+
+
+def _file_sha256(path: Path) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class ProcessedJournal:
+    """
+    Restart-safe record of processed files, keyed by (path, size, mtime, inode, ctime, content hash).
+
+    A recent-window LRU answers repeat checks from memory; everything else is
+    looked up in the SharedState journal table, so memory stays flat and dedup
+    survives restarts and watcher leadership changes. A new file reusing the
+    path of a processed one differs in size/mtime and content hash, so it is
+    not skipped. Size and mtime alone are not trusted: a replacement that keeps
+    both (cp -p, rsync -t) has a new inode or ctime and is checked by hash.
+    """
+
+    def __init__(
+        self,
+        state: Optional[SharedState] = None,
+        recent_size: int = 10000,
+        retention_days: int = 180
+    ):
+        self.state = state  # None: in-memory only (bounded by recent_size)
+        self.recent_size = recent_size
+        self.retention_seconds = retention_days * 86400
+        self._recent: "OrderedDict[tuple, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._records = 0
+
+    @staticmethod
+    def _key(path: Path, st) -> tuple:
+        return (str(path), st.st_size, st.st_mtime_ns, st.st_ino, st.st_ctime_ns)
+
+    def _remember(self, key: tuple):
+        with self._lock:
+            self._recent[key] = None
+            self._recent.move_to_end(key)
+            while len(self._recent) > self.recent_size:
+                self._recent.popitem(last=False)
+
+    def is_processed(self, path: Path) -> bool:
+        """True if this exact file (not just this path) was processed before"""
+        try:
+            st = path.stat()
+        except OSError:
+            return False
+        key = self._key(path, st)
+        with self._lock:
+            if key in self._recent:
+                self._recent.move_to_end(key)
+                return True
+        if self.state is None:
+            return False
+
+        rows = self.state.journal_lookup(str(path))
+        if not rows:
+            return False
+        if any(row[:4] == key[1:] for row in rows):
+            self._remember(key)
+            return True
+        # Same path, different stat: touched or replaced copy of processed content, or a new file
+        candidates = {sha for size, *_, sha in rows if size == st.st_size}
+        if candidates and _file_sha256(path) in candidates:
+            self._remember(key)
+            return True
+        return False
+
+    def record(self, path: Path, file_hash: str = None):
+        """Mark file as processed (call while the file is still at path); hashes it only without file_hash"""
+        try:
+            st = path.stat()
+        except OSError:
+            return
+        key = self._key(path, st)
+        self._remember(key)
+        if self.state is None:
+            return
+        self.state.journal_add(str(path), st.st_size, st.st_mtime_ns, file_hash or _file_sha256(path),
+                               st.st_ino, st.st_ctime_ns)
+        with self._lock:
+            self._records += 1
+            prune = self._records % 1000 == 0
+        if prune:
+            self.state.journal_prune(time.time() - self.retention_seconds)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"recent": len(self._recent), "recent_size": self.recent_size,
+                    "persistent": self.state is not None}
+
+
+class FolderWatcher:
+    """
+    Watches a folder and processes new documents.
+
+    Pipeline: observer event or poll diff -> pending (readiness check) -> work queue -> workers.
+    On Linux, inotify close-write events mark a file ready immediately;
+    elsewhere readiness is a stable non-zero size over one poll interval.
+
+    backend: "events" (watchdog), "polling" (TreeSnapshot every poll_interval,
+    works on SMB/NFS and without watchdog) or "auto" (polling on network paths).
+    """
+
+    def __init__(
+        self,
+        parser,
+        on_result: Callable,
+        scheduler: PriorityScheduler = None,
+        on_processed: Callable = None,
+        workers: int = 4,
+        journal: ProcessedJournal = None,
+        recursive: bool = False,
+        backend: str = "auto",
+        poll_interval: float = POLL_INTERVAL,
+        exclude: Iterable[Path] = ()
+    ):
+        self.parser = parser
+        self.on_result = on_result
+        self.scheduler = scheduler
+        self.on_processed = on_processed  # (result, path) -> None, e.g. archive the file
+        self.workers = max(1, workers)
+        self.recursive = recursive
+        self.backend = backend  # Requested backend; active_backend is what start() chose
+        self.active_backend = None
+        self.poll_interval = poll_interval
+        self.exclude = [Path(p) for p in exclude]  # e.g. archive dir inside a recursive watch
+        self.snapshot: Optional[TreeSnapshot] = None
+        self.observer = None
+        self.watch_path = None
+        self.running = False
+        self.journal = journal or ProcessedJournal()
+        self._in_flight = set()  # Paths currently queued for a worker decision
+        self._in_flight_lock = threading.Lock()
+        self._pending: Dict[Path, tuple] = {}  # path -> (last_size, first_seen)
+        self._pending_lock = threading.Lock()
+        self._queue: "queue.Queue[Optional[Path]]" = queue.Queue()
+        self._threads = []
+        self._stop_event = threading.Event()
+        self._control_lock = threading.RLock()  # start() / stop() from endpoints and the lease supervisor
+
+    def start(self, watch_path: str, output_path: str = None, recursive: bool = None, backend: str = None):
+        """Start watching; a call for the folder / mode already being watched is a no-op"""
+        with self._control_lock:
+            if self.running and self.watch_path == Path(watch_path) \
+                    and recursive in (None, self.recursive) and backend in (None, self.backend):
+                return True
+            return self._start(watch_path, recursive, backend)
+
+    def _start(self, watch_path: str, recursive: Optional[bool], backend: Optional[str]) -> bool:
+        if recursive is not None:
+            self.recursive = recursive
+        if backend is not None:
+            self.backend = backend
+        if self.backend not in BACKENDS:
+            raise ValueError(f"Unknown watcher backend: {self.backend}")
+
+        if self.running:
+            self.stop()
+
+        # output_path сохраняется в конфиге, но не используется (архив всегда в ARCHIVE_DIR)
+        self.watch_path = Path(watch_path)
+
+        if not self.watch_path.exists():
+            return False
+
+        polling = self.backend == "polling" or (self.backend == "auto" and is_network_path(self.watch_path))
+        if not polling and not WATCHDOG_OK:
+            if self.backend == "events":
+                logger.warning("Watchdog not installed, folder watching disabled")
+                return False
+            polling = True  # auto: polling works without watchdog
+        self.active_backend = "polling" if polling else "events"
+        self.snapshot = TreeSnapshot(self.watch_path, self.recursive, self.exclude)
+
+        watcher = self
+
+        class Handler(FileSystemEventHandler):
+            # Only enqueue here: this runs in watchdog's single observer thread
+            def on_created(self, event):
+                if not event.is_directory:
+                    watcher.enqueue(Path(event.src_path))
+
+            def on_moved(self, event):
+                # Scanners often write a temp file and rename it when done
+                if not event.is_directory:
+                    watcher.enqueue(Path(event.dest_path), ready=True)
+
+            def on_closed(self, event):
+                # inotify IN_CLOSE_WRITE: writer is done, no polling needed
+                if not event.is_directory:
+                    watcher.enqueue(Path(event.src_path), ready=True)
+
+        # Fresh queue and stop flag per run, so workers of a previous run exit cleanly
+        self._stop_event = stop = threading.Event()
+        self._queue = work = queue.Queue()
+        self._threads = [
+            threading.Thread(target=self._ready_loop, args=(stop,), name="watcher-ready", daemon=True),
+            threading.Thread(target=self._scan_loop, args=(stop, self.snapshot, polling),
+                             name="watcher-scan", daemon=True),
+        ] + [
+            threading.Thread(target=self._worker, args=(work,), name=f"watcher-worker-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+
+        if not polling:
+            self.observer = Observer()
+            self.observer.schedule(Handler(), str(self.watch_path), recursive=self.recursive)
+            self.observer.start()
+        self.running = True
+        logger.info("Watching %s (%s, recursive=%s)", self.watch_path, self.active_backend, self.recursive)
+
+        for t in self._threads:
+            t.start()
+        return True
+
+    def enqueue(self, path: Path, ready: bool = False):
+        """Queue a path for processing; not-yet-ready files go through the readiness check"""
+        if path.suffix.lower() not in SUPPORTED_EXTENSIONS:
+            return
+        if self.exclude and any(p in path.parents for p in self.exclude):
+            return
+        with self._pending_lock:
+            if ready:
+                self._pending.pop(path, None)
+                self._queue.put(path)
+            elif path not in self._pending:
+                self._pending[path] = (-1, time.monotonic())
+
+    def _scan_loop(self, stop: threading.Event, snapshot: TreeSnapshot, polling: bool):
+        """
+        Initial scan of files already in the tree (background, does not block start()),
+        then for the polling backend a snapshot diff every poll_interval
+        """
+        for path in snapshot.scan():
+            if stop.is_set():
+                return
+            self.enqueue(path, ready=True)
+        if not polling:
+            return
+        while not stop.wait(self.poll_interval):
+            try:
+                for path in snapshot.scan():
+                    self.enqueue(path)  # May still be copied over the network
+            except Exception as e:
+                logger.error("Polling scan of %s failed: %s", self.watch_path, e)
+
+    def _ready_loop(self, stop: threading.Event):
+        """Promote pending files to the work queue once their size is stable"""
+        while not stop.wait(READY_POLL_INTERVAL):
+            now = time.monotonic()
+            with self._pending_lock:
+                items = list(self._pending.items())
+
+            for path, (prev_size, first_seen) in items:
+                try:
+                    size = path.stat().st_size
+                except OSError:
+                    size = -1
+
+                with self._pending_lock:
+                    if path not in self._pending:
+                        continue  # Promoted by a close event meanwhile
+                    if size > 0 and size == prev_size:
+                        del self._pending[path]
+                        self._queue.put(path)
+                    elif now - first_seen > READY_TIMEOUT:
+                        del self._pending[path]
+                        if size > 0:
+                            self._queue.put(path)
+                        else:
+                            logger.warning("File not ready after timeout: %s", path)
+                    else:
+                        self._pending[path] = (size, first_seen)
+
+    def _worker(self, work: queue.Queue):
+        while True:
+            path = work.get()
+            if path is None:
+                return
+            try:
+                self.process_file(path)
+            except Exception as e:
+                logger.error("Watcher error processing %s: %s", path.name, e)
+
+    def process_file(self, path: Path):
+        # Thread-safe: one worker per path at a time, duplicate events are dropped
+        key = str(path)
+        with self._in_flight_lock:
+            if key in self._in_flight:
+                return
+            self._in_flight.add(key)
+        try:
+            if not path.exists() or self.journal.is_processed(path):
+                return
+            # Processing outside lock (long operation), behind interactive uploads
+            if self.scheduler:
+                result = self.scheduler.run(Priority.WATCHER, self.parser.parse, path)
+            else:
+                result = self.parser.parse(path)
+            # Before on_processed moves the file away; the parse already hashed the content
+            self.journal.record(path, getattr(result, "file_hash", None))
+            self.on_result(result)
+            if self.on_processed:
+                self.on_processed(result, path)
+        finally:
+            with self._in_flight_lock:
+                self._in_flight.discard(key)
+
+    def stop(self):
+        with self._control_lock:
+            self._stop()
+
+    def _stop(self):
+        self._stop_event.set()
+        if self.observer:
+            self.observer.stop()
+            self.observer.join()
+        with self._pending_lock:
+            self._pending.clear()
+        # Drop queued paths, then wake each worker with a sentinel
+        try:
+            while True:
+                self._queue.get_nowait()
+        except queue.Empty:
+            pass
+        for _ in range(self.workers):
+            self._queue.put(None)
+        self.running = False
+        self.observer = None
+
+    @property
+    def status(self):
+        with self._pending_lock:
+            pending = len(self._pending)
+        return {
+            "running": self.running,
+            "watch_path": str(self.watch_path) if self.watch_path else None,
+            "backend": self.active_backend,
+            "recursive": self.recursive,
+            "snapshot": self.snapshot.stats() if self.snapshot else None,
+            "pending": pending,
+            "queued": self._queue.qsize(),
+            "journal": self.journal.stats(),
+        }
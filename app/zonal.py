@@ -0,0 +1,205 @@
+"""
+MAE-IDP Zonal OCR Templates
+Per-vendor field zones learned from successful full-page OCR: where the
+vendor line, the invoice number and the VAT ID of a supplier were found.
+A page is matched to a template by vendor (payment QR) or by a fingerprint
+of its letterhead; then only those zones are OCR'd (see
+BaseOCRProcessor.extract_text_fields in core.py), with full-page OCR as the
+fallback when a zone doesn't validate.
+
+Stored in data/zone_templates.json; each process learns on its own and
+merges into the file on save.
+"""
+
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+TEMPLATES_FILE = Path(__file__).parent.parent / "data" / "zone_templates.json"
+
+ZONE_FIELDS = ("vendor", "invoice_number", "vat_id")
+MIN_SAMPLES = 2  # Successful documents before a template is used
+MAX_SAMPLES = 5  # Boxes and fingerprints kept per vendor; learning stops after that
+MAX_ZONE_AREA = 0.15  # Union of a field's boxes (page fraction); larger = field moves around
+MAX_MISSES = 3  # Failed validations (more than hits) retire a template
+
+# Zone padding around the recorded line box: line heights vertically (skew,
+# scan offset), page fraction horizontally
+PAD_LINES = 1.0
+PAD_WIDTH = 0.02
+
+# Letterhead fingerprint: ink / no ink per cell of a grid over the top band
+FINGERPRINT_BAND = 0.15
+FINGERPRINT_SIZE = (32, 8)  # 256 bits
+FINGERPRINT_INK = 0.02  # Share of dark pixels for a cell to count as ink
+MAX_DISTANCE = 24  # Hamming distance for a fingerprint match (skew and noise stay well below)
+MAX_CANDIDATES = 3  # Plain-text letterheads look alike: vendor zone decides between the nearest
+
+Box = Tuple[float, float, float, float]  # x0, y0, x1, y1 as page fractions
+
+
+def fingerprint(img) -> int:
+    """256-bit ink map of the page top (letterhead, logo); Otsu keeps scan noise out of blank cells"""
+    import cv2
+    if len(img.shape) == 3:
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    band = img[:max(1, int(img.shape[0] * FINGERPRINT_BAND))]
+    _, ink = cv2.threshold(band, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    cells = cv2.resize(ink, FINGERPRINT_SIZE, interpolation=cv2.INTER_AREA)
+    bits = (cells > 255 * FINGERPRINT_INK).flatten()
+    return int("".join("1" if b else "0" for b in bits), 2)
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def line_box(left: int, top: int, width: int, height: int, page_width: int, page_height: int) -> Box:
+    """Padded zone of an OCR line as page fractions"""
+    pad_y = height * PAD_LINES
+    return (max(0.0, left / page_width - PAD_WIDTH), max(0.0, (top - pad_y) / page_height),
+            min(1.0, (left + width) / page_width + PAD_WIDTH), min(1.0, (top + height + pad_y) / page_height))
+
+
+@dataclass
+class ZoneTemplate:
+    """Observed field boxes and letterhead fingerprints of one vendor"""
+    vendor: str
+    boxes: Dict[str, List[Box]] = field(default_factory=dict)
+    fingerprints: List[int] = field(default_factory=list)
+    samples: int = 0
+    # Runtime counters (not stored)
+    hits: int = 0
+    misses: int = 0
+
+    @property
+    def ready(self) -> bool:
+        return self.samples >= MIN_SAMPLES and not (self.misses >= MAX_MISSES and self.misses > self.hits)
+
+    def zone(self, name: str) -> Optional[Box]:
+        """Union of the observed boxes of a field, None if unknown or too large"""
+        boxes = self.boxes.get(name)
+        if not boxes:
+            return None
+        x0, y0 = min(b[0] for b in boxes), min(b[1] for b in boxes)
+        x1, y1 = max(b[2] for b in boxes), max(b[3] for b in boxes)
+        if (x1 - x0) * (y1 - y0) > MAX_ZONE_AREA:
+            return None
+        return x0, y0, x1, y1
+
+    def add(self, boxes: Dict[str, Box], page_print: Optional[int]) -> bool:
+        """Record one successful document; False once the template is complete"""
+        if self.samples >= MAX_SAMPLES:
+            return False
+        for name, box in boxes.items():
+            self.boxes.setdefault(name, []).append(tuple(round(v, 4) for v in box))
+        if page_print is not None:
+            self.fingerprints.append(page_print)
+        self.samples += 1
+        return True
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"boxes": self.boxes, "fingerprints": [f"{f:x}" for f in self.fingerprints], "samples": self.samples}
+
+    @classmethod
+    def from_dict(cls, vendor: str, data: Dict[str, Any]) -> "ZoneTemplate":
+        return cls(vendor=vendor, boxes={k: [tuple(b) for b in v] for k, v in data.get("boxes", {}).items()},
+                   fingerprints=[int(f, 16) for f in data.get("fingerprints", [])], samples=data.get("samples", 0))
+
+
+class ZoneTemplateStore:
+    """Templates by vendor; thread-safe, saved after every learned document (atomic write)"""
+
+    def __init__(self, path: Optional[Path] = TEMPLATES_FILE, autosave: bool = True):
+        self.path = path
+        self.autosave = autosave and path is not None
+        self.templates: Dict[str, ZoneTemplate] = {}
+        self._lock = threading.Lock()
+        self._counts = {"zonal": 0, "fallback": 0, "learned": 0, "zone_pixels": 0, "page_pixels": 0}
+        if path is not None:
+            self.templates = self._read()
+
+    def _read(self) -> Dict[str, ZoneTemplate]:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        return {vendor: ZoneTemplate.from_dict(vendor, t) for vendor, t in data.items()}
+
+    def match(self, img, vendor: Optional[str] = None) -> List[ZoneTemplate]:
+        """Ready template of a known vendor, else up to MAX_CANDIDATES by letterhead fingerprint, nearest first"""
+        with self._lock:
+            if vendor:
+                template = self.templates.get(vendor)
+                return [template] if template and template.ready else []
+            candidates = [t for t in self.templates.values() if t.ready and t.fingerprints and t.zone("vendor")]
+        if not candidates:
+            return []
+        page = fingerprint(img)
+        distances = [(min(hamming(page, f) for f in t.fingerprints), t) for t in candidates]
+        return [t for d, t in sorted(distances, key=lambda x: x[0]) if d <= MAX_DISTANCE][:MAX_CANDIDATES]
+
+    def learn(self, vendor: str, img, boxes: Dict[str, Box]):
+        """Add the field boxes of a successful full-page OCR to the vendor's template"""
+        with self._lock:
+            template = self.templates.get(vendor)
+            if template is not None and template.samples >= MAX_SAMPLES:
+                return
+        page_print = fingerprint(img) if "vendor" in boxes else None
+        with self._lock:
+            template = self.templates.setdefault(vendor, ZoneTemplate(vendor))
+            if not template.add(boxes, page_print):
+                return
+            self._counts["learned"] += 1
+        if self.autosave:
+            self.save()
+
+    def record(self, template: Optional[ZoneTemplate], ok: bool, zone_pixels: int, page_pixels: int):
+        """Outcome of a zonal attempt (ok=False: full-page fallback; template None: no vendor confirmed)"""
+        with self._lock:
+            if ok:
+                template.hits += 1
+                self._counts["zonal"] += 1
+                self._counts["zone_pixels"] += zone_pixels
+                self._counts["page_pixels"] += page_pixels
+                return
+            if template is not None:
+                template.misses += 1
+            self._counts["fallback"] += 1
+
+    def save(self):
+        """Merge into the file (other processes learn too) and replace it atomically"""
+        with self._lock:
+            stored = self._read()
+            for vendor, template in self.templates.items():
+                if template.samples >= stored.get(vendor, ZoneTemplate(vendor)).samples:
+                    stored[vendor] = template
+            data = {vendor: t.to_dict() for vendor, t in stored.items()}
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=1)
+            os.replace(tmp, self.path)
+
+    def counts(self) -> Dict[str, int]:
+        """Raw counters (summed over batch worker processes, see summarize)"""
+        with self._lock:
+            return dict(self._counts)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            ready = sum(t.ready for t in self.templates.values())
+            templates = len(self.templates)
+        return {"templates": templates, "ready": ready, **self.summarize(self.counts())}
+
+    @staticmethod
+    def summarize(counts: Dict[str, int]) -> Dict[str, Any]:
+        counts = dict(counts)
+        page = counts.pop("page_pixels")
+        zone = counts.pop("zone_pixels")
+        # pixels_saved: share of page pixels not OCR'd on zonal documents
+        return {**counts, "pixels_saved": round(1 - zone / page, 3) if page else None}
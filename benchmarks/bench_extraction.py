@@ -0,0 +1,293 @@
+"""
+MAE-IDP Extraction Replay Benchmark
+Replays recorded OCR text through extract_vendor / extract_invoice_number /
+extract_vat_id only - no Tesseract, no images - and reports ns per document,
+the slowest inputs and accuracy against the recorded labels. Regex or vendor
+list changes get a speed and accuracy verdict in seconds.
+
+Text corpora are JSONL, one record per document:
+  {"id": ..., "text": <raw OCR text>, "labels": {"vendor": ..., ...}, "source": ...,
+   "lines": [[text, left, top, width, height], ...], "page_size": [width, height]}
+
+With line boxes the extractors see the page layout as after run_ocr();
+--text-only replays the bare text (line-count heuristics).
+
+Usage:
+  python benchmarks/bench_extraction.py                                  # synthetic corpus in memory
+  python benchmarks/bench_extraction.py synth --count 2000 --output texts.jsonl
+  python benchmarks/bench_extraction.py record benchmarks/corpus --output texts.jsonl   # needs Tesseract
+  python benchmarks/bench_extraction.py replay texts.jsonl --output extraction.json --check
+  python benchmarks/bench_extraction.py replay --text-only
+"""
+
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+ROOT_DIR = Path(__file__).parent.parent
+APP_DIR = ROOT_DIR / "app"
+sys.path.insert(0, str(APP_DIR))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from bench_pipeline import normalize  # noqa: E402
+from core import OCRLine, OCRText  # noqa: E402
+from corpus import CHAR_WIDTH, GROUND_TRUTH_FILE, load_ground_truth, ocr_text, random_truth  # noqa: E402
+
+EXTRACTORS = ["extract_vendor", "extract_invoice_number", "extract_vat_id"]
+FIELDS = {"extract_vendor": "vendor", "extract_invoice_number": "invoice_number", "extract_vat_id": "vat_id"}
+
+# Enforced by tests/test_extraction_replay.py on the synthetic corpus (SYNTH_COUNT, SYNTH_SEED).
+# Timing budget is generous on purpose: it catches catastrophic regex backtracking, not noise.
+THRESHOLDS = {
+    "us_per_doc": 2000,
+    "worst_us": 20000,
+    # vat_id: the USt-IdNr patterns run across line breaks and past the ID on shared
+    # footer lines, so only a VAT ID on the last line is found; raise once that is fixed
+    "accuracy": {"vendor": 0.97, "invoice_number": 0.95, "vat_id": 0.15},
+}
+SYNTH_COUNT = 300
+SYNTH_SEED = 7
+
+# Lines that must NOT be extracted: buyer data, order/customer numbers, mail footers
+DISTRACTORS = [
+    "Ihre USt-IdNr.: DE135198442",
+    "Kundennummer: KD-{n}",
+    "Bestellnummer: {n}",
+    "Referenz: REF-{n}",
+    "Fragen? Schreiben Sie an buchhaltung@sicherheit-nord.de",
+    "Lieferung an: Sicherheit Nord GmbH, Tor 3",
+]
+DISTRACTOR_SIZE = 32
+
+
+@dataclass
+class TextRecord:
+    """Raw OCR text of one document with its expected field values (and line boxes, if recorded)"""
+    id: str
+    text: str
+    labels: Dict[str, Optional[str]] = field(default_factory=dict)
+    source: str = "synthetic"
+    lines: List[list] = field(default_factory=list)
+    page_size: Optional[List[int]] = None
+
+    @classmethod
+    def from_ocr(cls, id: str, text: str, labels: dict, source: str) -> "TextRecord":
+        lines = [[line.text, line.left, line.top, line.width, line.height] for line in getattr(text, "lines", [])]
+        page_size = [text.page_width, text.page_height] if lines else None
+        return cls(id=id, text=str(text), labels=labels, source=source, lines=lines, page_size=page_size)
+
+    def ocr_text(self, layout: bool = True) -> str:
+        """Text as run_ocr() returned it; plain str without boxes or when layout is False"""
+        if not (layout and self.lines and self.page_size):
+            return self.text
+        return OCRText(self.text, [OCRLine(*line) for line in self.lines], *self.page_size)
+
+
+def save_records(records: Iterable[TextRecord], path: Path) -> int:
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(asdict(record), ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+def load_records(path: Path) -> List[TextRecord]:
+    with open(path, encoding="utf-8") as f:
+        return [TextRecord(**json.loads(line)) for line in f if line.strip()]
+
+
+def synthesize(count: int = SYNTH_COUNT, seed: int = SYNTH_SEED, error_rate: float = 0.01) -> List[TextRecord]:
+    """
+    OCR-like texts with line boxes of the synthetic invoice layout (benchmarks/corpus.py).
+    Every third document gets distractor lines, every fifth OCR character errors.
+    """
+    rng = random.Random(seed)
+    records = []
+    for i in range(count):
+        truth = random_truth(rng, i)
+        page = ocr_text(truth, rng, error_rate if i % 5 == 4 else 0.0)
+        if i % 3 == 0:
+            lines = list(page.lines)
+            for line in rng.sample(DISTRACTORS, 2):
+                at = rng.randrange(2, len(lines))
+                line = line.format(n=rng.randint(10000, 99999))
+                # Just below the line it follows in reading order
+                lines.insert(at, OCRLine(line, lines[at - 1].left, lines[at - 1].top + lines[at - 1].height + 5,
+                                         int(len(line) * DISTRACTOR_SIZE * CHAR_WIDTH), DISTRACTOR_SIZE))
+            page = OCRText("\n".join(line.text for line in lines) + "\n", lines, page.page_width, page.page_height)
+        labels = {"vendor": truth.vendor, "invoice_number": truth.invoice_number, "vat_id": truth.vat_id}
+        records.append(TextRecord.from_ocr(f"synth-{i:05d}", page, labels, "synthetic"))
+    return records
+
+
+def record_documents(corpus: Path, processor=None) -> Iterable[TextRecord]:
+    """
+    Run OCR over a document folder and yield its raw text and line boxes.
+
+    Labels come from ground_truth.jsonl when present (synthetic corpus);
+    otherwise the current extraction result is recorded as the expected value,
+    so later regex changes are compared against today's behaviour.
+    """
+    if processor is None:
+        from core import BaseOCRProcessor
+        processor = BaseOCRProcessor()
+    if not processor.ocr_ok:
+        raise RuntimeError("Tesseract is not available")
+
+    if (corpus / GROUND_TRUTH_FILE).exists():
+        docs = [(corpus / t.filename, {"vendor": t.vendor, "invoice_number": t.invoice_number,
+                                       "vat_id": t.vat_id}) for t in load_ground_truth(corpus)]
+    else:
+        from batch_rename import SUPPORTED_EXTENSIONS, iter_input_files
+        docs = [(p, None) for p in iter_input_files(corpus) if p.suffix.lower() in SUPPORTED_EXTENSIONS]
+
+    for path, labels in docs:
+        img = processor.load_image(path)
+        if img is None:
+            continue
+        text = processor.run_ocr(img)
+        if labels is None:
+            labels = {f: getattr(processor, name)(text) for name, f in FIELDS.items()}
+        yield TextRecord.from_ocr(str(path.relative_to(corpus)), text, labels, "ocr")
+
+
+def replay(records: List[TextRecord], processor=None, repeat: int = 3, worst: int = 5,
+           layout: bool = True) -> dict:
+    """
+    Run every record through the extractors repeat times
+    (layout=False: bare text even where line boxes were recorded).
+
+    Per-record time is the minimum over the repeats (least disturbed by the
+    scheduler); ns/document is the mean of those minimums.
+    """
+    if processor is None:
+        from core import BaseOCRProcessor
+        processor = BaseOCRProcessor(probe=False)
+    extractors = [(name, getattr(processor, name)) for name in EXTRACTORS]
+
+    per_extractor: Dict[str, List[int]] = {name: [] for name in EXTRACTORS}
+    hits = {f: 0 for f in FIELDS.values()}
+    mismatches = []
+    docs_ok = 0
+    for record in records:
+        ok = True
+        text = record.ocr_text(layout)
+        for name, extract in extractors:
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter_ns()
+                value = extract(text)
+                elapsed = time.perf_counter_ns() - start
+                best = elapsed if best is None else min(best, elapsed)
+            per_extractor[name].append(best)
+            f = FIELDS[name]
+            expected = record.labels.get(f)
+            if normalize(f, value) == normalize(f, expected):
+                hits[f] += 1
+            else:
+                ok = False
+                mismatches.append({"id": record.id, "field": f, "expected": expected, "got": value})
+        docs_ok += ok
+
+    n = len(records) or 1
+    totals = [sum(per_extractor[name][i] for name in EXTRACTORS) for i in range(len(records))]
+    slowest = sorted(range(len(records)), key=totals.__getitem__, reverse=True)[:worst]
+    return {
+        "documents": len(records),
+        "ns_per_doc": round(statistics.fmean(totals)) if totals else 0,
+        "extractors_ns": {name: {"mean": round(statistics.fmean(v)), "max": max(v)}
+                          for name, v in per_extractor.items() if v},
+        "worst": [{"id": records[i].id, "ns": totals[i], "chars": len(records[i].text)} for i in slowest],
+        "accuracy": {
+            "fields": {f: round(hits[f] / n, 4) for f in hits},
+            "documents": round(docs_ok / n, 4),
+        },
+        "mismatches": mismatches[:50],
+    }
+
+
+def check(result: dict, thresholds: dict = THRESHOLDS) -> List[str]:
+    """Threshold violations of a replay result (empty list = pass)"""
+    failures = []
+    if result["ns_per_doc"] > thresholds["us_per_doc"] * 1000:
+        failures.append(f"{result['ns_per_doc'] / 1000:.0f} us/doc > {thresholds['us_per_doc']} us")
+    if result["worst"] and result["worst"][0]["ns"] > thresholds["worst_us"] * 1000:
+        worst = result["worst"][0]
+        failures.append(f"{worst['id']}: {worst['ns'] / 1000:.0f} us > {thresholds['worst_us']} us")
+    for f, minimum in thresholds["accuracy"].items():
+        value = result["accuracy"]["fields"].get(f, 0)
+        if value < minimum:
+            failures.append(f"{f} accuracy {value} < {minimum}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MAE-IDP OCR-free extraction benchmark")
+    sub = parser.add_subparsers(dest="command")
+
+    synth = sub.add_parser("synth", help="Write a synthetic text corpus")
+    synth.add_argument("--count", type=int, default=SYNTH_COUNT)
+    synth.add_argument("--seed", type=int, default=SYNTH_SEED)
+    synth.add_argument("--error-rate", type=float, default=0.01, help="OCR character error rate")
+    synth.add_argument("--output", required=True)
+
+    record = sub.add_parser("record", help="OCR a document folder into a text corpus (needs Tesseract)")
+    record.add_argument("folder")
+    record.add_argument("--output", required=True)
+
+    rep = sub.add_parser("replay", help="Replay a text corpus through the extractors")
+    rep.add_argument("corpus", nargs="?", help="Text corpus JSONL (default: synthetic, in memory)")
+    rep.add_argument("--repeat", type=int, default=3)
+    rep.add_argument("--output", help="Write results as JSON to this file")
+    rep.add_argument("--check", action="store_true", help="Fail if THRESHOLDS are violated")
+    rep.add_argument("--text-only", action="store_true", help="Ignore recorded line boxes")
+
+    args = parser.parse_args()
+    command = args.command or "replay"
+
+    if command == "synth":
+        count = save_records(synthesize(args.count, args.seed, args.error_rate), Path(args.output))
+        print(f"{count} records in {args.output}")
+        return
+    if command == "record":
+        try:
+            count = save_records(record_documents(Path(args.folder)), Path(args.output))
+        except RuntimeError as e:
+            print(f"ERROR: {e}", file=sys.stderr)
+            sys.exit(2)
+        print(f"{count} records in {args.output}")
+        return
+
+    corpus = getattr(args, "corpus", None)
+    records = load_records(Path(corpus)) if corpus else synthesize()
+    layout = not getattr(args, "text_only", False)
+    result = replay(records, repeat=getattr(args, "repeat", 3), layout=layout)
+    report = {
+        "benchmark": "extraction",
+        "timestamp": datetime.now().isoformat(),
+        "python": sys.version.split()[0],
+        "corpus": corpus or f"synthetic:{SYNTH_COUNT}:{SYNTH_SEED}",
+        "layout": layout,
+        **result,
+    }
+    print(json.dumps({k: v for k, v in report.items() if k != "mismatches"}, indent=2))
+    if getattr(args, "output", None):
+        Path(args.output).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+
+    if getattr(args, "check", False):
+        failures = check(result)
+        for failure in failures:
+            print(f"FAIL: {failure}", file=sys.stderr)
+        sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+MAE-IDP OCR Settings Sweep
+Runs the labelled corpus (benchmarks/corpus.py) through BatchProcessor for
+every combination of a grid of OCR profile settings (DPI, blur, binarization,
+PSM/OEM, languages, text and corner ROI), prints a latency vs. accuracy table
+with the Pareto front and can store the chosen profile under a name that the
+web app (MAE_OCR_PROFILE) and batch_rename (--ocr-profile) load.
+
+Usage:
+  python benchmarks/bench_ocr_sweep.py --limit 20
+  python benchmarks/bench_ocr_sweep.py --dpi 200 300 --psm 3 6 --binarization otsu adaptive --output sweep.json
+  python benchmarks/bench_ocr_sweep.py --save fast --min-accuracy 0.9
+"""
+
+import argparse
+import itertools
+import json
+import statistics
+import sys
+import time
+from dataclasses import replace
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+
+ROOT_DIR = Path(__file__).parent.parent
+APP_DIR = ROOT_DIR / "app"
+sys.path.insert(0, str(APP_DIR))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from bench_pipeline import FIELDS, score  # noqa: E402
+from corpus import GROUND_TRUTH_FILE, Truth, generate_corpus, load_ground_truth  # noqa: E402
+from ocr_profiles import DEFAULT_PROFILE, PROFILES_FILE, OCRProfile, save_profile  # noqa: E402
+
+
+def _optional_int(value: str) -> Optional[int]:
+    return None if value == "default" else int(value)
+
+
+# CLI option -> (OCRProfile field, value parser, default grid)
+GRID = {
+    "dpi": ("dpi", int, [200, 300]),
+    "blur": ("blur", int, [0, 3]),
+    "binarization": ("binarization", str, ["otsu", "adaptive"]),
+    "psm": ("psm", _optional_int, [None, 6]),
+    "oem": ("oem", _optional_int, [None]),
+    "lang": ("lang", str, ["deu+eng", "deu"]),
+    "text_roi": ("text_roi", str, ["full", "bands"]),
+    "corner_roi": ("corner_roi", float, [0.5]),
+}
+
+
+def build_grid(options: dict) -> List[OCRProfile]:
+    """One profile per combination; options: field -> values (missing = default grid)"""
+    keys = list(GRID)
+    values = [options.get(k) or GRID[k][2] for k in keys]
+    profiles = []
+    for combo in itertools.product(*values):
+        settings = {GRID[k][0]: v for k, v in zip(keys, combo)}
+        name = "-".join(f"{k}={'default' if v is None else v}" for k, v in zip(keys, combo))
+        profiles.append(replace(DEFAULT_PROFILE, name=name, **settings))
+    return profiles
+
+
+def evaluate(profile: OCRProfile, truths: List[Truth], corpus: Path) -> dict:
+    """Latency and field accuracy of one profile over the corpus"""
+    from batch_rename import BatchProcessor
+
+    processor = BatchProcessor()
+    if not processor.ocr_ok:
+        raise RuntimeError("Tesseract is not available")
+    processor.profile = profile
+
+    latency, hits, docs_ok = [], dict.fromkeys(FIELDS, 0), 0
+    for truth in truths:
+        start = time.perf_counter()
+        result = processor.process_file(corpus / truth.filename)
+        latency.append((time.perf_counter() - start) * 1000)
+        matches = score(truth, result)
+        for field, ok in matches.items():
+            hits[field] += ok
+        docs_ok += all(matches.values())
+
+    n = len(truths)
+    fields = {f: round(hits[f] / n, 3) for f in FIELDS}
+    return {
+        "profile": profile.name,
+        "settings": profile.to_dict(),
+        "ms_per_doc": round(statistics.fmean(latency), 1),
+        "p95_ms": round(sorted(latency)[min(n - 1, round(0.95 * (n - 1)))], 1),
+        "fields": fields,
+        "accuracy": round(statistics.fmean(fields.values()), 3),
+        "documents": round(docs_ok / n, 3),
+    }
+
+
+def pareto_front(rows: List[dict]) -> List[dict]:
+    """Rows that no other row beats on both latency and accuracy, fastest first"""
+    front = []
+    for row in sorted(rows, key=lambda r: (r["ms_per_doc"], -r["accuracy"])):
+        if not front or row["accuracy"] > front[-1]["accuracy"]:
+            front.append(row)
+    return front
+
+
+def choose(front: List[dict], min_accuracy: float) -> Optional[dict]:
+    """Fastest Pareto profile that reaches min_accuracy"""
+    return next((row for row in front if row["accuracy"] >= min_accuracy), None)
+
+
+def print_table(rows: List[dict], front: List[dict]):
+    on_front = {id(r) for r in front}
+    print(f"\n{'':2}{'ms/doc':>8} {'p95':>8} {'acc':>6} {'docs':>6}  " + " ".join(f"{f[:8]:>8}" for f in FIELDS)
+          + "  profile")
+    for row in sorted(rows, key=lambda r: r["ms_per_doc"]):
+        mark = "* " if id(row) in on_front else "  "
+        print(f"{mark}{row['ms_per_doc']:>8.1f} {row['p95_ms']:>8.1f} "
+              f"{row['accuracy']:>6.3f} {row['documents']:>6.3f}  "
+              + " ".join(f"{row['fields'][f]:>8.3f}" for f in FIELDS) + f"  {row['profile']}")
+    print("\n* = Pareto front (no other setting is both faster and more accurate)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MAE-IDP OCR settings sweep")
+    parser.add_argument("--corpus", default=str(ROOT_DIR / "benchmarks" / "corpus"),
+                        help="Labelled corpus folder (generated if it has no ground truth)")
+    parser.add_argument("--count", type=int, default=40, help="Documents to generate")
+    parser.add_argument("--limit", type=int, help="Use only the first N documents")
+    for option, (_, parse, default) in GRID.items():
+        parser.add_argument(f"--{option.replace('_', '-')}", nargs="+", type=parse,
+                            help=f"Values to try (default: {' '.join(map(str, default))})")
+    parser.add_argument("--output", help="Write all results as JSON to this file")
+    parser.add_argument("--save", metavar="NAME", help="Store the chosen profile under this name")
+    parser.add_argument("--min-accuracy", type=float, default=0.9,
+                        help="Mean field accuracy the saved profile must reach (default: 0.9)")
+    parser.add_argument("--profiles-file", default=str(PROFILES_FILE), help="Profile store")
+    args = parser.parse_args()
+
+    corpus = Path(args.corpus)
+    if not (corpus / GROUND_TRUTH_FILE).exists():
+        print(f"Generating {args.count} documents in {corpus} ...", file=sys.stderr)
+        generate_corpus(corpus, args.count)
+    truths = load_ground_truth(corpus)[:args.limit]
+
+    profiles = build_grid({option: getattr(args, option) for option in GRID})
+    print(f"{len(profiles)} settings x {len(truths)} documents", file=sys.stderr)
+
+    rows = []
+    for i, profile in enumerate(profiles, 1):
+        try:
+            row = evaluate(profile, truths, corpus)
+        except RuntimeError as e:
+            print(f"ERROR: {e}", file=sys.stderr)
+            sys.exit(2)
+        rows.append(row)
+        print(f"[{i}/{len(profiles)}] {row['ms_per_doc']:.0f} ms/doc, accuracy {row['accuracy']:.3f}  {profile.name}",
+              file=sys.stderr)
+
+    front = pareto_front(rows)
+    print_table(rows, front)
+
+    report = {
+        "benchmark": "ocr_sweep",
+        "timestamp": datetime.now().isoformat(),
+        "python": sys.version.split()[0],
+        "corpus": {"path": str(corpus), "documents": len(truths)},
+        "results": rows,
+        "pareto": [row["profile"] for row in front],
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    if args.save:
+        chosen = choose(front, args.min_accuracy)
+        if chosen is None:
+            print(f"FAIL: no setting reaches accuracy {args.min_accuracy}", file=sys.stderr)
+            sys.exit(1)
+        profile = OCRProfile.from_dict(args.save, chosen["settings"])
+        save_profile(profile, Path(args.profiles_file))
+        print(f"\nSaved profile '{args.save}' ({chosen['ms_per_doc']:.0f} ms/doc, accuracy {chosen['accuracy']:.3f}) "
+              f"to {args.profiles_file}")
+        print(f"Use: MAE_OCR_PROFILE={args.save} or batch_rename.py --ocr-profile {args.save}")
+
+
+if __name__ == "__main__":
+    main()
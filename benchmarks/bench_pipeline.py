@@ -0,0 +1,213 @@
+"""
+MAE-IDP Pipeline Benchmark
+Runs the web parser (Parser.parse) and the batch processor
+(BatchProcessor.process_file) over the synthetic corpus (benchmarks/corpus.py)
+and reports per-stage latency, throughput, peak RSS and extraction accuracy.
+
+Usage:
+  python benchmarks/bench_pipeline.py
+  python benchmarks/bench_pipeline.py --count 80 --output pipeline.json
+  python benchmarks/bench_pipeline.py --baseline pipeline.json --max-regression 0.2
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+ROOT_DIR = Path(__file__).parent.parent
+APP_DIR = ROOT_DIR / "app"
+sys.path.insert(0, str(APP_DIR))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from corpus import GROUND_TRUTH_FILE, Truth, generate_corpus, load_ground_truth  # noqa: E402
+
+# Methods of BaseOCRProcessor timed per document
+STAGES = ["load_image", "extract_qr_codes", "extract_internal_from_corner", "run_ocr",
+          "extract_vendor", "extract_invoice_number", "extract_vat_id"]
+FIELDS = ["vendor", "invoice_number", "vat_id", "internal_number"]
+TARGETS = ("parser", "batch")
+
+
+class StageTimer:
+    """Wraps the stage methods of one processor instance and collects durations"""
+
+    def __init__(self, processor):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        for name in STAGES:
+            setattr(processor, name, self._wrap(name, getattr(processor, name)))
+
+    def _wrap(self, name, method):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.samples[name].append((time.perf_counter() - start) * 1000)
+        return timed
+
+
+def _percentiles(values: List[float]) -> dict:
+    if not values:
+        return {}
+    ordered = sorted(values)
+    p95 = ordered[min(len(ordered) - 1, round(0.95 * (len(ordered) - 1)))]
+    return {"p50": round(statistics.median(ordered), 1), "p95": round(p95, 1),
+            "mean": round(statistics.fmean(ordered), 1), "n": len(ordered)}
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process (None on Windows)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def normalize(field: str, value) -> Optional[str]:
+    """Comparable form of a field value (None if empty)"""
+    if not value:
+        return None
+    value = str(value).strip()
+    if field == "vat_id":
+        return value.replace(" ", "").upper()
+    if field == "internal_number":
+        digits = "".join(c for c in value if c.isdigit())
+        return str(int(digits)) if digits else None
+    if field == "vendor":
+        return value.lower()
+    return value
+
+
+def score(truth: Truth, result) -> Dict[str, bool]:
+    """Per-field match of one result against its ground truth"""
+    return {f: normalize(f, getattr(result, f)) == normalize(f, getattr(truth, f)) for f in FIELDS}
+
+
+def _make_processor(target: str, workdir: Path):
+    if target == "parser":
+        from mae import Parser
+        from previews import PreviewCache
+        processor = Parser()
+        processor.warm_up()
+        # Thumbnails are part of parse(); keep them out of the real data dir
+        processor.previews = PreviewCache(workdir / "previews")
+        return processor, lambda path: processor.parse(path, use_cache=False)
+    from batch_rename import BatchProcessor
+    processor = BatchProcessor()
+    return processor, processor.process_file
+
+
+def run_target(target: str, truths: List[Truth], corpus: Path, workdir: Path) -> dict:
+    """Process the corpus once with target and return its metrics"""
+    processor, process = _make_processor(target, workdir)
+    if not processor.ocr_ok:
+        raise RuntimeError("Tesseract is not available")
+    timer = StageTimer(processor)
+
+    total_ms, hits, docs_ok, errors = [], defaultdict(int), 0, 0
+    by_source: Dict[str, List[bool]] = defaultdict(list)
+    start = time.perf_counter()
+    for truth in truths:
+        t0 = time.perf_counter()
+        result = process(corpus / truth.filename)
+        total_ms.append((time.perf_counter() - t0) * 1000)
+        if result.status == "error":
+            errors += 1
+        matches = score(truth, result)
+        for field, ok in matches.items():
+            hits[field] += ok
+        docs_ok += all(matches.values())
+        by_source[truth.internal_source].append(matches["internal_number"])
+    elapsed = time.perf_counter() - start
+
+    n = len(truths)
+    return {
+        "documents": n,
+        "errors": errors,
+        "seconds": round(elapsed, 2),
+        "docs_per_sec": round(n / elapsed, 3) if elapsed else None,
+        "latency_ms": _percentiles(total_ms),
+        "stages_ms": {name: _percentiles(timer.samples[name]) for name in STAGES if timer.samples[name]},
+        "accuracy": {
+            "fields": {f: round(hits[f] / n, 3) for f in FIELDS},
+            "internal_number_by_source": {s: round(sum(v) / len(v), 3) for s, v in sorted(by_source.items())},
+            "documents": round(docs_ok / n, 3),
+        },
+    }
+
+
+def compare(report: dict, baseline: dict, max_regression: float) -> List[str]:
+    """Throughput / accuracy regressions against a previous report"""
+    failures = []
+    for target, current in report["targets"].items():
+        old = baseline.get("targets", {}).get(target)
+        if not old:
+            continue
+        if old.get("docs_per_sec") and current["docs_per_sec"] < old["docs_per_sec"] * (1 - max_regression):
+            failures.append(f"{target}: {current['docs_per_sec']} docs/s < baseline {old['docs_per_sec']}")
+        old_acc, acc = old["accuracy"]["documents"], current["accuracy"]["documents"]
+        if acc < old_acc - max_regression * old_acc:
+            failures.append(f"{target}: document accuracy {acc} < baseline {old_acc}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MAE-IDP end-to-end pipeline benchmark")
+    parser.add_argument("--corpus", default=str(ROOT_DIR / "benchmarks" / "corpus"),
+                        help="Corpus folder (generated if it has no ground truth)")
+    parser.add_argument("--count", type=int, default=40, help="Documents to generate")
+    parser.add_argument("--seed", type=int, default=42, help="Corpus seed")
+    parser.add_argument("--target", choices=TARGETS, action="append",
+                        help="Only this entry point (repeatable; default: all)")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="Previous JSON report to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="Allowed relative drop in docs/s and document accuracy (default: 0.2)")
+    args = parser.parse_args()
+
+    corpus = Path(args.corpus)
+    if not (corpus / GROUND_TRUTH_FILE).exists():
+        print(f"Generating {args.count} documents in {corpus} ...", file=sys.stderr)
+        generate_corpus(corpus, args.count, args.seed)
+    truths = load_ground_truth(corpus)
+
+    report = {
+        "benchmark": "pipeline",
+        "timestamp": datetime.now().isoformat(),
+        "python": sys.version.split()[0],
+        "corpus": {"path": str(corpus), "documents": len(truths)},
+        "targets": {},
+    }
+    with tempfile.TemporaryDirectory() as workdir:
+        for target in args.target or TARGETS:
+            try:
+                report["targets"][target] = run_target(target, truths, corpus, Path(workdir))
+            except RuntimeError as e:
+                print(f"ERROR: {target}: {e}", file=sys.stderr)
+                sys.exit(2)
+    report["peak_rss_mb"] = peak_rss_mb()
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        failures = compare(report, baseline, args.max_regression)
+        for failure in failures:
+            print(f"FAIL: {failure}", file=sys.stderr)
+        sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+MAE-IDP Startup Benchmark
+Measures cold import time of the web app (app/mae.py) in fresh interpreters,
+the deferred warm-up time, and checks that heavy modules stay lazy.
+
+Usage:
+  python benchmarks/bench_startup.py
+  python benchmarks/bench_startup.py --runs 10 --output startup.json --max-import-ms 1500
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent.parent
+APP_DIR = ROOT_DIR / "app"
+
+# Must not be imported before the port is bound
+HEAVY_MODULES = ["cv2", "numpy", "pandas", "pyzbar", "pdf2image", "pytesseract", "PIL"]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import mae
+import_ms = (time.perf_counter() - start) * 1000
+heavy = [m for m in {heavy!r} if m in sys.modules]
+start = time.perf_counter()
+mae.parser.warm_up()
+warmup_ms = (time.perf_counter() - start) * 1000
+print(json.dumps({{"import_ms": import_ms, "warmup_ms": warmup_ms, "heavy_modules": heavy}}))
+"""
+
+
+def run_once() -> dict:
+    """Import mae in a fresh interpreter and return its timings"""
+    proc = subprocess.run(
+        [sys.executable, "-c", PROBE.format(heavy=HEAVY_MODULES)],
+        cwd=APP_DIR, capture_output=True, text=True, check=True
+    )
+    # Last stdout line is the JSON payload (logging goes to stdout as well)
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def _summary(values: list) -> dict:
+    return {
+        "median": round(statistics.median(values), 1),
+        "min": round(min(values), 1),
+        "max": round(max(values), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MAE-IDP cold start benchmark")
+    parser.add_argument("--runs", type=int, default=5, help="Number of fresh interpreters")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--max-import-ms", type=float,
+                        help="Fail if median import time exceeds this value")
+    args = parser.parse_args()
+
+    samples = [run_once() for _ in range(args.runs)]
+    import_ms = [s["import_ms"] for s in samples]
+    warmup_ms = [s["warmup_ms"] for s in samples]
+    heavy = sorted({m for s in samples for m in s["heavy_modules"]})
+
+    report = {
+        "benchmark": "startup",
+        "timestamp": datetime.now().isoformat(),
+        "python": sys.version.split()[0],
+        "runs": args.runs,
+        "import_ms": _summary(import_ms),
+        "warmup_ms": _summary(warmup_ms),
+        "heavy_modules_at_import": heavy,
+    }
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    failed = False
+    if heavy:
+        print(f"FAIL: heavy modules imported at startup: {', '.join(heavy)}", file=sys.stderr)
+        failed = True
+    if args.max_import_ms and report["import_ms"]["median"] > args.max_import_ms:
+        print(f"FAIL: median import {report['import_ms']['median']:.0f} ms > {args.max_import_ms:.0f} ms",
+              file=sys.stderr)
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+"""
+MAE-IDP Synthetic Invoice Corpus
+Renders invoices with known ground truth (vendor, invoice number, VAT ID,
+internal number as SN<...> QR code or handwritten-style corner digits, EPC
+payment QR code on some pages) with noise, skew and varying DPI, saved as PDF,
+PNG, JPEG and TIFF.
+
+Usage:
+  python benchmarks/corpus.py --count 40 --output benchmarks/corpus
+"""
+
+import argparse
+import json
+import random
+import sys
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import List, Tuple
+
+ROOT_DIR = Path(__file__).parent.parent
+APP_DIR = ROOT_DIR / "app"
+if str(APP_DIR) not in sys.path:
+    sys.path.insert(0, str(APP_DIR))
+
+from core import KNOWN_VENDORS, OCRLine, OCRText  # noqa: E402
+
+GROUND_TRUTH_FILE = "ground_truth.jsonl"
+FORMATS = ("pdf", "png", "jpg", "tif")
+DPIS = (150, 200, 300)
+A4_INCHES = (8.27, 11.69)
+PAGE_300DPI = (int(A4_INCHES[0] * 300), int(A4_INCHES[1] * 300))
+CHAR_WIDTH = 0.55  # Mean glyph width / font size, for text boxes without rendering
+
+FONT_NAMES = ["DejaVuSans.ttf", "Arial.ttf", "arial.ttf", "LiberationSans-Regular.ttf"]
+
+BUYER_LINES = ["Sicherheit Nord GmbH", "Einkauf / Kreditoren", "Hafenstraße 12", "20457 Hamburg"]
+ITEMS = ["Kabelbinder 200mm (100 Stk.)", "USB-C Ladegerät 65W", "Druckerpapier A4 80g", "Schrauben M4x12",
+         "Netzwerkkabel Cat6 5m", "Toner schwarz", "Versandkosten", "Akku-Schrauber 18V", "Ordner breit"]
+# Shipping line items name a carrier that is itself a known vendor
+CARRIERS = ["DHL", "UPS", "FedEx"]
+
+# Typical Tesseract confusions on noisy scans
+OCR_CONFUSIONS = {"0": "O", "O": "0", "1": "l", "l": "1", "5": "S", "8": "B", "ü": "u", "ß": "B", ":": ";"}
+
+
+@dataclass
+class Truth:
+    """Ground truth of one generated document"""
+    filename: str
+    vendor: str
+    invoice_number: str
+    vat_id: str
+    internal_number: str
+    internal_source: str  # "qr" or "corner"
+    dpi: int
+    skew: float
+    noise: float
+    format: str
+    payment_qr: bool = False  # EPC069-12 GiroCode with vendor and invoice number
+
+
+def _font(size: int):
+    from PIL import ImageFont
+    for name in FONT_NAMES:
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    return ImageFont.load_default(size=size)
+
+
+def _vendor_display(vendor: str, rng: random.Random) -> str:
+    """Letterhead text that the vendor patterns in core.KNOWN_VENDORS match"""
+    patterns = KNOWN_VENDORS[vendor]
+    name = vendor if any(p in vendor.lower() for p in patterns) else patterns[0].title()
+    return f"{name} {rng.choice(['GmbH', 'AG', 'SE', 'GmbH & Co. KG', ''])}".strip()
+
+
+def _vat_id(rng: random.Random) -> str:
+    kind = rng.choice(["DE", "DE", "AT", "NL"])
+    if kind == "DE":
+        return "DE" + "".join(rng.choice("0123456789") for _ in range(9))
+    if kind == "AT":
+        return "ATU" + "".join(rng.choice("0123456789") for _ in range(8))
+    return "NL" + "".join(rng.choice("0123456789") for _ in range(9)) + "B0" + rng.choice("123456789")
+
+
+def _invoice_number(rng: random.Random) -> str:
+    style = rng.randrange(3)
+    if style == 0:
+        return f"RE-{rng.randint(2020, 2026)}-{rng.randint(10000, 99999)}"
+    if style == 1:
+        return str(rng.randint(1000000, 99999999))
+    return f"INV{rng.randint(100000, 999999)}"
+
+
+def epc_payload(truth: Truth, rng: random.Random) -> str:
+    """EPC069-12 GiroCode text: beneficiary, IBAN, amount and the invoice number as remittance"""
+    remittance = rng.choice([f"Rechnung {truth.invoice_number}", truth.invoice_number,
+                             f"Rechnungsnr. {truth.invoice_number} Kd-Nr. {rng.randint(100000, 999999)}"])
+    iban = f"DE{rng.randint(10**19, 10**20 - 1)}"
+    return "\n".join(["BCD", "002", "1", "SCT", "", _vendor_display(truth.vendor, rng), iban,
+                      f"EUR{rng.uniform(10, 5000):.2f}", "", "", remittance])
+
+
+def _paste_qr(img, text: str, origin, scale: float):
+    import cv2
+    qr = cv2.QRCodeEncoder.create().encode(text)
+    module = max(3, int(8 * scale))
+    qr = cv2.resize(qr, None, fx=module, fy=module, interpolation=cv2.INTER_NEAREST)
+    x, y = origin
+    img[y:y + qr.shape[0], x:x + qr.shape[1]] = qr
+
+
+def _draw_handwritten(img, text: str, origin, scale: float, rng: random.Random):
+    """Ink-pen style digits: Hershey script font, per-digit jitter and slant"""
+    import cv2
+    import numpy as np
+
+    x, y = origin
+    for ch in text:
+        size = int(60 * scale)
+        glyph = np.full((size * 2, size * 2), 255, np.uint8)
+        cv2.putText(glyph, ch, (size // 2, int(size * 1.4)), cv2.FONT_HERSHEY_SCRIPT_SIMPLEX,
+                    1.6 * scale * rng.uniform(0.9, 1.15), 0, max(2, int(4 * scale)), cv2.LINE_AA)
+        m = cv2.getRotationMatrix2D((size, size), rng.uniform(-12, 12), 1.0)
+        glyph = cv2.warpAffine(glyph, m, glyph.shape[::-1], borderValue=255)
+        gy = y + rng.randint(-int(6 * scale), int(6 * scale))
+        region = img[gy:gy + glyph.shape[0], x:x + glyph.shape[1]]
+        if region.shape == glyph.shape:
+            np.minimum(region, glyph, out=region)
+        x += int(size * rng.uniform(0.75, 0.9))
+
+
+def layout(truth: Truth, rng: random.Random) -> List[Tuple[int, int, str, int]]:
+    """
+    Text blocks of the page as (x, y, text, font size) at 300 DPI in reading order.
+
+    The letterhead is top left or (about every third page) right-aligned at the
+    top right, which OCR reads after the buyer address.
+    """
+    margin = 180
+    letterhead = [
+        (_vendor_display(truth.vendor, rng), 72),
+        (f"{rng.choice(['Industriestr.', 'Hauptstraße', 'Am Markt'])} {rng.randint(1, 99)}, "
+         f"{rng.randint(10000, 99999)} {rng.choice(['München', 'Berlin', 'Köln', 'Wien'])}", 30),
+    ]
+    buyer = [(margin, 520 + i * 45, line, 34) for i, line in enumerate(BUYER_LINES)]
+    if rng.random() < 0.3:
+        right = PAGE_300DPI[0] - margin
+        blocks = buyer + [(max(margin, right - int(len(text) * size * CHAR_WIDTH)), 150 + i * 100, text, size)
+                          for i, (text, size) in enumerate(letterhead)]
+    else:
+        blocks = [(margin, 150 + i * 100, text, size) for i, (text, size) in enumerate(letterhead)] + buyer
+
+    label = rng.choice(["Rechnungsnummer:", "Rechnungs-Nr.:", "Invoice No:"])
+    blocks += [
+        (margin, 820, "Rechnung", 64),
+        (margin, 930, f"{label} {truth.invoice_number}", 36),
+        (margin, 980, f"Datum: {rng.randint(1, 28):02d}.{rng.randint(1, 12):02d}.{rng.randint(2022, 2026)}", 36),
+        (margin, 1030, f"Kunden-Nr.: {rng.randint(100000, 999999)}", 36),
+        (margin, 1180, "Pos.   Artikel                                        Menge      Preis", 32),
+    ]
+
+    items = [rng.choice(ITEMS) for _ in range(rng.randint(3, 8))]
+    carriers = [c for c in CARRIERS if c != truth.vendor]
+    if rng.random() < 0.4:
+        items.append(f"Versand {rng.choice(carriers)} {rng.choice(['Paket', 'Express', 'Standard'])}")
+    y, total = 1180, 0.0
+    for pos, item in enumerate(items):
+        qty, price = rng.randint(1, 20), rng.uniform(1, 300)
+        total += qty * price
+        y += 60
+        blocks.append((margin, y, f"{pos + 1:>3}    {item:<44} {qty:>5}   {price:>9.2f} EUR", 32))
+    y += 120
+    blocks += [
+        (1500, y, f"Summe netto: {total:,.2f} EUR", 36),
+        (1500, y + 55, f"MwSt. 19%:   {total * 0.19:,.2f} EUR", 36),
+    ]
+    # VAT on its own line or shared with the register court as in many real footers; footer order varies
+    footer = [
+        f"USt-IdNr.: {truth.vat_id}" + rng.choice(
+            ["", f"   Amtsgericht {rng.choice(['München', 'Berlin'])} HRB {rng.randint(10000, 99999)}"]),
+        f"IBAN DE{rng.randint(10**19, 10**20 - 1)}   BIC {rng.choice(['COBADEFFXXX', 'DEUTDEDBXXX'])}",
+    ]
+    rng.shuffle(footer)
+    blocks += [(margin, 3250 + i * 50, line, 28) for i, line in enumerate(footer)]
+    return blocks
+
+
+def render_invoice(truth: Truth, rng: random.Random):
+    """Grayscale page (ndarray) for the ground truth"""
+    import cv2
+    import numpy as np
+    from PIL import Image, ImageDraw
+
+    dpi = truth.dpi
+    w, h = int(A4_INCHES[0] * dpi), int(A4_INCHES[1] * dpi)
+    s = dpi / 300  # Layout is designed at 300 DPI
+    page = Image.new("L", (w, h), 255)
+    draw = ImageDraw.Draw(page)
+
+    for x, y, value, size in layout(truth, rng):
+        draw.text((int(x * s), int(y * s)), value, font=_font(max(8, int(size * s))), fill=0)
+    draw.line([(int(180 * s), int(1230 * s)), (w - int(180 * s), int(1230 * s))], fill=0, width=max(1, int(3 * s)))
+
+    img = np.array(page)
+
+    # Internal number: printed SN<...> QR label or handwritten digits in the top-right corner
+    if truth.internal_source == "qr":
+        _paste_qr(img, f"SN<{truth.internal_number.zfill(7)}>", (int(1950 * s), int(300 * s)), s)
+    else:
+        _draw_handwritten(img, truth.internal_number, (int(1750 * s), int(420 * s)), s * rng.uniform(0.9, 1.3), rng)
+    # Payment code above the footer, next to the totals
+    if truth.payment_qr:
+        _paste_qr(img, epc_payload(truth, rng), (int(180 * s), int(2650 * s)), s * 0.6)
+
+    if truth.skew:
+        m = cv2.getRotationMatrix2D((w / 2, h / 2), truth.skew, 1.0)
+        img = cv2.warpAffine(img, m, (w, h), borderValue=255)
+    if truth.noise:
+        noise = np.random.default_rng(rng.randrange(2**32)).normal(0, truth.noise, img.shape)
+        img = np.clip(img.astype(np.float32) + noise, 0, 255).astype(np.uint8)
+    return img
+
+
+def ocr_text(truth: Truth, rng: random.Random, error_rate: float = 0.0) -> OCRText:
+    """
+    Page text as Tesseract would return it, without rendering or OCR:
+    one line per text block with its box at 300 DPI, character confusions
+    with probability error_rate.
+    """
+    lines = []
+    for x, y, value, size in layout(truth, rng):
+        if error_rate:
+            value = "".join(OCR_CONFUSIONS[c] if c in OCR_CONFUSIONS and rng.random() < error_rate else c
+                            for c in value)
+        lines.append(OCRLine(value, x, y, int(len(value) * size * CHAR_WIDTH), size))
+    return OCRText("\n".join(line.text for line in lines) + "\n", lines, *PAGE_300DPI)
+
+
+def save_page(img, path: Path, dpi: int):
+    from PIL import Image
+    page = Image.fromarray(img)
+    if path.suffix == ".pdf":
+        page.save(path, "PDF", resolution=dpi)
+    elif path.suffix == ".jpg":
+        page.save(path, "JPEG", quality=85, dpi=(dpi, dpi))
+    elif path.suffix == ".tif":
+        page.save(path, "TIFF", compression="tiff_lzw", dpi=(dpi, dpi))
+    else:
+        page.save(path, dpi=(dpi, dpi))
+
+
+def random_truth(rng: random.Random, index: int) -> Truth:
+    """Ground truth for document number index"""
+    fmt = FORMATS[index % len(FORMATS)]
+    return Truth(
+        filename=f"invoice_{index:04d}.{fmt}",
+        vendor=rng.choice(sorted(KNOWN_VENDORS)),
+        invoice_number=_invoice_number(rng),
+        vat_id=_vat_id(rng),
+        internal_number=str(rng.randint(100000, 999999)),
+        internal_source=rng.choice(["qr", "qr", "corner"]),
+        dpi=rng.choice(DPIS),
+        skew=round(rng.uniform(-1.5, 1.5), 2) if rng.random() < 0.6 else 0.0,
+        noise=round(rng.uniform(4, 18), 1) if rng.random() < 0.7 else 0.0,
+        format=fmt,
+        payment_qr=rng.random() < 0.3,
+    )
+
+
+def generate_corpus(output: Path, count: int = 40, seed: int = 42) -> List[Truth]:
+    """Render count documents into output with ground_truth.jsonl; deterministic for a seed"""
+    rng = random.Random(seed)
+    output.mkdir(parents=True, exist_ok=True)
+    truths = []
+    for i in range(count):
+        truth = random_truth(rng, i)
+        save_page(render_invoice(truth, rng), output / truth.filename, truth.dpi)
+        truths.append(truth)
+
+    with open(output / GROUND_TRUTH_FILE, "w", encoding="utf-8") as f:
+        for truth in truths:
+            f.write(json.dumps(asdict(truth), ensure_ascii=False) + "\n")
+    return truths
+
+
+def load_ground_truth(corpus: Path) -> List[Truth]:
+    with open(corpus / GROUND_TRUTH_FILE, encoding="utf-8") as f:
+        return [Truth(**json.loads(line)) for line in f if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MAE-IDP synthetic invoice corpus")
+    parser.add_argument("--count", type=int, default=40, help="Number of documents")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed (same seed = same corpus)")
+    parser.add_argument("--output", default=str(ROOT_DIR / "benchmarks" / "corpus"), help="Output folder")
+    args = parser.parse_args()
+
+    truths = generate_corpus(Path(args.output), args.count, args.seed)
+    print(f"{len(truths)} documents + {GROUND_TRUTH_FILE} in {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Unit tests for MAE static asset store
+These tests don't require external dependencies (Tesseract, Poppler)
+"""
+
+import gzip
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add app directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "app"))
+
+from assets import AssetStore, CACHE_VERSIONED, CACHE_REVALIDATE
+
+
+@pytest.fixture
+def store(tmp_path):
+    (tmp_path / "index.html").write_text("<html>" + "x" * 4096 + "</html>", encoding="utf-8")
+    (tmp_path / "tiny.txt").write_text("hi", encoding="utf-8")
+    return AssetStore(tmp_path)
+
+
+class TestAssetStore:
+    """Test AssetStore loading, compression and validators"""
+
+    def test_loaded_once(self, store):
+        """Should return the same in-memory asset on repeat requests"""
+        assert store.get("index.html") is store.get("index.html")
+
+    def test_gzip_variant(self, store):
+        """Should serve gzip when accepted and decompress to original"""
+        asset = store.get("index.html")
+        encoding, body = asset.select("gzip, deflate")
+        assert encoding == "gzip"
+        assert gzip.decompress(body) == asset.body
+
+    def test_identity_without_accept_encoding(self, store):
+        """Should serve uncompressed body when client accepts nothing"""
+        asset = store.get("index.html")
+        assert asset.select("") == (None, asset.body)
+
+    def test_tiny_files_not_compressed(self, store):
+        """Should skip compression for tiny bodies"""
+        assert store.get("tiny.txt").encoded == {}
+
+    def test_etag_matches(self, store):
+        """Should match own ETags, including weak and gzip variants"""
+        asset = store.get("index.html")
+        assert asset.matches(asset.etag)
+        assert asset.matches("W/" + asset.etag_for("gzip"))
+        assert not asset.matches('"other"')
+        assert not asset.matches(None)
+
+    def test_cache_headers(self, store):
+        """Versioned assets should be immutable, others revalidated"""
+        asset = store.get("index.html")
+        assert store.headers(asset, None, True)["Cache-Control"] == CACHE_VERSIONED
+        assert store.headers(asset, "gzip", False)["Cache-Control"] == CACHE_REVALIDATE
+        assert store.headers(asset, "gzip", False)["Content-Encoding"] == "gzip"
+
+    def test_missing_and_outside_root(self, store):
+        """Should not serve missing files or escape the root directory"""
+        assert store.get("missing.css") is None
+        assert store.get("../secret.txt") is None
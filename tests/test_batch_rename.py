@@ -0,0 +1,226 @@
+"""
+Unit tests for MAE batch rename (parallel processing and placement)
+These tests don't require external dependencies (Tesseract, Poppler):
+OCR is replaced by a processor that derives results from the file name.
+"""
+
+import os
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+# Add app directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "app"))
+
+from batch_rename import BatchProcessor, DocInfo, RunManifest
+from cache import OCRCache
+from core import corner_stats
+
+
+class FakeProcessor(BatchProcessor):
+    """Derives vendor from the file name; slower for early files to shuffle completion order"""
+
+    def __init__(self):
+        super().__init__(probe=False)
+        self.ocr_ok = True
+        self.failing = set()
+
+    def load_image(self, path: Path):
+        return path.stem
+
+    def process_image(self, path: Path, img, file_hash: str = None) -> DocInfo:
+        if path.name in self.failing:
+            return DocInfo(original_path=str(path), status="error", error="OCR failed", file_hash=file_hash)
+        index = int(img.split("_")[1])
+        time.sleep(0.02 * (5 - index % 5))
+        vendor = img.split("_")[0]
+        return DocInfo(original_path=str(path), vendor=vendor, invoice_number="1",
+                       new_filename=f"{vendor}_1_0{path.suffix}", status="success", confidence=100,
+                       file_hash=file_hash)
+
+
+class CornerProcessor(FakeProcessor):
+    """Counts every document as a blank corner skipped by the ink gate"""
+
+    def process_image(self, path: Path, img, file_hash: str = None) -> DocInfo:
+        corner_stats.record(1000, 0)
+        return super().process_image(path, img, file_hash)
+
+
+@pytest.fixture
+def input_dir(tmp_path):
+    d = tmp_path / "in"
+    d.mkdir()
+    for i in range(12):
+        (d / f"{'Acme' if i % 2 else 'Bosch'}_{i}.pdf").write_bytes(b"%PDF")
+    return d
+
+
+class TestParallelBatch:
+    """Test process_folder with --jobs"""
+
+    def _run(self, input_dir: Path, output_dir: Path, jobs: int):
+        progress = []
+        results = FakeProcessor().process_folder(
+            input_dir, output_dir, jobs=jobs,
+            progress_callback=lambda current, total, name: progress.append((current, total))
+        )
+        return results, progress
+
+    def test_results_match_sequential(self, input_dir, tmp_path):
+        """Parallel results and collision-suffixed names should equal the sequential run"""
+        seq, _ = self._run(input_dir, tmp_path / "seq", jobs=1)
+        par, progress = self._run(input_dir, tmp_path / "par", jobs=3)
+        assert [r.original_path for r in par] == [r.original_path for r in seq]
+        assert [r.new_filename for r in par] == [r.new_filename for r in seq]
+        assert [current for current, _ in progress] == list(range(1, 13))
+        assert progress[-1][1] == 12  # Total known once the walk has finished
+
+    def test_files_copied_once(self, input_dir, tmp_path):
+        out = tmp_path / "out"
+        self._run(input_dir, out, jobs=4)
+        assert len(list((out / "Acme").iterdir())) == 6
+        assert len(list((out / "Bosch").iterdir())) == 6
+
+
+    def test_worker_counters_summed(self, input_dir, tmp_path):
+        """Corner / zonal statistics of --jobs runs come from the worker processes"""
+        processor = CornerProcessor()
+        processor.process_folder(input_dir, tmp_path / "out", jobs=3)
+        assert processor.ocr_counters()["corner"]["blank_skipped"] == 12
+
+
+class TestIncremental:
+    """Test --incremental manifest and the shared OCR cache"""
+
+    def test_second_run_skips_unchanged(self, input_dir, tmp_path):
+        out = tmp_path / "out"
+        processor = FakeProcessor()
+        assert len(processor.process_folder(input_dir, out, incremental=True)) == 12
+        assert (out / RunManifest.FILENAME).exists()
+
+        (input_dir / "Acme_13.pdf").write_bytes(b"%PDF new")
+        results = processor.process_folder(input_dir, out, incremental=True)
+        assert [Path(r.original_path).name for r in results] == ["Acme_13.pdf"]
+        assert processor.skipped == 12
+
+    def test_renamed_file_skipped_by_hash(self, input_dir, tmp_path):
+        out = tmp_path / "out"
+        processor = FakeProcessor()
+        processor.process_folder(input_dir, out, incremental=True)
+        (input_dir / "Acme_1.pdf").rename(input_dir / "Acme_21.pdf")
+        assert processor.process_folder(input_dir, out, incremental=True) == []
+
+    def test_failed_file_retried(self, input_dir, tmp_path):
+        """An error result is not skipped by size/mtime or hash on the next run"""
+        out = tmp_path / "out"
+        (input_dir / "Acme_13.pdf").write_bytes(b"%PDF broken")
+        (input_dir / "Acme_15.pdf").write_bytes(b"%PDF broken")  # Copy: same hash
+        processor = FakeProcessor()
+        processor.failing = {"Acme_13.pdf", "Acme_15.pdf"}
+        results = processor.process_folder(input_dir, out, incremental=True)
+        assert sorted(r.status for r in results if r.status == "error") == ["error", "error"]
+
+        processor.failing = set()
+        results = processor.process_folder(input_dir, out, incremental=True)
+        assert sorted(Path(r.original_path).name for r in results) == ["Acme_13.pdf", "Acme_15.pdf"]
+        assert all(r.status == "success" for r in results)
+
+    def test_cli_entries_survive_web_save(self, tmp_path):
+        """The web app's set(save=True) merges with entries the CLI flushed after its warm-up"""
+        web = OCRCache(cache_dir=tmp_path / "cache")  # Loaded at warm-up
+        cli = OCRCache(cache_dir=tmp_path / "cache")
+        cli_doc, web_doc = tmp_path / "cli.pdf", tmp_path / "web.pdf"
+        cli_doc.write_bytes(b"%PDF cli")
+        web_doc.write_bytes(b"%PDF web")
+        cli.set(cli_doc, {"vendor": "Acme"}, save=False)
+        cli.flush()
+        web.set(web_doc, {"vendor": "Bosch"}, save=True)
+
+        fresh = OCRCache(cache_dir=tmp_path / "cache")
+        assert fresh.get(cli_doc)["vendor"] == "Acme"
+        assert fresh.get(web_doc)["vendor"] == "Bosch"
+        assert web.get(cli_doc)["vendor"] == "Acme"  # Shared both ways
+
+        web.invalidate(web_doc)
+        assert OCRCache(cache_dir=tmp_path / "cache").get(web_doc) is None
+
+    def test_uses_web_cache(self, tmp_path):
+        """A document parsed in the web app should not need OCR in the CLI"""
+        doc = tmp_path / "scan.pdf"
+        doc.write_bytes(b"%PDF cached")
+        cache = OCRCache(cache_dir=tmp_path / "cache")
+        cache.set(doc, {"filename": "scan.pdf", "status": "success", "vendor": "Acme GmbH",
+                        "invoice_number": "RE-1", "internal_number": "123456", "vat_id": None,
+                        "confidence": 85, "error": None, "timestamp": None})
+
+        processor = BatchProcessor(probe=False)  # No OCR available
+        processor.cache = cache
+        info = processor.process_file(doc, cache.compute_hash(doc))
+        assert info.cached
+        assert info.status == "success"
+        assert info.new_filename == "AcmeGmbH_RE-1_123456.pdf"
+
+
+class TestPipeline:
+    """Test the streaming walk -> load -> OCR -> placement pipeline"""
+
+    def test_walk_order_matches_sorted_rglob(self, tmp_path):
+        from batch_rename import iter_input_files
+        for rel in ["b.pdf", "a/z.png", "a/b/c.tif", "c.txt", "a.jpg", "aa/x.pdf"]:
+            f = tmp_path / rel
+            f.parent.mkdir(parents=True, exist_ok=True)
+            f.write_bytes(b"x")
+        expected = sorted(f for f in tmp_path.rglob("*") if f.suffix in {".pdf", ".png", ".tif", ".jpg"})
+        assert list(iter_input_files(tmp_path)) == expected
+
+    @pytest.mark.skipif(not hasattr(os, "symlink") or sys.platform == "win32", reason="needs symlinks")
+    def test_walk_does_not_follow_directory_symlinks(self, tmp_path):
+        """A symlink to a parent directory must not yield the same files again"""
+        from batch_rename import iter_input_files
+        (tmp_path / "a").mkdir()
+        (tmp_path / "a" / "x.pdf").write_bytes(b"%PDF")
+        (tmp_path / "a" / "loop").symlink_to("..")
+        assert list(iter_input_files(tmp_path)) == [tmp_path / "a" / "x.pdf"]
+
+    def test_results_stream_before_walk_ends(self, input_dir, tmp_path):
+        """First result should be available without waiting for the whole run"""
+        processor = FakeProcessor()
+        it = processor.iter_folder(input_dir, tmp_path / "out")
+        first = next(it)
+        assert Path(first.original_path).name == "Acme_1.pdf"
+        it.close()  # Early stop shuts the stages down
+        assert len(list((tmp_path / "out").rglob("*.pdf"))) == 1
+
+
+class TestFileList:
+    """Test stdin file lists (newline / NUL separated)"""
+
+    def test_newline_and_crlf(self):
+        import io
+        from batch_rename import iter_file_list
+        stream = io.BufferedReader(io.BytesIO(b"a.pdf\r\nscans/b c.png\n\nlast.tif"))
+        assert list(iter_file_list(stream)) == [Path("a.pdf"), Path("scans/b c.png"), Path("last.tif")]
+
+    def test_null_separated(self):
+        import io
+        from batch_rename import iter_file_list
+        stream = io.BufferedReader(io.BytesIO(b"with\nnewline.pdf\0b.pdf\0"))
+        assert list(iter_file_list(stream, null_separated=True)) == [Path("with\nnewline.pdf"), Path("b.pdf")]
+
+    def test_null_separated_last_name_keeps_trailing_newline(self):
+        import io
+        from batch_rename import iter_file_list
+        stream = io.BufferedReader(io.BytesIO(b"a.pdf\0ends with newline\n"))
+        assert list(iter_file_list(stream, null_separated=True)) == [Path("a.pdf"), Path("ends with newline\n")]
+
+    def test_iter_folder_from_list(self, input_dir, tmp_path):
+        """Explicit file list replaces the walk; unsupported and missing entries are skipped"""
+        (tmp_path / "notes.txt").write_text("x")
+        files = [input_dir / "Bosch_4.pdf", tmp_path / "notes.txt", tmp_path / "missing.pdf",
+                 input_dir / "Acme_1.pdf"]
+        results = list(FakeProcessor().iter_folder(input_dir, tmp_path / "out", files=iter(files)))
+        assert [Path(r.original_path).name for r in results] == ["Bosch_4.pdf", "Acme_1.pdf"]
+        assert Path(results[0].dest).exists()
@@ -14,6 +14,12 @@ from core import (
     ConfidenceScore,
     KNOWN_VENDORS,
     BaseOCRProcessor,
+    OCRLine,
+    OCRText,
+    choose_reduction,
+    corner_stats,
+    ink_bbox,
+    ocr_text_from_data,
 )
 
 
@@ -96,6 +102,91 @@ class TestExtractVendor:
         assert result is None
 
 
+def _page(*lines, width=2480, height=3508):
+    """OCRText from (text, left, top, height) tuples in reading order"""
+    boxes = [OCRLine(text, left, top, len(text) * 18, size) for text, left, top, size in lines]
+    return OCRText("\n".join(text for text, *_ in lines) + "\n", boxes, width, height)
+
+
+class TestExtractVendorLayout:
+    """Test vendor scoring by line position and size (OCRText from run_ocr)"""
+
+    @pytest.fixture
+    def processor(self):
+        proc = object.__new__(BaseOCRProcessor)
+        proc.ocr_ok = False
+        proc.qr_ok = False
+        return proc
+
+    def test_top_right_letterhead_beats_earlier_lines(self, processor):
+        """Letterhead read after the buyer block still wins over a carrier in the body"""
+        text = _page(("Sicherheit Nord GmbH", 180, 520, 34),
+                     ("Hafenstraße 12", 180, 565, 34),
+                     ("Conrad Electronic SE", 1700, 150, 72),
+                     ("1  Versand DHL Paket  1  5,90 EUR", 180, 1240, 32),
+                     ("IBAN DE12 3456", 180, 3250, 28))
+        assert processor.extract_vendor(text) == "Conrad"
+        # Same text without boxes: the first known vendor in the list wins
+        assert processor.extract_vendor(str(text)) == "DHL"
+
+    def test_footer_beats_body(self, processor):
+        text = _page(("Rechnung", 180, 820, 64),
+                     ("Versand mit UPS Standard", 180, 1300, 32),
+                     ("Reichelt elektronik GmbH, Sande", 180, 3300, 28))
+        assert processor.extract_vendor(text) == "Reichelt"
+
+    def test_known_vendor_beats_email(self, processor):
+        text = _page(("info@example-shop.de", 180, 150, 30),
+                     ("Würth GmbH", 180, 3300, 28))
+        assert processor.extract_vendor(text) == "Würth"
+
+    def test_no_evidence(self, processor):
+        text = _page(("Rechnung", 180, 820, 64), ("Datum: 01.02.2026", 180, 980, 36))
+        assert processor.extract_vendor(text) is None
+
+    def test_larger_font_breaks_tie(self, processor):
+        text = _page(("Vodafone Shop", 1000, 400, 30), ("IKEA", 1000, 450, 90),
+                     ("Datum: 01.02.2026", 180, 980, 30), ("Kunden-Nr.: 123456", 180, 1030, 30))
+        assert processor.extract_vendor(text) == "IKEA"
+
+    def test_logo_corner_breaks_tie(self, processor):
+        text = _page(("Vodafone Shop", 1000, 300, 30), ("IKEA", 2200, 150, 30))
+        assert processor.extract_vendor(text) == "IKEA"
+
+
+class TestOcrTextFromData:
+    """Test grouping of Tesseract image_to_data words into lines"""
+
+    DATA = {
+        "text": ["Conrad", "Electronic", "", "Rechnung", "Nr.", "42"],
+        "page_num": [1, 1, 1, 1, 1, 1],
+        "block_num": [1, 1, 1, 2, 2, 2],
+        "par_num": [1, 1, 1, 1, 1, 1],
+        "line_num": [1, 1, 1, 1, 2, 2],
+        "left": [100, 300, 0, 100, 100, 180],
+        "top": [50, 55, 0, 400, 460, 462],
+        "width": [180, 250, 0, 200, 60, 40],
+        "height": [60, 55, 0, 40, 30, 28],
+    }
+
+    def test_lines_and_blocks(self):
+        text = ocr_text_from_data(self.DATA, 1000, 2000)
+        assert text == "Conrad Electronic\n\nRechnung\nNr. 42\n"
+        assert text.lines[0] == OCRLine("Conrad Electronic", 100, 50, 450, 60)
+        assert text.lines[2] == OCRLine("Nr. 42", 100, 460, 120, 30)
+        assert (text.page_width, text.page_height) == (1000, 2000)
+
+    def test_band_rows_mapped_to_page(self):
+        text = ocr_text_from_data(self.DATA, 1000, 1000, BaseOCRProcessor._band_to_page(1000))
+        assert text.lines[0].top == 50
+        # Rows below the top band (0.45 * 1000) continue in the bottom band (from 0.8 * 1000)
+        assert text.lines[2].top == 460 + 800 - 450
+
+    def test_empty_page(self):
+        text = ocr_text_from_data({k: [] for k in self.DATA}, 1000, 2000)
+        assert text == "" and text.lines == []
+
+
 class TestExtractInvoiceNumber:
     """Test extract_invoice_number function"""
 
@@ -235,3 +326,77 @@ class TestExtractInternalFromQr:
         qr_data = []
         result = processor.extract_internal_from_qr(qr_data)
         assert result is None
+
+
+class TestChooseReduction:
+    """Test choose_reduction decode factor selection"""
+
+    def test_a4_at_300_dpi_not_reduced(self):
+        """A4 page at 300 DPI is already at target resolution"""
+        assert choose_reduction(2480, 3508, 300) == 1
+
+    def test_a4_at_600_dpi_halved(self):
+        """600 DPI scan should decode at half resolution"""
+        assert choose_reduction(4960, 7016, 600) == 2
+
+    def test_phone_photo_ignores_72_dpi(self):
+        """48 MP photo with meaningless 72 DPI should be reduced by size"""
+        assert choose_reduction(8000, 6000, 72) == 2
+
+    def test_huge_scan_without_dpi(self):
+        """Very large image without DPI should use the largest safe factor"""
+        assert choose_reduction(30000, 20000) == 8
+
+    def test_dpi_limits_reduction(self):
+        """Should not reduce below target DPI even if the page is large"""
+        assert choose_reduction(14000, 10000, 400) == 1
+
+    def test_small_image_untouched(self):
+        """Small images should never be reduced"""
+        assert choose_reduction(800, 600) == 1
+
+
+class TestInkGate:
+    """Test the blank / ink check in front of the corner OCR"""
+
+    @pytest.fixture
+    def np(self):
+        pytest.importorskip("cv2")
+        return pytest.importorskip("numpy")
+
+    @staticmethod
+    def scan(np, shape=(1200, 900), seed=0):
+        """Gray paper with scanner noise and isolated dark specks"""
+        rng = np.random.default_rng(seed)
+        page = np.clip(235 + rng.normal(0, 18, shape), 0, 255).astype(np.uint8)
+        page[rng.random(shape) < 0.002] = 0
+        return page
+
+    def test_blank_scan_has_no_ink(self, np):
+        assert ink_bbox(self.scan(np)) is None
+
+    def test_bbox_around_handwriting(self, np):
+        page = self.scan(np)
+        for x in range(300, 560, 20):
+            page[400:480, x:x + 4] = 20  # Pen strokes, ~0.3 mm at 300 DPI
+        x0, y0, x1, y1 = ink_bbox(page)
+        assert x0 <= 300 < 556 <= x1 and y0 <= 400 < 480 <= y1
+        assert (x1 - x0) * (y1 - y0) < page.size / 10
+
+    def test_faint_one_pixel_stroke(self, np):
+        """Thin pencil digits on gray paper are ink, not blank"""
+        page = self.scan(np)
+        for x in range(300, 420, 30):
+            page[400:470, x] = 160  # 1 px wide, 75 gray levels below the paper
+        page[470, 300:390] = 160
+        x0, y0, x1, y1 = ink_bbox(page)
+        assert x0 <= 300 < 390 <= x1 and y0 <= 400 < 470 <= y1
+        assert (x1 - x0) * (y1 - y0) < page.size / 10
+
+    def test_blank_corner_skips_ocr(self, np, monkeypatch):
+        import core
+        monkeypatch.setattr(core, "_pytesseract", lambda: pytest.fail("Tesseract must not run"))
+        processor = object.__new__(BaseOCRProcessor)
+        before = corner_stats.stats()["blank_skipped"]
+        assert processor.extract_internal_from_corner(self.scan(np, (2400, 1700))) is None
+        assert corner_stats.stats()["blank_skipped"] == before + 1
@@ -0,0 +1,63 @@
+"""
+Regression gate for the OCR-free extraction replay (benchmarks/bench_extraction.py)
+Runs the synthetic text corpus through the extractors and enforces THRESHOLDS:
+a regex or vendor list change that slows extraction down or loses accuracy fails here.
+"""
+
+import sys
+from pathlib import Path
+
+# Add app and benchmarks directories to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "app"))
+sys.path.insert(0, str(Path(__file__).parent.parent / "benchmarks"))
+
+from bench_extraction import THRESHOLDS, TextRecord, check, load_records, replay, save_records, synthesize
+
+
+class TestReplayThresholds:
+    """Test accuracy and speed of the extractors on the synthetic corpus"""
+
+    def test_synthetic_corpus_within_thresholds(self):
+        result = replay(synthesize())
+        assert check(result) == [], result["mismatches"][:10]
+
+    def test_layout_finds_vendor_text_only_misses(self):
+        """Top-right letterheads and carrier line items need the line boxes"""
+        records = synthesize()
+        layout = replay(records, repeat=1)["accuracy"]["fields"]["vendor"]
+        text_only = replay(records, repeat=1, layout=False)["accuracy"]["fields"]["vendor"]
+        assert layout >= THRESHOLDS["accuracy"]["vendor"]
+        assert text_only < layout
+
+    def test_synthetic_corpus_is_deterministic(self):
+        assert [r.text for r in synthesize(20)] == [r.text for r in synthesize(20)]
+
+
+class TestReplayHarness:
+    """Test corpus files and the replay report"""
+
+    def test_records_roundtrip(self, tmp_path):
+        records = synthesize(5)
+        path = tmp_path / "texts.jsonl"
+        assert save_records(records, path) == 5
+        assert load_records(path) == records
+
+    def test_mismatch_and_worst_case_reported(self):
+        records = [
+            TextRecord(id="ok", text="Conrad Electronic\nRechnungsnummer: RE-12345\n",
+                       labels={"vendor": "Conrad", "invoice_number": "RE-12345", "vat_id": None}),
+            TextRecord(id="wrong", text="Rechnungsnummer: RE-99999\n" + "x " * 5000,
+                       labels={"vendor": None, "invoice_number": "RE-11111", "vat_id": None}),
+        ]
+        result = replay(records, repeat=1)
+        assert result["accuracy"]["fields"] == {"vendor": 1.0, "invoice_number": 0.5, "vat_id": 1.0}
+        assert result["mismatches"] == [{"id": "wrong", "field": "invoice_number",
+                                         "expected": "RE-11111", "got": "RE-99999"}]
+        assert result["worst"][0]["id"] == "wrong"
+
+    def test_check_reports_violations(self):
+        result = {"ns_per_doc": (THRESHOLDS["us_per_doc"] + 1) * 1000, "worst": [],
+                  "accuracy": {"fields": {"vendor": 0.5, "invoice_number": 1.0, "vat_id": 1.0}}}
+        failures = check(result)
+        assert len(failures) == 2
+        assert "vendor" in failures[1]
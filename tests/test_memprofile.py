@@ -0,0 +1,101 @@
+"""
+Unit tests for MAE memory profiling (memprofile.py)
+The OCR stages are replaced by methods with known allocations.
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add app directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "app"))
+
+from batch_rename import BatchProcessor
+from memprofile import MemoryProfiler
+
+MB = 1024 * 1024
+
+
+class AllocatingProcessor(BatchProcessor):
+    """Page raster = 2 MB, QR decoding needs 8 MB of scratch memory"""
+
+    def __init__(self):
+        super().__init__(probe=False)
+        self.ocr_ok = True
+
+    def load_image(self, path):
+        return bytearray(2 * MB)
+
+    def extract_qr_codes(self, img):
+        scratch = bytearray(8 * MB)
+        del scratch
+        return []
+
+    def extract_internal_from_corner(self, img):
+        return "123456"
+
+    def run_ocr(self, img, lang=None):
+        return "Conrad Electronic\nRechnungsnummer: RE-12345\n"
+
+
+@pytest.fixture
+def profiler():
+    profiler = MemoryProfiler(enabled=True)
+    yield profiler
+    profiler.stop()
+
+
+class TestMemoryProfiler:
+    """Test per-stage and per-document records"""
+
+    def test_disabled_is_noop(self):
+        processor = AllocatingProcessor()
+        MemoryProfiler(enabled=False).instrument(processor)
+        assert "load_image" not in vars(processor)
+
+    def test_stages_of_one_document(self, profiler, tmp_path):
+        processor = profiler.instrument(AllocatingProcessor())
+        info = processor.process_file(tmp_path / "a.pdf")
+        assert info.vendor == "Conrad"
+
+        [doc] = profiler.documents
+        assert doc["document"] == str(tmp_path / "a.pdf")
+        assert [s["stage"] for s in doc["stages"]] == ["load_image", "extract_qr_codes",
+                                                      "extract_internal_from_corner", "run_ocr"]
+        stages = {s["stage"]: s for s in doc["stages"]}
+        assert stages["load_image"]["retained_mb"] >= 1.9  # Raster is handed on
+        assert stages["extract_qr_codes"]["traced_peak_mb"] >= 7.9
+        assert stages["extract_qr_codes"]["retained_mb"] < 1  # Scratch freed
+        assert doc["peak_stage"] == "extract_qr_codes"
+        assert doc["top_allocations"]
+
+    def test_batch_pipeline_summary(self, profiler, tmp_path):
+        src = tmp_path / "in"
+        src.mkdir()
+        for i in range(4):
+            (src / f"doc_{i}.pdf").write_bytes(b"%PDF")
+        processor = profiler.instrument(AllocatingProcessor())
+        results = list(processor.iter_folder(src, tmp_path / "out"))
+        assert len(results) == 4
+
+        summary = profiler.summary()
+        assert summary["documents"] == 4
+        assert summary["stages"]["load_image"]["calls"] == 4
+        assert summary["stages"]["extract_qr_codes"]["traced_peak_mb"]["max"] >= 7.9
+        assert summary["heaviest_documents"][0]["peak_stage"] == "extract_qr_codes"
+
+    def test_records_bounded(self, tmp_path):
+        """Only the latest records are kept; the summary still covers every document"""
+        profiler = MemoryProfiler(enabled=True, max_documents=2)
+        try:
+            processor = profiler.instrument(AllocatingProcessor())
+            for i in range(5):
+                processor.process_file(tmp_path / f"doc_{i}.pdf")
+            assert [Path(d["document"]).name for d in profiler.documents] == ["doc_3.pdf", "doc_4.pdf"]
+            summary = profiler.summary()
+            assert summary["documents"] == 5
+            assert summary["stages"]["run_ocr"]["calls"] == 5
+            assert len(summary["heaviest_documents"]) == 5
+        finally:
+            profiler.stop()
@@ -0,0 +1,76 @@
+"""
+Unit tests for MAE OCR profiles (ocr_profiles.py) and profile-driven preprocessing
+"""
+
+import sys
+from dataclasses import replace
+from pathlib import Path
+
+import pytest
+
+# Add app directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "app"))
+
+from core import BaseOCRProcessor, choose_reduction
+from ocr_profiles import DEFAULT_PROFILE, OCRProfile, list_profiles, load_profile, save_profile
+
+
+class TestProfileStore:
+    """Test loading and saving named profiles"""
+
+    def test_default_is_builtin(self, tmp_path):
+        assert load_profile(path=tmp_path / "none.json") is DEFAULT_PROFILE
+        assert DEFAULT_PROFILE.tesseract_config() == ""
+
+    def test_save_and_load(self, tmp_path):
+        path = tmp_path / "profiles.json"
+        fast = OCRProfile(name="fast", dpi=200, blur=0, psm=6, text_roi="bands")
+        save_profile(fast, path)
+        save_profile(replace(fast, name="other", lang="deu"), path)
+        assert load_profile("fast", path) == fast
+        assert set(list_profiles(path)) == {"default", "fast", "other"}
+        assert load_profile("fast", path).tesseract_config() == "--psm 6"
+
+    def test_unknown_profile(self, tmp_path):
+        with pytest.raises(KeyError):
+            load_profile("missing", tmp_path / "profiles.json")
+
+    def test_default_not_overwritten(self, tmp_path):
+        with pytest.raises(ValueError):
+            save_profile(OCRProfile(dpi=150), tmp_path / "profiles.json")
+
+    def test_invalid_settings(self):
+        with pytest.raises(ValueError):
+            OCRProfile(binarization="sauvola")
+        with pytest.raises(ValueError):
+            OCRProfile(blur=4)
+
+
+class TestProfilePreprocessing:
+    """Test that preprocessing follows the processor profile"""
+
+    @pytest.fixture
+    def page(self):
+        np = pytest.importorskip("numpy")
+        pytest.importorskip("cv2")
+        img = np.full((400, 300), 200, np.uint8)
+        img[:, 150:] = 120  # Uneven lighting
+        img[50:60, 20:280] = 0
+        return img
+
+    def test_binarization(self, page):
+        processor = BaseOCRProcessor(probe=False)
+        assert set(processor.preprocess_for_ocr(page).flat) <= {0, 255}
+        processor.profile = OCRProfile(binarization="none", blur=0)
+        assert (processor.preprocess_for_ocr(page) == page).all()
+        processor.profile = OCRProfile(binarization="adaptive")
+        assert set(processor.preprocess_for_ocr(page).flat) <= {0, 255}
+
+    def test_text_bands(self, page):
+        bands = BaseOCRProcessor._text_bands(page)
+        assert bands.shape == (int(400 * 0.45) + 80, 300)
+        assert (bands[:180] == page[:180]).all()
+
+    def test_lower_dpi_target_decodes_smaller(self):
+        assert choose_reduction(4960, 7016, 600) == 2
+        assert choose_reduction(4960, 7016, 600, target_dpi=150) == 4
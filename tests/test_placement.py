@@ -0,0 +1,94 @@
+"""
+Unit tests for MAE file placement (move / hardlink / reflink / copy)
+These tests don't require external dependencies (Tesseract, Poppler)
+"""
+
+import errno
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add app directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "app"))
+
+import placement
+from placement import Placer
+
+
+@pytest.fixture
+def src(tmp_path):
+    f = tmp_path / "scan.pdf"
+    f.write_bytes(b"%PDF-1.4 invoice")
+    return f
+
+
+@pytest.fixture
+def target(tmp_path):
+    d = tmp_path / "sorted"
+    d.mkdir()
+    return d
+
+
+class TestReserve:
+    """Test collision handling from the in-memory name index"""
+
+    def test_existing_names_get_counter(self, target):
+        (target / "Acme_1_0.pdf").write_bytes(b"x")
+        (target / "Acme_1_0_1.pdf").write_bytes(b"x")
+        placer = Placer()
+        assert placer.reserve(target / "Acme_1_0.pdf").name == "Acme_1_0_2.pdf"
+        assert placer.reserve(target / "Acme_1_0.pdf").name == "Acme_1_0_3.pdf"
+        assert placer.reserve(target / "Other.pdf").name == "Other.pdf"
+
+    def test_no_filesystem_probe_per_file(self, target, monkeypatch):
+        """Directory is listed once, then names come from memory"""
+        placer = Placer()
+        placer.reserve(target / "a.pdf")
+        monkeypatch.setattr(placement.os, "listdir", lambda d: pytest.fail("listed again"))
+        for _ in range(100):
+            placer.reserve(target / "UNKNOWN.pdf")
+        assert placer.reserve(target / "UNKNOWN.pdf").name == "UNKNOWN_100.pdf"
+
+    def test_release_frees_name(self, target):
+        placer = Placer()
+        dest = placer.reserve(target / "a.pdf")
+        placer.release(dest)
+        assert placer.reserve(target / "a.pdf") == dest
+
+
+class TestPlace:
+    """Test placement modes and fallbacks"""
+
+    def test_move(self, src, target):
+        placer = Placer("move")
+        dest = placer.reserve(target / "a.pdf")
+        assert placer.place(src, dest) == "move"
+        assert not src.exists() and dest.read_bytes() == b"%PDF-1.4 invoice"
+
+    def test_hardlink_shares_inode(self, src, target):
+        placer = Placer("hardlink")
+        dest = placer.reserve(target / "a.pdf")
+        placer.place(src, dest)
+        assert os.stat(src).st_ino == os.stat(dest).st_ino
+
+    def test_reflink_or_copy(self, src, target):
+        """reflink where the filesystem supports it, otherwise a plain copy"""
+        placer = Placer("reflink")
+        dest = placer.reserve(target / "a.pdf")
+        assert placer.place(src, dest) in ("reflink", "copy")
+        assert dest.read_bytes() == src.read_bytes()
+
+    def test_cross_device_fallback(self, src, target, monkeypatch):
+        def exdev(*args):
+            raise OSError(errno.EXDEV, "Invalid cross-device link")
+        monkeypatch.setattr(placement.os, "rename", exdev)
+        placer = Placer("move")
+        dest = placer.reserve(target / "a.pdf")
+        assert placer.place(src, dest).startswith("move (")
+        assert not src.exists() and dest.exists()
+
+    def test_unknown_mode(self):
+        with pytest.raises(ValueError):
+            Placer("symlink")
@@ -0,0 +1,77 @@
+"""
+Unit tests for MAE preview cache
+Requires OpenCV/NumPy (installed from requirements.txt); skipped otherwise
+"""
+
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add app directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "app"))
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+
+from previews import PreviewCache
+
+KEY_A = "a" * 64
+KEY_B = "b" * 64
+
+
+@pytest.fixture
+def previews(tmp_path):
+    return PreviewCache(tmp_path, max_side=100)
+
+
+def _page(h=1200, w=900):
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 255, size=(h, w, 3), dtype=np.uint8)
+
+
+class TestPreviewCache:
+    """Test PreviewCache storage, downscaling and eviction"""
+
+    def test_put_and_get(self, previews):
+        """Should store downscaled thumbnail under content hash"""
+        import cv2
+        path = previews.put(KEY_A, _page())
+        assert previews.get(KEY_A) == path
+        thumb = cv2.imread(str(path))
+        assert max(thumb.shape[:2]) == 100
+
+    def test_grayscale_input(self, previews):
+        """Should accept single-channel rasters"""
+        assert previews.put(KEY_A, _page()[:, :, 0]) is not None
+
+    def test_invalid_key_rejected(self, previews):
+        """Should not accept keys that are not SHA-256 hex (path traversal)"""
+        assert previews.put("../evil", _page()) is None
+        assert previews.get("../evil") is None
+
+    def test_in_flight_tmp_files_ignored(self, tmp_path):
+        """*.tmp files of concurrent writes are neither counted nor evicted"""
+        cache_dir = tmp_path / "previews"
+        cache_dir.mkdir()
+        tmp = cache_dir / f"{'f' * 64}.webp.123.456.tmp"
+        tmp.write_bytes(b"x" * 100_000)
+        rng = np.random.default_rng(0)
+        cache = PreviewCache(cache_dir=cache_dir, max_bytes=30_000, max_side=200)
+        assert cache.stats()["bytes"] == 0
+        for i in range(10):
+            cache.put(f"{i:064x}", rng.integers(0, 255, (300, 300), dtype=np.uint8))
+        assert tmp.exists()
+        assert cache.stats()["bytes"] <= 30_000
+
+    def test_eviction_respects_max_bytes(self, tmp_path):
+        """Should evict older thumbnails when over the size limit"""
+        previews = PreviewCache(tmp_path, max_side=200)
+        path_a = previews.put(KEY_A, _page())
+        os.utime(path_a, (1, 1))  # Oldest access
+        previews.max_bytes = int(path_a.stat().st_size * 1.5)
+        previews.put(KEY_B, _page())
+        assert previews.stats()["bytes"] <= previews.max_bytes
+        assert previews.has(KEY_B)
+        assert not previews.has(KEY_A)
@@ -0,0 +1,94 @@
+"""
+Unit tests for MAE sampling profiler (profiling.py)
+"""
+
+import pstats
+import re
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+# Add app directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "app"))
+
+from batch_rename import BatchProcessor
+from profiling import Profile, ProfilerBusy, SamplingProfiler
+
+
+class SlowProcessor(BatchProcessor):
+    """load_image spends its time in a backtracking regex"""
+
+    def __init__(self):
+        super().__init__(probe=False)
+
+    def load_image(self, path):
+        end = time.perf_counter() + 0.3
+        while time.perf_counter() < end:
+            re.search(r"(a+)+b", "a" * 18)
+        return None
+
+
+def _parse_in_background(processor, count=1):
+    def work():
+        for i in range(count):
+            processor.process_file(Path(f"doc_{i}.pdf"))
+    thread = threading.Thread(target=work)
+    thread.start()
+    return thread
+
+
+class TestSamplingProfiler:
+    """Test sampling of parse threads and the output formats"""
+
+    def test_samples_parse_thread_until_documents_done(self):
+        profiler = SamplingProfiler()
+        processor = profiler.instrument(SlowProcessor(), "process_file")
+        processor.ocr_ok = True
+        thread = _parse_in_background(processor, count=2)
+        profile = profiler.record(seconds=10, documents=2, interval=0.002)
+        thread.join()
+
+        assert profile.documents == 2
+        assert profile.seconds < 5
+        assert profile.samples > 0
+        collapsed = profile.collapsed()
+        assert "process_file (batch_rename.py:" in collapsed
+        assert "load_image (test_profiling.py:" in collapsed
+        assert not profiler.active
+
+    def test_idle_threads_skipped(self):
+        stop = threading.Event()
+        idle = threading.Thread(target=stop.wait)
+        idle.start()
+        try:
+            profile = SamplingProfiler().record(seconds=0.2, interval=0.01)
+        finally:
+            stop.set()
+            idle.join()
+        assert profile.samples == 0
+        assert profile.collapsed() == ""
+
+    def test_busy(self):
+        profiler = SamplingProfiler()
+        thread = threading.Thread(target=profiler.record, kwargs={"seconds": 0.5})
+        thread.start()
+        time.sleep(0.1)
+        with pytest.raises(ProfilerBusy):
+            profiler.record(seconds=0.1)
+        thread.join()
+
+    def test_pstats_loadable(self, tmp_path):
+        profile = Profile(interval=0.01)
+        root, mid, leaf = ("app.py", 1, "parse", 5), ("core.py", 10, "run_ocr", 12), ("re.py", 3, "search", 4)
+        profile.stacks[(root, mid, leaf)] = 30
+        profile.stacks[(root, mid)] = 10
+        path = tmp_path / "profile.pstats"
+        path.write_bytes(profile.pstats())
+
+        stats = pstats.Stats(str(path)).stats
+        assert stats[("core.py", 10, "run_ocr")][3] == pytest.approx(0.4)  # Cumulative
+        assert stats[("core.py", 10, "run_ocr")][2] == pytest.approx(0.1)  # Own time
+        assert ("core.py", 10, "run_ocr") in stats[("re.py", 3, "search")][4]  # Caller edge
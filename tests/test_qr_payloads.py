@@ -0,0 +1,141 @@
+"""
+Unit tests for MAE QR payload parsers (qr_payloads.py) and skipping the full-page OCR
+These tests don't require external dependencies (Tesseract, pyzbar)
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add app directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "app"))
+
+from core import BaseOCRProcessor
+from qr_payloads import parse_epc, parse_payload, parse_sn, parse_swiss, swico_invoice_number
+
+EPC_V2 = "BCD\n002\n1\nSCT\n\nConrad Electronic SE\nDE89 3704 0044 0532 0130 00\nEUR123.45\n\n\nRechnung RE-2024-12345"
+EPC_V1 = ("BCD\r\n001\r\n1\r\nSCT\r\nCOBADEFFXXX\r\nMusterfirma Handels GmbH\r\nDE89370400440532013000\r\n"
+          "EUR9.90\r\nGDDS\r\nRF18539007547034\r\n")
+
+
+def swiss_qr(name="Reichelt Elektronik AG", message="", billing=""):
+    lines = ["SPC", "0200", "1", "CH4431999123000889012", "S", name, "Musterstrasse", "1", "8000", "Zürich", "CH"]
+    lines += [""] * 7  # Ultimate creditor
+    lines += ["1949.75", "CHF"]
+    lines += ["S", "Sicherheit Nord GmbH", "Hafenstraße", "12", "20457", "Hamburg", "DE"]
+    lines += ["QRR", "210000000003139471430009017", message, "EPD", billing]
+    return "\n".join(lines)
+
+
+class TestParsePayloads:
+    """Test EPC, Swiss QR-bill and SN parsers"""
+
+    def test_epc_version_2(self):
+        payload = parse_epc(EPC_V2)
+        assert payload.kind == "epc"
+        assert payload.name == "Conrad Electronic SE"
+        assert payload.iban == "DE89370400440532013000"
+        assert (payload.currency, payload.amount) == ("EUR", "123.45")
+        assert payload.remittance == "Rechnung RE-2024-12345"
+
+    def test_epc_version_1_with_reference(self):
+        payload = parse_epc(EPC_V1)
+        assert payload.name == "Musterfirma Handels GmbH"
+        assert payload.reference == "RF18539007547034"
+        assert payload.remittance is None
+
+    def test_epc_requires_header_and_name(self):
+        assert parse_epc("BCD\n003\n1\nSCT\n\nName\nDE89370400440532013000") is None
+        assert parse_epc("BCD\n002\n1\nSCT\n\n\nDE89370400440532013000") is None
+
+    def test_swiss_qr_bill(self):
+        payload = parse_swiss(swiss_qr(message="Rechnung 2024-778", billing="//S1/10/10201409/11/200701"))
+        assert payload.kind == "swiss"
+        assert payload.name == "Reichelt Elektronik AG"
+        assert (payload.amount, payload.currency) == ("1949.75", "CHF")
+        assert payload.invoice_number == "10201409"
+        assert payload.remittance == "Rechnung 2024-778"
+
+    def test_swiss_qr_bill_without_billing_information(self):
+        text = swiss_qr().rsplit("\n", 1)[0]  # Billing information is optional
+        assert parse_swiss(text).invoice_number is None
+
+    def test_swico_escaped_slash(self):
+        assert swico_invoice_number("//S1/11/200701/10/RE\\/2024\\/7") == "RE/2024/7"
+        assert swico_invoice_number("//XY/10/123") is None
+
+    def test_sn_label(self):
+        assert parse_sn("SN<0012345>").internal_number == "12345"
+        assert parse_sn("SN: 777").internal_number == "777"
+
+    def test_unknown_payload(self):
+        assert parse_payload("https://example.com/invoice/42") is None
+
+
+class TestFieldsFromQr:
+    """Test vendor / invoice number from QR payloads and the OCR skip decision"""
+
+    @pytest.fixture
+    def processor(self):
+        proc = object.__new__(BaseOCRProcessor)
+        proc.ocr_ok = False
+        proc.qr_ok = False
+        return proc
+
+    def test_epc_fills_required_fields(self, processor):
+        fields = processor.fields_from_qr([EPC_V2, "SN<0004711>"])
+        assert fields == {"vendor": "Conrad", "invoice_number": "RE-2024-12345", "internal_number": "4711",
+                          "invoice_hint": None}
+        assert not processor.needs_ocr(fields)
+
+    def test_sn_inside_payment_code_ignored(self, processor):
+        epc = EPC_V2.replace("Rechnung RE-2024-12345", "Rechnung RE-2024-12345 SN 98765")
+        assert processor.fields_from_qr([epc])["internal_number"] is None
+
+    def test_unknown_beneficiary_and_bare_reference(self, processor):
+        epc = EPC_V2.replace("Conrad Electronic SE", "Elektro Meier Handels GmbH").replace(
+            "Rechnung RE-2024-12345", "Kunden-Nr. 55555, 2024-0815")
+        fields = processor.fields_from_qr([epc])
+        assert fields["vendor"] == "Elektro Meier Handels"
+        # Unlabelled token: only a hint, the page has to confirm it
+        assert fields["invoice_number"] is None
+        assert fields["invoice_hint"] == "2024-0815"
+        assert processor.needs_ocr(fields)
+
+    def test_hint_confirmed_by_ocr(self, processor, monkeypatch):
+        epc = EPC_V2.replace("Rechnung RE-2024-12345", "2024-0815")
+        monkeypatch.setattr(processor, "run_ocr", lambda img: "Conrad Electronic SE\nBeleg 2024-0815")
+        assert processor.extract_text_fields(None, processor.fields_from_qr([epc]))["invoice_number"] == "2024-0815"
+        monkeypatch.setattr(processor, "run_ocr", lambda img: "Conrad Electronic SE\nLieferung 15.08.2024")
+        assert processor.extract_text_fields(None, processor.fields_from_qr([epc]))["invoice_number"] is None
+
+    def test_structured_reference_only_needs_ocr(self, processor):
+        fields = processor.fields_from_qr([EPC_V1])
+        assert fields["vendor"] == "Musterfirma Handels GmbH"
+        assert fields["invoice_number"] is None
+        assert processor.needs_ocr(fields)
+
+    def test_buyer_as_beneficiary_ignored(self, processor):
+        fields = processor.fields_from_qr([swiss_qr(name="Sicherheit Nord GmbH")])
+        assert fields["vendor"] is None
+
+    def test_swiss_invoice_number_from_billing(self, processor):
+        fields = processor.fields_from_qr([swiss_qr(billing="//S1/10/10201409")])
+        assert fields["vendor"] == "Reichelt"
+        assert fields["invoice_number"] == "10201409"
+
+    def test_full_page_ocr_skipped(self, processor, monkeypatch):
+        def no_ocr(img):
+            raise AssertionError("run_ocr must not run")
+        monkeypatch.setattr(processor, "run_ocr", no_ocr)
+        fields = processor.extract_text_fields(None, processor.fields_from_qr([EPC_V2]))
+        assert fields["invoice_number"] == "RE-2024-12345"
+        assert fields["vat_id"] is None
+
+    def test_verify_mode_runs_ocr_and_keeps_qr_values(self, processor, monkeypatch):
+        processor.qr_verify = True
+        monkeypatch.setattr(processor, "run_ocr", lambda img: "DHL\nRechnungsnummer: RE-99999\nUSt-IdNr.: DE123456789")
+        fields = processor.extract_text_fields(None, processor.fields_from_qr([EPC_V2]))
+        assert fields == {"vendor": "Conrad", "invoice_number": "RE-2024-12345", "internal_number": None,
+                          "invoice_hint": None, "vat_id": "DE123456789"}
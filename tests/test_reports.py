@@ -0,0 +1,57 @@
+"""
+Unit tests for MAE streaming report writers (xlsx / csv / jsonl)
+These tests don't require external dependencies (Tesseract, Poppler)
+"""
+
+import csv
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add app directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "app"))
+
+from reports import open_report
+
+COLUMNS = ["File", "Vendor", "Confidence"]
+ROWS = [
+    {"File": "a.pdf", "Vendor": "Acme GmbH", "Confidence": "85%"},
+    {"File": "b.pdf", "Vendor": "Bosch Rexroth AG Lohr am Main Zentrallager", "Confidence": "40%"},
+]
+
+
+def _write(path: Path, fmt: str = None) -> Path:
+    with open_report(path, COLUMNS, fmt) as report:
+        for row in ROWS:
+            report.write(row)
+    return path
+
+
+class TestReports:
+    """Test report formats and XLSX column widths"""
+
+    def test_xlsx_rows_and_widths(self, tmp_path):
+        openpyxl = pytest.importorskip("openpyxl")
+        wb = openpyxl.load_workbook(_write(tmp_path / "r.xlsx"))
+        ws = wb.active
+        assert [c.value for c in ws[1]] == COLUMNS
+        assert ws["B3"].value == ROWS[1]["Vendor"]
+        assert ws.column_dimensions["A"].width == len("a.pdf") + 2
+        assert ws.column_dimensions["B"].width == 44  # Longest vendor + 2, capped at 50
+
+    def test_csv(self, tmp_path):
+        path = _write(tmp_path / "r.csv")
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            rows = list(csv.reader(f, delimiter=";"))
+        assert rows[0] == COLUMNS
+        assert rows[2][1] == ROWS[1]["Vendor"]
+
+    def test_jsonl(self, tmp_path):
+        lines = _write(tmp_path / "report.out", "jsonl").read_text(encoding="utf-8").splitlines()
+        assert [json.loads(line) for line in lines] == ROWS
+
+    def test_unknown_format(self, tmp_path):
+        with pytest.raises(ValueError):
+            open_report(tmp_path / "r.ods", COLUMNS)
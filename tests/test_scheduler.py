@@ -0,0 +1,82 @@
+"""
+Unit tests for MAE priority scheduler
+These tests don't require external dependencies (Tesseract, Poppler)
+"""
+
+import pytest
+import sys
+import threading
+from pathlib import Path
+
+# Add app directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "app"))
+
+from scheduler import Priority, PriorityScheduler, SchedulerSaturated
+
+
+@pytest.fixture
+def scheduler():
+    sched = PriorityScheduler(workers=1)
+    yield sched
+    sched.shutdown()
+
+
+def _block_worker(scheduler):
+    """Occupy the only worker until the returned event is set"""
+    started, release = threading.Event(), threading.Event()
+
+    def job():
+        started.set()
+        release.wait(5)
+
+    scheduler.submit(Priority.BATCH, job)
+    assert started.wait(5)
+    return release
+
+
+class TestPriorityScheduler:
+    """Test PriorityScheduler ordering and admission control"""
+
+    def test_returns_result(self, scheduler):
+        """Should return job result through the future"""
+        assert scheduler.submit(Priority.INTERACTIVE, lambda x: x * 2, 21).result(5) == 42
+
+    def test_propagates_exception(self, scheduler):
+        """Should surface job exceptions to the caller"""
+        def boom():
+            raise ValueError("bad file")
+        with pytest.raises(ValueError):
+            scheduler.submit(Priority.INTERACTIVE, boom).result(5)
+
+    def test_interactive_before_batch(self, scheduler):
+        """Queued interactive job should run before earlier batch jobs"""
+        release = _block_worker(scheduler)
+        order = []
+        scheduler.max_depth[Priority.BATCH] = 10
+        futures = [scheduler.submit(Priority.BATCH, order.append, f"batch{i}") for i in range(3)]
+        futures.append(scheduler.submit(Priority.WATCHER, order.append, "watcher"))
+        futures.append(scheduler.submit(Priority.INTERACTIVE, order.append, "interactive"))
+        release.set()
+        for f in futures:
+            f.result(5)
+        assert order == ["interactive", "watcher", "batch0", "batch1", "batch2"]
+
+    def test_saturated_queue_rejects(self, scheduler):
+        """Full class queue should raise with a positive Retry-After"""
+        release = _block_worker(scheduler)
+        scheduler.max_depth[Priority.INTERACTIVE] = 1
+        scheduler.submit(Priority.INTERACTIVE, lambda: None)
+        with pytest.raises(SchedulerSaturated) as exc:
+            scheduler.submit(Priority.INTERACTIVE, lambda: None)
+        assert exc.value.retry_after >= 1
+        assert scheduler.stats()["queues"]["interactive"]["rejected"] == 1
+        release.set()
+
+    def test_blocking_submit_times_out(self, scheduler):
+        """Blocking submit should give up after timeout when queue stays full"""
+        release = _block_worker(scheduler)
+        scheduler.max_depth[Priority.BATCH] = 1
+        scheduler.submit(Priority.BATCH, lambda: None)
+        with pytest.raises(SchedulerSaturated):
+            scheduler.submit(Priority.BATCH, lambda: None, block=True, timeout=0.05)
+        release.set()
@@ -0,0 +1,192 @@
+"""
+Unit tests for MAE stage graph (stages.py) and the concurrent stages of one page
+These tests don't require external dependencies (Tesseract, pyzbar): slow
+stages are simulated with sleeps
+"""
+
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+# Add app directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "app"))
+
+from core import BaseOCRProcessor
+from stages import Stage, StageGraph, current_cancel, stage_stats
+
+EPC = "BCD\n002\n1\nSCT\n\nConrad Electronic SE\nDE89 3704 0044 0532 0130 00\nEUR123.45\n\n\nRechnung RE-2024-12345"
+STAGE_SECONDS = 0.2
+
+
+@pytest.fixture
+def pool():
+    executor = ThreadPoolExecutor(max_workers=2)
+    yield executor
+    executor.shutdown(wait=True)
+
+
+def sleeper(value, seconds=STAGE_SECONDS, log=None):
+    def run(results):
+        if log is not None:
+            log.append(threading.current_thread().name)
+        time.sleep(seconds)
+        return value
+    return run
+
+
+class TestStageGraph:
+    """Test ordering, speculation, cancellation and the budget"""
+
+    def test_rejects_unknown_dependency(self):
+        with pytest.raises(ValueError):
+            StageGraph([Stage("ocr", sleeper(1), after=("qr",)), Stage("qr", sleeper(1))])
+
+    def test_budget_one_runs_in_caller_thread(self, pool):
+        log = []
+        graph = StageGraph([Stage("qr", sleeper(1, 0, log)), Stage("ocr", sleeper(2, 0, log), speculative=True)])
+        assert graph.run(pool, budget=1) == {"qr": 1, "ocr": 2}
+        assert log == [threading.current_thread().name] * 2
+
+    def test_independent_stages_overlap(self, pool):
+        graph = StageGraph([Stage("qr", sleeper("qr")),
+                            Stage("ocr", sleeper("text"), after=("qr",), speculative=True),
+                            Stage("corner", sleeper("123"), after=("qr",), speculative=True)])
+        start = time.perf_counter()
+        results = graph.run(pool, budget=3)
+        assert results == {"qr": "qr", "ocr": "text", "corner": "123"}
+        assert time.perf_counter() - start < 2 * STAGE_SECONDS
+
+    def test_unneeded_speculative_stage_is_dropped(self, pool):
+        before = stage_stats.stats().get("corner", {}).get("discarded", 0)
+        graph = StageGraph([Stage("qr", sleeper({"internal_number": "4711"}, 0.05)),
+                            Stage("corner", sleeper("123"), after=("qr",), speculative=True,
+                                  needed=lambda res: not res["qr"]["internal_number"])])
+        assert graph.run(pool, budget=2)["corner"] is None
+        assert stage_stats.stats()["corner"]["discarded"] == before + 1
+
+    def test_queued_speculative_stage_is_cancelled(self):
+        ran = []
+        with ThreadPoolExecutor(max_workers=1) as busy:
+            release = threading.Event()
+            busy.submit(release.wait, 5)
+            graph = StageGraph([Stage("qr", lambda res: None),
+                                Stage("ocr", lambda res: ran.append(1), after=("qr",), speculative=True,
+                                      needed=lambda res: False)])
+            assert graph.run(busy, budget=2) == {"qr": None, "ocr": None}
+            release.set()
+        assert ran == []
+
+    def test_discarded_running_stage_frees_its_slot(self):
+        class FakeTesseract:
+            def __init__(self):
+                self.killed = threading.Event()
+
+            def kill(self):
+                self.killed.set()
+
+        proc = FakeTesseract()
+
+        def ocr(results):
+            current_cancel().register(proc)
+            proc.killed.wait(5)
+            raise RuntimeError("tesseract killed")
+
+        with ThreadPoolExecutor(max_workers=1) as single:
+            graph = StageGraph([Stage("qr", sleeper(None, 0.05)),
+                                Stage("ocr", ocr, after=("qr",), speculative=True, needed=lambda res: False)])
+            assert graph.run(single, budget=2)["ocr"] is None
+            assert single.submit(lambda: "next page").result(timeout=1) == "next page"
+        assert proc.killed.is_set()
+
+    def test_failure_of_needed_stage_propagates(self, pool):
+        def fail(results):
+            raise RuntimeError("tesseract crashed")
+        graph = StageGraph([Stage("qr", sleeper(None, 0)), Stage("ocr", fail, after=("qr",), speculative=True)])
+        with pytest.raises(RuntimeError):
+            graph.run(pool, budget=2)
+
+    def test_failure_of_discarded_stage_is_ignored(self, pool):
+        def fail(results):
+            raise RuntimeError("tesseract crashed")
+        graph = StageGraph([Stage("qr", sleeper(None, 0.05)),
+                            Stage("ocr", fail, after=("qr",), speculative=True, needed=lambda res: False)])
+        assert graph.run(pool, budget=2)["ocr"] is None
+
+
+class SlowOCRProcessor(BaseOCRProcessor):
+    """QR decode, full-page OCR and corner OCR take STAGE_SECONDS each"""
+
+    def __init__(self, qr_data):
+        super().__init__(probe=False)
+        self.qr_data = qr_data
+        self.calls = []
+
+    def extract_qr_codes(self, img):
+        time.sleep(STAGE_SECONDS)
+        return self.qr_data
+
+    def run_ocr(self, img, lang=None):
+        time.sleep(STAGE_SECONDS)
+        self.calls.append("ocr")
+        return "Conrad Electronic SE\nRechnungsnummer: RE-2024-55555\nUSt-IdNr.: DE123456789"
+
+    def extract_internal_from_corner(self, img):
+        time.sleep(STAGE_SECONDS)
+        self.calls.append("corner")
+        return "1234"
+
+
+class TestPageStages:
+    """Test the QR / zones / full OCR / corner graph of BaseOCRProcessor"""
+
+    def run(self, processor, pool, budget):
+        start = time.perf_counter()
+        results = processor.stage_graph(None).run(pool, budget)
+        return results, time.perf_counter() - start
+
+    def test_overlap_cuts_latency(self, pool):
+        processor = SlowOCRProcessor([])
+        results, seconds = self.run(processor, pool, budget=3)
+        assert results["corner"] == "1234"
+        fields = processor.merge_ocr_fields(None, results["ocr"], results["qr"])
+        assert (fields["vendor"], fields["invoice_number"]) == ("Conrad", "RE-2024-55555")
+        assert seconds < 2 * STAGE_SECONDS
+
+    def test_sequential_with_budget_one(self, pool):
+        results, seconds = self.run(SlowOCRProcessor([]), pool, budget=1)
+        assert results["ocr"] is not None and results["corner"] == "1234"
+        assert seconds >= 3 * STAGE_SECONDS
+
+    def test_payment_qr_makes_ocr_unneeded(self, pool):
+        processor = SlowOCRProcessor([EPC, "SN<0004711>"])
+        results, _ = self.run(processor, pool, budget=3)
+        assert results["qr"]["invoice_number"] == "RE-2024-12345"
+        assert results["qr"]["internal_number"] == "4711"
+        assert results["ocr"] is None and results["corner"] is None
+
+    @pytest.mark.skipif(sys.platform == "win32", reason="fake tesseract is a shell script")
+    def test_discarded_ocr_terminates_tesseract(self, tmp_path, monkeypatch):
+        np = pytest.importorskip("numpy")
+        pytesseract = pytest.importorskip("pytesseract")
+        fake = tmp_path / "tesseract"
+        fake.write_text("#!/bin/sh\nexec sleep 30\n")
+        fake.chmod(0o755)
+        monkeypatch.delenv("TESSERACT_CMD", raising=False)
+        monkeypatch.setattr(pytesseract.pytesseract, "tesseract_cmd", str(fake))
+        monkeypatch.setattr(pytesseract.pytesseract.get_tesseract_version, "_result",
+                            pytesseract.pytesseract.Version("5.3.0"))
+
+        class QROnly(SlowOCRProcessor):
+            run_ocr = BaseOCRProcessor.run_ocr  # Real Tesseract call
+
+        page = np.full((200, 200, 3), 255, dtype=np.uint8)
+        with ThreadPoolExecutor(max_workers=1) as single:
+            start = time.perf_counter()
+            results = QROnly([EPC, "SN<0004711>"]).stage_graph(page).run(single, budget=2)
+            assert results["ocr"] is None
+            assert single.submit(lambda: "next page").result(timeout=5) == "next page"
+            assert time.perf_counter() - start < 5
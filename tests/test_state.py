@@ -0,0 +1,105 @@
+"""
+Unit tests for MAE shared state (SQLite)
+These tests don't require external dependencies (Tesseract, Poppler)
+"""
+
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add app directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "app"))
+
+import state as state_module
+from state import SharedState
+
+
+@pytest.fixture
+def state(tmp_path):
+    return SharedState(tmp_path / "state.db")
+
+
+class TestSharedState:
+    """Test SharedState results, key/value, leases and counters"""
+
+    def test_results_fifo_limit(self, state):
+        """Should keep only the newest max_results entries"""
+        for i in range(5):
+            state.append_result({"filename": f"{i}.pdf"}, max_results=3)
+        assert [r["filename"] for r in state.list_results()] == ["2.pdf", "3.pdf", "4.pdf"]
+        assert state.count_results() == 3
+        state.clear_results()
+        assert state.list_results() == []
+
+    def test_visible_to_other_connection(self, state, tmp_path):
+        """Another process (separate connection) should see the same data"""
+        state.set("batch", {"running": True})
+        other = SharedState(tmp_path / "state.db")
+        assert other.get("batch") == {"running": True}
+
+    def test_update_is_read_modify_write(self, state):
+        """Should apply function to current value and store the result"""
+        state.set("batch", {"processed": 1})
+        assert state.update("batch", lambda b: {"processed": b["processed"] + 1}) == {"processed": 2}
+        assert state.get("missing", "default") == "default"
+
+    def test_update_error_rolls_back(self, state):
+        """Exception inside update should leave stored value unchanged"""
+        state.set("batch", {"running": True})
+
+        def fail(_):
+            raise RuntimeError("busy")
+        with pytest.raises(RuntimeError):
+            state.update("batch", fail)
+        assert state.get("batch") == {"running": True}
+
+    def test_lease_single_holder(self, state):
+        """Only one owner should hold an unexpired lease"""
+        assert state.acquire_lease("watcher", "a", ttl=30)
+        assert not state.acquire_lease("watcher", "b", ttl=30)
+        assert state.acquire_lease("watcher", "a", ttl=30)  # renew
+        assert state.lease_holder("watcher") == "a"
+        state.release_lease("watcher", "a")
+        assert state.acquire_lease("watcher", "b", ttl=30)
+
+    def test_expired_lease_taken_over(self, state):
+        """Expired lease should be available to another owner"""
+        assert state.acquire_lease("watcher", "a", ttl=-1)
+        assert state.lease_holder("watcher") is None
+        assert state.acquire_lease("watcher", "b", ttl=30)
+
+    def test_counter_window(self, state):
+        """Counter should accumulate within window and restart after expiry"""
+        assert state.incr_counter("ip", expiry=60) == 1
+        assert state.incr_counter("ip", expiry=60) == 2
+        assert state.get_counter("ip") == 2
+        state.incr_counter("old", expiry=-1)
+        assert state.get_counter("old") == 0
+        assert state.incr_counter("old", expiry=60) == 1
+
+    def test_expired_counters_pruned(self, state, monkeypatch):
+        """Expired counter rows should be deleted every COUNTER_PRUNE_EVERY increments"""
+        monkeypatch.setattr(state_module, "COUNTER_PRUNE_EVERY", 5)
+        for i in range(4):
+            state.incr_counter(f"ip{i}", expiry=-1)
+        rows = "SELECT COUNT(*) FROM counters"
+        assert state._conn().execute(rows).fetchone()[0] == 4
+        state.incr_counter("live", expiry=60)
+        assert state._conn().execute(rows).fetchone()[0] == 1
+        assert state.get_counter("live") == 1
+
+    def test_old_journal_gains_inode_columns(self, tmp_path):
+        """A journal table without ino/ctime_ns should be migrated; old rows read back as None"""
+        db = tmp_path / "old.db"
+        conn = sqlite3.connect(str(db))
+        conn.execute("CREATE TABLE journal (path TEXT NOT NULL, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, "
+                     "sha256 TEXT NOT NULL, processed_at REAL NOT NULL, PRIMARY KEY (path, size, mtime_ns))")
+        conn.execute("INSERT INTO journal VALUES ('a.pdf', 1, 2, 'abc', 0)")
+        conn.commit()
+        conn.close()
+        state = SharedState(db)
+        assert state.journal_lookup("a.pdf") == [(1, 2, None, None, "abc")]
+        state.journal_add("b.pdf", 1, 2, "def", ino=3, ctime_ns=4)
+        assert state.journal_lookup("b.pdf") == [(1, 2, 3, 4, "def")]
@@ -0,0 +1,307 @@
+"""
+Unit tests for MAE folder watcher dispatch
+Requires watchdog (installed from requirements.txt); skipped otherwise.
+OCR is replaced by a fake parser.
+"""
+
+import hashlib
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+# Add app directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "app"))
+
+pytest.importorskip("watchdog")
+
+from scheduler import PriorityScheduler, default_workers
+from state import SharedState
+import watcher as watcher_module
+from watcher import FolderWatcher, ProcessedJournal, TreeSnapshot
+
+
+class FakeParser:
+    """Parser stand-in that records calls and takes a fixed time per file"""
+
+    def __init__(self, delay: float = 0.2):
+        self.delay = delay
+        self.seen = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def parse(self, path: Path):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+            self.seen.append(path.name)
+        return path.name
+
+
+def _wait_for(predicate, timeout: float = 10.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+@pytest.fixture
+def watch_dir(tmp_path):
+    d = tmp_path / "scans"
+    d.mkdir()
+    return d
+
+
+class TestFolderWatcher:
+    """Test FolderWatcher queueing and worker pool"""
+
+    def test_initial_scan_does_not_block_start(self, watch_dir):
+        """start() should return before existing files are processed"""
+        for i in range(4):
+            (watch_dir / f"old{i}.pdf").write_bytes(b"%PDF-1.4")
+        parser = FakeParser(delay=0.5)
+        watcher = FolderWatcher(parser, lambda r: None, workers=2)
+        start = time.monotonic()
+        assert watcher.start(str(watch_dir))
+        try:
+            assert time.monotonic() - start < 0.5
+            assert _wait_for(lambda: len(parser.seen) == 4)
+        finally:
+            watcher.stop()
+
+    def test_burst_processed_in_parallel(self, watch_dir):
+        """New files should be processed by several workers at once"""
+        parser = FakeParser(delay=0.3)
+        results = []
+        # Wired like the web app: watcher workers submit to a scheduler with the default worker count
+        scheduler = PriorityScheduler(workers=default_workers())
+        watcher = FolderWatcher(parser, results.append, scheduler, workers=4)
+        assert watcher.start(str(watch_dir))
+        try:
+            for i in range(8):
+                (watch_dir / f"scan{i}.pdf").write_bytes(b"%PDF-1.4 data")
+            assert _wait_for(lambda: len(results) == 8)
+            assert parser.max_active > 1
+        finally:
+            watcher.stop()
+            scheduler.shutdown()
+
+    def test_each_file_processed_once(self, watch_dir):
+        """Duplicate events for one file should be processed once"""
+        parser = FakeParser(delay=0.01)
+        watcher = FolderWatcher(parser, lambda r: None, workers=2)
+        assert watcher.start(str(watch_dir))
+        try:
+            path = watch_dir / "dup.pdf"
+            path.write_bytes(b"%PDF-1.4")
+            watcher.enqueue(path, ready=True)
+            watcher.enqueue(path, ready=True)
+            assert _wait_for(lambda: parser.seen == ["dup.pdf"])
+            time.sleep(0.2)
+            assert parser.seen == ["dup.pdf"]
+        finally:
+            watcher.stop()
+
+    def test_start_is_idempotent(self, watch_dir):
+        """Concurrent start() calls for the same folder leave one set of threads / one observer"""
+        watcher = FolderWatcher(FakeParser(delay=0.01), lambda r: None, workers=2)
+        calls = [threading.Thread(target=watcher.start, args=(str(watch_dir),)) for _ in range(4)]
+        for t in calls:
+            t.start()
+        for t in calls:
+            t.join()
+        try:
+            threads, observer = list(watcher._threads), watcher.observer
+            assert watcher.start(str(watch_dir))
+            assert watcher._threads == threads and watcher.observer is observer
+        finally:
+            watcher.stop()
+
+    def test_unsupported_files_ignored(self, watch_dir):
+        """Files with unsupported extensions should never be queued"""
+        parser = FakeParser(delay=0.01)
+        watcher = FolderWatcher(parser, lambda r: None, workers=1)
+        assert watcher.start(str(watch_dir))
+        try:
+            (watch_dir / "notes.txt").write_text("hello")
+            time.sleep(1.0)
+            assert parser.seen == []
+        finally:
+            watcher.stop()
+
+
+class TestProcessedJournal:
+    """Test restart-safe processed-file journal"""
+
+    def test_survives_restart(self, tmp_path, watch_dir):
+        """A new journal on the same database should remember processed files"""
+        f = watch_dir / "a.pdf"
+        f.write_bytes(b"invoice a")
+        ProcessedJournal(SharedState(tmp_path / "state.db")).record(f)
+
+        restarted = ProcessedJournal(SharedState(tmp_path / "state.db"))
+        assert restarted.is_processed(f)
+
+    def test_reused_path_is_not_skipped(self, tmp_path, watch_dir):
+        """A different file dropped under a processed name should be processed"""
+        journal = ProcessedJournal(SharedState(tmp_path / "state.db"))
+        f = watch_dir / "scan.pdf"
+        f.write_bytes(b"first document")
+        journal.record(f)
+        f.write_bytes(b"second document, longer")
+        assert not journal.is_processed(f)
+
+    def test_touched_file_matches_by_hash(self, tmp_path, watch_dir):
+        """Same content with a new mtime should still count as processed"""
+        f = watch_dir / "scan.pdf"
+        f.write_bytes(b"same content")
+        ProcessedJournal(SharedState(tmp_path / "state.db")).record(f)
+        st = f.stat()
+        os.utime(f, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        assert ProcessedJournal(SharedState(tmp_path / "state.db")).is_processed(f)
+
+    def test_replacement_keeping_size_and_mtime_is_not_skipped(self, tmp_path, watch_dir):
+        """cp -p over a processed file (same size and mtime, new inode) should be checked by hash"""
+        journal = ProcessedJournal(SharedState(tmp_path / "state.db"))
+        f = watch_dir / "scan.pdf"
+        f.write_bytes(b"invoice 0001")
+        journal.record(f)
+        replacement = watch_dir / "incoming.tmp"
+        replacement.write_bytes(b"invoice 0002")
+        st = f.stat()
+        os.utime(replacement, ns=(st.st_atime_ns, st.st_mtime_ns))
+        os.replace(replacement, f)
+        assert not journal.is_processed(f)
+        assert not ProcessedJournal(SharedState(tmp_path / "state.db")).is_processed(f)
+
+    def test_hash_from_parse_result_reused(self, tmp_path, watch_dir, monkeypatch):
+        """process_file journals the parse's content hash instead of reading the file again"""
+        f = watch_dir / "scan.pdf"
+        f.write_bytes(b"hashed by the parser")
+        digest = hashlib.sha256(f.read_bytes()).hexdigest()
+
+        class HashingParser:
+            def parse(self, path):
+                return SimpleNamespace(file_hash=digest)
+
+        journal = ProcessedJournal(SharedState(tmp_path / "state.db"))
+        watcher = FolderWatcher(HashingParser(), lambda r: None, journal=journal)
+        monkeypatch.setattr(watcher_module, "_file_sha256", lambda path: pytest.fail("file hashed twice"))
+        watcher.process_file(f)
+        monkeypatch.undo()
+
+        st = f.stat()
+        os.utime(f, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        assert ProcessedJournal(SharedState(tmp_path / "state.db")).is_processed(f)
+
+    def test_recent_window_is_bounded(self, watch_dir):
+        """In-memory window should not grow past recent_size"""
+        journal = ProcessedJournal(recent_size=3)
+        for i in range(10):
+            f = watch_dir / f"{i}.pdf"
+            f.write_bytes(b"x")
+            journal.record(f)
+        assert journal.stats()["recent"] == 3
+
+    def test_watcher_skips_journaled_file(self, tmp_path, watch_dir):
+        """Initial scan after a restart should not reprocess journaled files"""
+        f = watch_dir / "done.pdf"
+        f.write_bytes(b"done")
+        state = SharedState(tmp_path / "state.db")
+        ProcessedJournal(state).record(f)
+        parser = FakeParser(delay=0)
+        w = FolderWatcher(parser, lambda r: None, journal=ProcessedJournal(state))
+        w.process_file(f)
+        assert parser.seen == []
+
+
+def _age(path: Path, seconds: float = 60):
+    """Backdate mtime so the snapshot treats the listing as settled"""
+    t = time.time() - seconds
+    os.utime(path, (t, t))
+
+
+class TestTreeSnapshot:
+    """Test incremental directory snapshots of the polling backend"""
+
+    def test_first_scan_returns_existing_tree(self, watch_dir):
+        """Initial scan should find supported files in subfolders"""
+        (watch_dir / "a" / "b").mkdir(parents=True)
+        (watch_dir / "top.pdf").write_bytes(b"x")
+        (watch_dir / "a" / "b" / "deep.PNG").write_bytes(b"x")
+        (watch_dir / "a" / "notes.txt").write_bytes(b"x")
+        found = TreeSnapshot(watch_dir, recursive=True).scan()
+        assert sorted(p.name for p in found) == ["deep.PNG", "top.pdf"]
+
+    def test_non_recursive_ignores_subfolders(self, watch_dir):
+        (watch_dir / "sub").mkdir()
+        (watch_dir / "sub" / "deep.pdf").write_bytes(b"x")
+        assert TreeSnapshot(watch_dir, recursive=False).scan() == []
+
+    def test_unchanged_tree_is_not_listed(self, watch_dir):
+        """Settled directories should be skipped, new files still found"""
+        for i in range(20):
+            d = watch_dir / f"d{i}"
+            d.mkdir()
+            (d / "scan.pdf").write_bytes(b"x")
+            _age(d)
+        _age(watch_dir)
+        snap = TreeSnapshot(watch_dir, recursive=True)
+        assert len(snap.scan()) == 20
+        assert snap.scan() == []
+        assert snap.last_listed == 0
+
+        (watch_dir / "d7" / "new.pdf").write_bytes(b"x")
+        assert [p.name for p in snap.scan()] == ["new.pdf"]
+        assert snap.last_listed == 1
+
+    def test_excluded_dir_is_skipped(self, watch_dir):
+        """Archive inside a recursive watch must not be rescanned"""
+        archive = watch_dir / "archive"
+        archive.mkdir()
+        (archive / "done.pdf").write_bytes(b"x")
+        assert TreeSnapshot(watch_dir, recursive=True, exclude=[archive]).scan() == []
+
+    def test_removed_dirs_are_forgotten(self, watch_dir):
+        sub = watch_dir / "sub"
+        sub.mkdir()
+        (sub / "a.pdf").write_bytes(b"x")
+        snap = TreeSnapshot(watch_dir, recursive=True)
+        snap.scan()
+        (sub / "a.pdf").unlink()
+        sub.rmdir()
+        snap.scan()
+        assert snap.stats()["dirs"] == 1
+
+
+class TestPollingBackend:
+    """Test FolderWatcher with the polling backend (network shares)"""
+
+    def test_polling_picks_up_new_file_in_subfolder(self, watch_dir, monkeypatch):
+        monkeypatch.setattr(watcher_module, "READY_POLL_INTERVAL", 0.05)
+        parser = FakeParser(delay=0)
+        w = FolderWatcher(parser, lambda r: None, recursive=True, backend="polling", poll_interval=0.05)
+        assert w.start(str(watch_dir))
+        try:
+            assert w.status["backend"] == "polling"
+            sub = watch_dir / "scanner1"
+            sub.mkdir()
+            (sub / "invoice.pdf").write_bytes(b"%PDF")
+            assert _wait_for(lambda: parser.seen == ["invoice.pdf"])
+        finally:
+            w.stop()
+
+    def test_unknown_backend_rejected(self, watch_dir):
+        w = FolderWatcher(FakeParser(), lambda r: None, backend="inotify")
+        with pytest.raises(ValueError):
+            w.start(str(watch_dir))
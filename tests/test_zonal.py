@@ -0,0 +1,198 @@
+"""
+Unit tests for MAE zonal OCR templates (zonal.py) and zone-only extraction
+These tests don't require external dependencies (Tesseract): the fake OCR
+reads line texts from an image whose pixels hold line indexes
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+
+# Add app directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "app"))
+
+from core import BaseOCRProcessor, OCRLine, OCRText
+from zonal import MAX_SAMPLES, MIN_SAMPLES, ZoneTemplate, ZoneTemplateStore, fingerprint
+
+PAGE = (2480, 3508)
+
+
+def page_lines(vendor="Conrad Electronic SE", invoice="RE-2024-12345", vat="DE123456789", vendor_left=180):
+    return [
+        OCRLine(vendor, vendor_left, 150, 800, 72),
+        OCRLine("Sicherheit Nord GmbH", 180, 520, 500, 34),
+        OCRLine(f"Rechnungsnummer: {invoice}", 180, 930, 700, 36),
+        OCRLine("1  Kabelbinder 200mm  5  3,90 EUR", 180, 1240, 1400, 32),
+        OCRLine(f"USt-IdNr.: {vat}", 180, 3250, 500, 28),
+    ]
+
+
+class FakeOCRProcessor(BaseOCRProcessor):
+    """Page raster holds 1 + line index inside each line box; OCR returns the lines a crop touches"""
+
+    def __init__(self, store):
+        super().__init__(probe=False)
+        self.zone_templates = store
+        self.lines = []
+        self.full_page_runs = 0
+
+    def render(self, lines):
+        self.lines = lines
+        img = np.zeros((PAGE[1], PAGE[0]), np.uint8)
+        for i, line in enumerate(lines):
+            img[line.top:line.top + line.height, line.left:line.left + line.width] = i + 1
+        return img
+
+    def run_ocr(self, img, lang=None):
+        self.full_page_runs += 1
+        return OCRText("\n".join(line.text for line in self.lines) + "\n", self.lines, *PAGE)
+
+    def _ocr_zone(self, crop, single_line):
+        return "\n".join(self.lines[i - 1].text for i in sorted(set(np.unique(crop)) - {0}))
+
+
+def letterhead(left):
+    """White page with a dark letterhead block"""
+    img = np.full((PAGE[1], PAGE[0]), 255, np.uint8)
+    img[150:222, left:left + 800:3] = 0
+    return img
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ZoneTemplateStore(tmp_path / "zone_templates.json")
+
+
+class TestZoneTemplate:
+    """Test zone union, readiness and serialization"""
+
+    def test_zone_is_union_of_boxes(self):
+        template = ZoneTemplate("Conrad")
+        template.add({"vat_id": (0.1, 0.90, 0.3, 0.92)}, None)
+        template.add({"vat_id": (0.1, 0.93, 0.35, 0.95)}, None)
+        assert template.zone("vat_id") == (0.1, 0.90, 0.35, 0.95)
+        assert template.zone("invoice_number") is None
+
+    def test_moving_field_is_not_zonal(self):
+        template = ZoneTemplate("Conrad")
+        template.add({"invoice_number": (0.0, 0.1, 0.5, 0.12)}, None)
+        template.add({"invoice_number": (0.5, 0.8, 1.0, 0.82)}, None)
+        assert template.zone("invoice_number") is None
+
+    def test_ready_and_retired(self):
+        template = ZoneTemplate("Conrad")
+        for _ in range(MIN_SAMPLES):
+            assert not template.ready
+            template.add({"invoice_number": (0.1, 0.2, 0.3, 0.25)}, None)
+        assert template.ready
+        template.misses = 3
+        assert not template.ready
+
+    def test_learning_stops_when_complete(self):
+        template = ZoneTemplate("Conrad")
+        for _ in range(MAX_SAMPLES):
+            assert template.add({"invoice_number": (0.1, 0.2, 0.3, 0.25)}, 1)
+        assert not template.add({"invoice_number": (0.1, 0.2, 0.3, 0.25)}, 1)
+        assert template.samples == MAX_SAMPLES
+
+    def test_roundtrip(self):
+        template = ZoneTemplate("Conrad")
+        template.add({"invoice_number": (0.1, 0.2, 0.3, 0.25)}, 2**255 + 7)
+        assert ZoneTemplate.from_dict("Conrad", template.to_dict()) == template
+
+
+class TestZoneTemplateStore:
+    """Test persistence and letterhead matching"""
+
+    def test_processes_merge_on_save(self, tmp_path):
+        path = tmp_path / "zone_templates.json"
+        first, second = ZoneTemplateStore(path), ZoneTemplateStore(path)
+        img = np.zeros((100, 100), np.uint8)
+        first.learn("Conrad", img, {"invoice_number": (0.1, 0.2, 0.3, 0.25)})
+        second.learn("IKEA", img, {"invoice_number": (0.1, 0.2, 0.3, 0.25)})
+        assert set(ZoneTemplateStore(path).templates) == {"Conrad", "IKEA"}
+
+    def test_fingerprint_match(self, store):
+        left, right = letterhead(180), letterhead(1500)
+        noisy = np.clip(left + np.random.default_rng(1).normal(0, 15, left.shape), 0, 255).astype(np.uint8)
+        template = store.templates.setdefault("Conrad", ZoneTemplate("Conrad"))
+        for _ in range(MIN_SAMPLES):
+            template.add({"vendor": (0.05, 0.03, 0.4, 0.07)}, fingerprint(left))
+        assert store.match(noisy) == [template]
+        assert store.match(right) == []
+        assert store.match(right, vendor="Conrad") == [template]
+
+
+class TestZonalExtraction:
+    """Test learning from full-page OCR, zone-only extraction and the fallback"""
+
+    def extract(self, processor, lines, **fields):
+        img = processor.render(lines)
+        return processor.extract_text_fields(img, {"vendor": None, "invoice_number": None, **fields})
+
+    def test_learned_vendor_uses_zones_only(self, store):
+        processor = FakeOCRProcessor(store)
+        for n in range(MIN_SAMPLES):
+            self.extract(processor, page_lines(invoice=f"RE-2024-1000{n}"))
+        assert processor.full_page_runs == MIN_SAMPLES
+
+        fields = self.extract(processor, page_lines(invoice="RE-2024-55555", vat="DE987654321"))
+        assert processor.full_page_runs == MIN_SAMPLES
+        assert fields == {"vendor": "Conrad", "invoice_number": "RE-2024-55555", "vat_id": "DE987654321"}
+        stats = store.stats()
+        assert stats["zonal"] == 1 and stats["pixels_saved"] > 0.8
+
+    def test_vendor_from_qr_selects_template(self, store):
+        processor = FakeOCRProcessor(store)
+        for n in range(MIN_SAMPLES):
+            self.extract(processor, page_lines(invoice=f"RE-2024-1000{n}"))
+        # Different letterhead position, but the payment QR named the vendor
+        fields = self.extract(processor, page_lines(invoice="RE-2024-55555", vendor_left=1500), vendor="Conrad")
+        assert processor.full_page_runs == MIN_SAMPLES
+        assert fields["invoice_number"] == "RE-2024-55555"
+
+    def test_lookalike_letterhead_tries_next_candidate(self, store):
+        processor = FakeOCRProcessor(store)
+        for vendor in ("Conrad Electronic SE", "IKEA Deutschland"):
+            for n in range(MIN_SAMPLES):
+                self.extract(processor, page_lines(vendor=vendor, invoice=f"RE-2024-1000{n}"))
+        fields = self.extract(processor, page_lines(vendor="IKEA Deutschland", invoice="RE-2024-55555"))
+        assert processor.full_page_runs == 2 * MIN_SAMPLES
+        assert fields["vendor"] == "IKEA"
+        assert store.templates["Conrad"].misses == 0
+
+    def test_invalid_zone_falls_back_to_full_page(self, store):
+        processor = FakeOCRProcessor(store)
+        for n in range(MIN_SAMPLES):
+            self.extract(processor, page_lines(invoice=f"RE-2024-1000{n}"))
+        lines = page_lines()
+        lines[2] = OCRLine("Lieferschein", 180, 930, 700, 36)
+        lines.append(OCRLine("Rechnungsnummer: RE-2024-77777", 180, 1100, 700, 36))
+        fields = self.extract(processor, lines)
+        assert processor.full_page_runs == MIN_SAMPLES + 1
+        assert fields["invoice_number"] == "RE-2024-77777"
+        assert store.stats()["fallback"] == 1
+
+    def test_verify_mode_skips_zones(self, store):
+        processor = FakeOCRProcessor(store)
+        processor.qr_verify = True
+        for n in range(MIN_SAMPLES + 1):
+            self.extract(processor, page_lines(invoice=f"RE-2024-1000{n}"))
+        assert processor.full_page_runs == MIN_SAMPLES + 1
+
+    def test_stage_graph_fingerprints_once(self, store, monkeypatch):
+        import zonal
+        processor = FakeOCRProcessor(store)
+        for n in range(MIN_SAMPLES):
+            self.extract(processor, page_lines(invoice=f"RE-2024-1000{n}"))
+        calls = []
+        monkeypatch.setattr(zonal, "fingerprint", lambda img: calls.append(1) or fingerprint(img))
+        monkeypatch.setattr(processor, "extract_internal_from_corner", lambda img: None)
+        results = processor.stage_graph(processor.render(page_lines(invoice="RE-2024-55555"))).run()
+        assert results["zones"] and results["qr"]["invoice_number"] == "RE-2024-55555"
+        assert results["ocr"] is None
+        assert len(calls) == 1